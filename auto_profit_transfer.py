@@ -7,18 +7,254 @@ import traceback
 import json
 import argparse
 import asyncio
+import aiohttp
+import serialization
 from procedures import (
-    create_binance_bot,
-    create_bybit_bot,
     make_get_filepath,
     load_exchange_key_secret_passphrase,
+    utc_ms,
 )
-from pure_funcs import get_template_live_config, flatten
+from pure_funcs import get_template_live_config
 from njit_funcs import round_dynamic
-from time import sleep
 import logging
 import logging.config
 
+SUPPORTED_EXCHANGES = ["binance", "bybit"]
+
+
+class ProfitTransferAccount:
+    """
+    per account state, persisted after each poll:
+    cursor is timestamp of newest income seen, cursor_ids are ids of income at cursor
+    pending is income seen but not yet transferred, dropped when older than lookback
+    income ids in legacy log of previous versions are never counted again
+    """
+
+    def __init__(self, user: str, exchange: str, bot, state_dir: str):
+        self.user = user
+        self.exchange = exchange
+        self.bot = bot
+        self.state_filepath = make_get_filepath(os.path.join(state_dir, f"{exchange}_{user}.json"))
+        self.cursor = None
+        self.cursor_ids = []
+        self.pending = []
+        self.total_transferred = 0.0
+        self.n_transfers = 0
+        self.legacy_ids = set()
+        self.load_legacy_log()
+        self.load_state()
+
+    def load_legacy_log(self):
+        # ids of transferred income, written by previous versions of this script
+        legacy_filepath = os.path.join(
+            "logs", f"automatic_profit_transfer_log_{self.exchange}_{self.user}.json"
+        )
+        if os.path.exists(legacy_filepath):
+            self.legacy_ids = set(json.load(open(legacy_filepath)))
+            logging.info(
+                f"{self.user} loaded {len(self.legacy_ids)} already transferred IDs: "
+                + legacy_filepath
+            )
+
+    def load_state(self):
+        try:
+            state = serialization.load(self.state_filepath)
+            self.cursor = state["cursor"]
+            self.cursor_ids = state["cursor_ids"]
+            self.pending = state["pending"]
+            self.total_transferred = state["total_transferred"]
+            self.n_transfers = state["n_transfers"]
+            logging.info(f"{self.user} loaded state {self.state_filepath}")
+        except FileNotFoundError:
+            logging.info(f"{self.user} no previous state to load")
+        except Exception as e:
+            logging.error(f"{self.user} error loading state {self.state_filepath} {e}")
+
+    def dump_state(self):
+        state = {
+            "cursor": self.cursor,
+            "cursor_ids": self.cursor_ids,
+            "pending": self.pending,
+            "total_transferred": self.total_transferred,
+            "n_transfers": self.n_transfers,
+        }
+        serialization.dump(state, self.state_filepath)
+
+    def add_income(self, income: [dict], quote: str, now: int, lookback_millis: int):
+        """
+        adds income newer than cursor to pending, advances cursor
+        pending is list of [timestamp, transaction_id, income]
+        """
+        cursor_ids = set(self.cursor_ids)
+        new_income = [
+            e
+            for e in income
+            if e["timestamp"] > self.cursor
+            or (e["timestamp"] == self.cursor and e["transaction_id"] not in cursor_ids)
+        ]
+        already_transferred = [e for e in new_income if e["transaction_id"] in self.legacy_ids]
+        if already_transferred:
+            logging.info(
+                f"{self.user} skipping {len(already_transferred)} income already transferred "
+                + "according to legacy log"
+            )
+        if new_income:
+            self.cursor = max(e["timestamp"] for e in new_income)
+            self.cursor_ids = [e["transaction_id"] for e in income if e["timestamp"] == self.cursor]
+        self.pending += [
+            [e["timestamp"], e["transaction_id"], e["income"]]
+            for e in new_income
+            if e["token"] == quote and e["transaction_id"] not in self.legacy_ids
+        ]
+        self.pending = [x for x in self.pending if x[0] > now - lookback_millis]
+        return len(new_income)
+
+
+class ProfitTransferScheduler:
+    """
+    polls income and transfers profits for many accounts in one loop
+    accounts on same exchange share one http session and one server time fetch per poll
+    each account fetches only income since its cursor
+    """
+
+    def __init__(
+        self,
+        users: [str],
+        percentage: float,
+        quote: str,
+        interval_seconds: float,
+        lookback_millis: int,
+        max_concurrency: int,
+        state_dir: str = "caches/auto_profit_transfer",
+    ):
+        self.users = users
+        self.percentage = percentage
+        self.quote = quote
+        self.interval_seconds = interval_seconds
+        self.lookback_millis = lookback_millis
+        self.semaphores = {
+            exchange: asyncio.Semaphore(max_concurrency) for exchange in SUPPORTED_EXCHANGES
+        }
+        self.state_dir = state_dir
+        self.sessions = {}
+        self.accounts = []
+
+    async def init_accounts(self):
+        for user in self.users:
+            exchange = load_exchange_key_secret_passphrase(user)[0]
+            if exchange not in SUPPORTED_EXCHANGES:
+                raise Exception(f"unsupported exchange {exchange} for user {user}")
+            if exchange not in self.sessions:
+                self.sessions[exchange] = aiohttp.ClientSession()
+            bot = await self.create_bot(user, exchange)
+            self.accounts.append(ProfitTransferAccount(user, exchange, bot, self.state_dir))
+        logging.info(
+            f"scheduling profit transfers for {len(self.accounts)} accounts: "
+            + ", ".join(f"{acc.exchange}:{acc.user}" for acc in self.accounts)
+        )
+
+    async def create_bot(self, user: str, exchange: str):
+        """
+        bot is used only for its signed REST calls; it is not initiated for trading,
+        and exchange endpoints are fetched once per exchange and copied to other accounts
+        """
+        config = get_template_live_config()
+        config["user"] = user
+        config["symbol"] = "BTCUSDT"  # dummy symbol
+        config["market_type"] = "futures"
+        if exchange == "binance":
+            from exchanges.binance import BinanceBot
+
+            bot = BinanceBot(config)
+            await bot.session.close()
+            bot.session = self.sessions[exchange]
+            first = next((acc.bot for acc in self.accounts if acc.exchange == exchange), None)
+            if first is None:
+                await bot.init_market_type()
+            else:
+                bot.base_endpoint = first.base_endpoint
+                bot.spot_base_endpoint = first.spot_base_endpoint
+                bot.endpoints = first.endpoints
+        else:
+            from exchanges.bybit import BybitBot
+
+            bot = BybitBot(config)
+            bot.cc.session = self.sessions[exchange]
+            bot.cc.own_session = False
+        return bot
+
+    async def close(self):
+        for acc in self.accounts:
+            if acc.exchange == "bybit":
+                await acc.bot.cc.close()
+        for session in self.sessions.values():
+            await session.close()
+
+    async def poll_account(self, acc: ProfitTransferAccount, now: int):
+        async with self.semaphores[acc.exchange]:
+            if acc.cursor is None:
+                # without previous state, look back only if legacy log tells what was transferred
+                acc.cursor = now - self.lookback_millis if acc.legacy_ids else now
+            start_time = max(acc.cursor, now - self.lookback_millis)
+            try:
+                income = await acc.bot.get_all_income(start_time=start_time)
+            except Exception as e:
+                logging.error(f"{acc.user} failed fetching income {e}")
+                income = []
+            n_new = acc.add_income(income, self.quote, now, self.lookback_millis)
+            profit = sum([x[2] for x in acc.pending])
+            to_transfer = round_dynamic(profit * self.percentage, 4)
+            if self.quote in ["USDT", "BUSD", "USDC"]:
+                to_transfer = round(to_transfer, 4)
+            if to_transfer > 0:
+                try:
+                    transferred = await acc.bot.transfer_from_derivatives_to_spot(
+                        self.quote, to_transfer
+                    )
+                    logging.info(
+                        f"{acc.user} income: {profit} transferred {to_transfer} {self.quote}"
+                    )
+                    logging.info(f"{acc.user} {transferred}")
+                    acc.pending = []
+                    acc.total_transferred += to_transfer
+                    acc.n_transfers += 1
+                except Exception as e:
+                    logging.error(f"{acc.user} failed transferring {e}")
+                    traceback.print_exc()
+            else:
+                logging.info(f"{acc.user} n new income {n_new}, nothing to transfer")
+            acc.dump_state()
+
+    async def get_server_times(self) -> dict:
+        # one server time fetch per exchange, shared by its accounts
+        server_times = {}
+        for exchange in self.sessions:
+            bot = next(acc.bot for acc in self.accounts if acc.exchange == exchange)
+            try:
+                server_times[exchange] = int(await bot.get_server_time())
+            except Exception as e:
+                logging.error(f"failed fetching {exchange} server time {e}, using local time")
+                server_times[exchange] = utc_ms()
+        return server_times
+
+    async def run(self):
+        while True:
+            server_times = await self.get_server_times()
+            await asyncio.gather(
+                *[self.poll_account(acc, server_times[acc.exchange]) for acc in self.accounts]
+            )
+            await asyncio.sleep(self.interval_seconds)
+
+
+def load_users(api_keys_path="api-keys.json") -> [str]:
+    # all users in api-keys.json on supported exchanges
+    keyfile = json.load(open(api_keys_path))
+    return [
+        user
+        for user, value in keyfile.items()
+        if isinstance(value, dict) and value.get("exchange") in SUPPORTED_EXCHANGES
+    ]
+
 
 async def main():
     logging.basicConfig(
@@ -30,7 +266,19 @@ async def main():
         prog="auto profit transfer",
         description="automatically transfer percentage of profits from futures wallet to spot wallet",
     )
-    parser.add_argument("user", type=str, help="user/account_name defined in api-keys.json")
+    parser.add_argument(
+        "users",
+        type=str,
+        nargs="*",
+        help="one or more users/account_names defined in api-keys.json",
+    )
+    parser.add_argument(
+        "-a",
+        "--all",
+        action="store_true",
+        dest="all_users",
+        help="all binance and bybit users defined in api-keys.json",
+    )
     parser.add_argument(
         "-p",
         "--percentage",
@@ -49,55 +297,50 @@ async def main():
         dest="quote",
         help="quote coin, default USDT",
     )
+    parser.add_argument(
+        "-i",
+        "--interval",
+        type=float,
+        required=False,
+        default=60.0,
+        dest="interval",
+        help="minutes between polls, default=60",
+    )
+    parser.add_argument(
+        "-l",
+        "--lookback",
+        type=float,
+        required=False,
+        default=24.0,
+        dest="lookback",
+        help="hours; untransferred income older than this is disregarded, default=24",
+    )
+    parser.add_argument(
+        "-c",
+        "--max_concurrency",
+        type=int,
+        required=False,
+        default=5,
+        dest="max_concurrency",
+        help="max accounts polled concurrently per exchange, default=5",
+    )
     args = parser.parse_args()
-    config = get_template_live_config()
-    config["user"] = args.user
-    config["symbol"] = "BTCUSDT"  # dummy symbol
-    config["market_type"] = "futures"
-    exchange = load_exchange_key_secret_passphrase(args.user)[0]
-    if exchange == "binance":
-        bot = await create_binance_bot(config)
-    elif exchange == "bybit":
-        bot = await create_bybit_bot(config)
-    else:
-        raise Exception(f"unknown exchange {exchange}")
-    transfer_log_fpath = make_get_filepath(
-        os.path.join("logs", f"automatic_profit_transfer_log_{exchange}_{config['user']}.json")
+    users = sorted(set(args.users + (load_users() if args.all_users else [])))
+    if not users:
+        parser.error("specify one or more users, or --all")
+    scheduler = ProfitTransferScheduler(
+        users,
+        args.percentage,
+        args.quote,
+        args.interval * 60,
+        int(args.lookback * 1000 * 60 * 60),
+        args.max_concurrency,
     )
     try:
-        already_transferred_ids = set(json.load(open(transfer_log_fpath)))
-        logging.info(f"loaded already transferred IDs: {transfer_log_fpath}")
-    except:
-        already_transferred_ids = set()
-        logging.info(f"no previous transfers to load")
-    while True:
-        now = await bot.get_server_time()
-        try:
-            income = await bot.get_all_income(start_time=now - 1000 * 60 * 60 * 24)
-        except Exception as e:
-            logging.error(f"failed fetching income {e}")
-            # traceback.print_exc()
-            income = []
-        income = [e for e in income if e["transaction_id"] not in already_transferred_ids]
-        income = [x for x in income if x["timestamp"] > now - 1000 * 60 * 60 * 24]
-        income = [e for e in income if e["token"] == args.quote]
-        profit = sum([e["income"] for e in income])
-        to_transfer = round_dynamic(profit * args.percentage, 4)
-        if args.quote in ["USDT", "BUSD", "USDC"]:
-            to_transfer = round(to_transfer, 4)
-        if to_transfer > 0:
-            try:
-                transferred = await bot.transfer_from_derivatives_to_spot(args.quote, to_transfer)
-                logging.info(f"income: {profit} transferred {to_transfer} {args.quote}")
-                logging.info(f"{transferred}")
-                already_transferred_ids.update([e["transaction_id"] for e in income])
-                json.dump(list(already_transferred_ids), open(transfer_log_fpath, "w"))
-            except Exception as e:
-                logging.error(f"failed transferring {e}")
-                traceback.print_exc()
-        else:
-            logging.info("nothing to transfer")
-        sleep(60 * 60)
+        await scheduler.init_accounts()
+        await scheduler.run()
+    finally:
+        await scheduler.close()
 
 
 if __name__ == "__main__":
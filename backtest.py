@@ -14,7 +14,8 @@ from downloader import Downloader, load_hlc_cache
 from njit_funcs import round_
 from njit_funcs_recursive_grid import backtest_recursive_grid
 from njit_funcs_neat_grid import backtest_neat_grid
-from njit_clock import backtest_clock
+from njit_clock import backtest_clock_accelerated
+from backtest_streaming import plot_wrap_streaming
 from plotting import dump_plots
 from procedures import (
     prepare_backtest_config,
@@ -34,7 +35,17 @@ from pure_funcs import (
 )
 
 
-def backtest(config: dict, data: np.ndarray, do_print=False) -> (list, bool):
+def backtest(config: dict, data: np.ndarray, do_print=False) -> (list, list, list):
+    fills_long, fills_short, stats, _ = backtest_abortable(config, data)
+    return fills_long, fills_short, stats
+
+
+def backtest_abortable(config: dict, data: np.ndarray, abort_criteria=(0.0, 0.0, 0.0)):
+    """
+    abort_criteria: (drawdown_max, hrs_stuck_max, eqbal_ratio_min); 0.0 disables criterion
+    returns fills_long, fills_short, stats, (k_end, abort_k_long, abort_k_short)
+    clock mode does not support early abort
+    """
     config.update(make_compatible(config))
     passivbot_mode = determine_passivbot_mode(config)
     xk = create_xk(config)
@@ -45,6 +56,9 @@ def backtest(config: dict, data: np.ndarray, do_print=False) -> (list, bool):
             config["latency_simulation_ms"],
             config["maker_fee"],
             **xk,
+            abort_drawdown_max=abort_criteria[0],
+            abort_hrs_stuck_max=abort_criteria[1],
+            abort_eqbal_ratio_min=abort_criteria[2],
         )
     elif passivbot_mode == "neat_grid":
         return backtest_neat_grid(
@@ -53,14 +67,20 @@ def backtest(config: dict, data: np.ndarray, do_print=False) -> (list, bool):
             config["latency_simulation_ms"],
             config["maker_fee"],
             **xk,
+            abort_drawdown_max=abort_criteria[0],
+            abort_hrs_stuck_max=abort_criteria[1],
+            abort_eqbal_ratio_min=abort_criteria[2],
         )
     elif passivbot_mode == "clock":
-        return backtest_clock(
+        # tools/benchmark_clock.py, 730 days: identical fills and stats to backtest_clock,
+        # 2.49x faster on python 3.11 and 1.96x on python 3.9
+        fills_long, fills_short, stats = backtest_clock_accelerated(
             data,
             config["starting_balance"],
             config["maker_fee"],
             **xk,
         )
+        return fills_long, fills_short, stats, (len(data), 0, 0)
     else:
         raise Exception(f"unknown passivbot mode {passivbot_mode}")
 
@@ -88,17 +108,26 @@ def plot_wrap(config, data):
         df,
         n_parts=config["n_parts"],
         disable_plotting=config["disable_plotting"],
+        defer_plotting=config["defer_plotting"],
+        file_format=config.get("fills_stats_format", "csv"),
     )
     if (
         not config["disable_plotting"]
+        and not config["defer_plotting"]
         and config["enable_interactive_plot"]
         and config["passivbot_mode"] != "clock"
     ):
-        import interactive_plot
-
-        print("dumping interactive plot...")
         sts = time()
-        interactive_plot.dump_interactive_plot(config, data, longs, shorts)
+        if config.get("interactive_plot_mode", "html") == "server":
+            import interactive_plot_server
+
+            print("dumping interactive plot data...")
+            interactive_plot_server.dump_interactive_plot_data(config, data, longs, shorts)
+        else:
+            import interactive_plot
+
+            print("dumping interactive plot...")
+            interactive_plot.dump_interactive_plot(config, data, longs, shorts)
         print(f"{time() - sts:.2f} seconds spent on dumping interactive plot")
 
 
@@ -167,6 +196,13 @@ async def main():
         action="store_true",
         help="disable plotting",
     )
+    parser.add_argument(
+        "-dfp",
+        "--defer_plotting",
+        "--defer-plotting",
+        action="store_true",
+        help="dump plot data without rendering; render later with python3 plotting.py {plots_dirpath}",
+    )
     args = parser.parse_args()
     live_config_paths = args.live_config_path.split(",")
     config = prepare_backtest_config(args)
@@ -204,6 +240,7 @@ async def main():
             if passivbot_mode == "clock" or config["exchange"] == "okx":
                 config["ohlcv"] = True
             config["disable_plotting"] = args.disable_plotting
+            config["defer_plotting"] = args.defer_plotting
             if "spot" in config["market_type"]:
                 live_config = spotify_config(live_config)
             config["passivbot_mode"] = determine_passivbot_mode(config)
@@ -230,6 +267,9 @@ async def main():
                 if k in config:
                     print(f"{k: <{max(map(len, keys)) + 2}} {config[k]}")
             print()
+            streaming = config.get("streaming_chunk_size", 0) > 0 and passivbot_mode != "clock"
+            # memory map data in streaming mode, only one chunk at a time is copied to memory
+            mmap_mode = "r" if streaming else None
             if config["ohlcv"]:
                 data = await load_hlc_cache(
                     symbol,
@@ -239,13 +279,17 @@ async def main():
                     base_dir=config["base_dir"],
                     spot=config["spot"],
                     exchange=config["exchange"],
+                    mmap_mode=mmap_mode,
                 )
             else:
                 downloader = Downloader(config)
-                data = await downloader.get_sampled_ticks()
+                data = await downloader.get_sampled_ticks(mmap_mode=mmap_mode)
             config["n_days"] = round_((data[-1][0] - data[0][0]) / (1000 * 60 * 60 * 24), 0.1)
             pprint.pprint(denumpyize(candidate_to_live_config(config)))
-            plot_wrap(config, data)
+            if streaming:
+                plot_wrap_streaming(config, data)
+            else:
+                plot_wrap(config, data)
 
 
 if __name__ == "__main__":
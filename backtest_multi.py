@@ -8,7 +8,7 @@ import logging
 import traceback
 import numpy as np
 import pandas as pd
-from downloader import prepare_multsymbol_data
+from downloader import load_multsymbol_hlcs
 from procedures import (
     load_live_config,
     utc_ms,
@@ -55,6 +55,9 @@ def backtest_multi(hlcs, config):
         config["loss_allowance_pct"],
         config["stuck_threshold"],
         config["unstuck_close_pct"],
+        abort_drawdown_max=config.get("abort_drawdown_max", 0.0),
+        abort_hrs_stuck_max=config.get("abort_hrs_stuck_max", 0.0),
+        abort_eqbal_ratio_min=config.get("abort_eqbal_ratio_min", 0.0),
     )
     return res
 
@@ -203,6 +206,8 @@ def args2config(args):
         ("starting_balance", 10000),
         ("start_date", "2021-05-01"),
         ("end_date", "now"),
+        ("multisymbol_cache_max_n", 8),
+        ("multisymbol_cache_max_gb", 10.0),
     ]:
         if key not in config:
             logging.info(
@@ -215,16 +220,6 @@ def args2config(args):
 async def prep_hlcs_mss_config(config):
     if config["end_date"] in ["now", "", "today"]:
         config["end_date"] = ts_to_date_utc(utc_ms())[:10]
-    coins = [s.replace("USDT", "") for s in config["symbols"]]
-    config["cache_fpath"] = make_get_filepath(
-        oj(
-            f"{config['base_dir']}",
-            "multisymbol",
-            config["exchange"],
-            f"{'_'.join(coins)}_{config['start_date']}_{config['end_date']}_hlc_cache.npy",
-        )
-    )
-
     mss_path = oj(
         f"{config['base_dir']}",
         "multisymbol",
@@ -242,19 +237,16 @@ async def prep_hlcs_mss_config(config):
         except:
             raise Exception("failed to load market specific settings from cache")
 
-    # prepare_multsymbol_data() is computationally expensive, so use a cache
-    try:
-        hlcs = np.load(config["cache_fpath"])
-        first_ts = 0
-    except:
-        first_ts, hlcs = await prepare_multsymbol_data(
-            config["symbols"],
-            config["start_date"],
-            config["end_date"],
-            config["base_dir"],
-            config["exchange"],
-        )
-        np.save(config["cache_fpath"], hlcs)
+    # assembled hlcs are cached by content hash of per-symbol hlc caches, independent of symbol order
+    hlcs = await load_multsymbol_hlcs(
+        config["symbols"],
+        config["start_date"],
+        config["end_date"],
+        config["base_dir"],
+        config["exchange"],
+        max_n_views=config["multisymbol_cache_max_n"],
+        max_size_gb=config["multisymbol_cache_max_gb"],
+    )
     return hlcs, mss, config
 
 
@@ -413,7 +405,7 @@ async def main():
     res = backtest_multi(hlcs, config)
     print(f"time elapsed for backtest {(utc_ms() - sts) / 1000:.6f}s")
     sts = utc_ms()
-    fills, stats = res
+    fills, stats, abort_k = res
     fdf = fills_multi_to_df(fills, config["symbols"], config["c_mults"])
     sdf = stats_multi_to_df(stats, config["symbols"], config["c_mults"])
 
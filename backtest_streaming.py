@@ -0,0 +1,447 @@
+import json
+import os
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from njit_funcs import init_backtest_state
+from njit_funcs_recursive_grid import backtest_recursive_grid_chunk
+from njit_funcs_neat_grid import backtest_neat_grid_chunk
+from plotting import make_table
+from procedures import make_get_filepath, dump_live_config
+from pure_funcs import (
+    create_xk,
+    denumpyize,
+    ts_to_date,
+    sort_dict_keys,
+    determine_passivbot_mode,
+    make_compatible,
+)
+
+STATS_COLUMNS = [
+    "timestamp",
+    "bkr_price_long",
+    "bkr_price_short",
+    "psize_long",
+    "pprice_long",
+    "psize_short",
+    "pprice_short",
+    "price",
+    "closest_bkr_long",
+    "closest_bkr_short",
+    "balance_long",
+    "balance_short",
+    "equity_long",
+    "equity_short",
+]
+FILLS_COLUMNS = [
+    "trade_id",
+    "timestamp",
+    "pnl",
+    "fee_paid",
+    "balance",
+    "equity",
+    "qty",
+    "price",
+    "psize",
+    "pprice",
+    "type",
+]
+MS_DAY = 1000 * 60 * 60 * 24
+
+
+class RunningStats:
+    """
+    count, mean, sample std, min and max of a stream of batches,
+    batches are merged with Chan's parallel variance algorithm
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: np.ndarray):
+        if len(values) == 0:
+            return
+        n_b, mean_b = len(values), values.mean()
+        m2_b = ((values - mean_b) ** 2).sum()
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta**2 * self.n * n_b / n
+        self.n = n
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+    @property
+    def std(self) -> float:
+        return (self.m2 / (self.n - 1)) ** 0.5 if self.n > 1 else np.nan
+
+
+class StreamingAnalyzer:
+    """
+    computes analysis of backtest from chunks of fills and stats without keeping them in memory
+    same keys and definitions as pure_funcs.analyze_fills, except metrics which need
+    the whole distribution (drawdown_1pct_worst_mean, pa_distance_1pct_worst_mean)
+    adg_weighted subdivisions are split by time instead of by number of stats rows
+    """
+
+    def __init__(self, config: dict, start_ts: float, end_ts: float):
+        self.config = config
+        self.start_ts = start_ts
+        n_subdivisions = config.get("adg_n_subdivisions", 1)
+        # adg of subdivision i is measured from timestamp subdivision_tss[i] to end
+        self.subdivision_tss = [
+            start_ts + (end_ts - start_ts) * (1 - 1 / (i + 1)) for i in range(n_subdivisions)
+        ]
+        self.first_stats = None
+        self.last_stats = None
+        self.sides = {
+            pside: {
+                "subdivision_balances": [None] * n_subdivisions,
+                "n_fills": 0,
+                "type_counts": {},
+                "profit_sum": 0.0,
+                "loss_sum": 0.0,
+                "fee_sum": 0.0,
+                "volume_quote": 0.0,
+                "eqbal_ratio_min_fills": np.inf,
+                "prev_fill_ts": None,
+                "ms_diffs": RunningStats(),
+                "pa_dists": RunningStats(),
+                "eqbal_ratios": RunningStats(),
+                "eqbal_ratios_10_worst": np.array([]),
+                "exposure_ratios": RunningStats(),
+                "n_at_max_exposure": 0,
+                "closest_bkr": 1.0,
+                "equity_peak": None,
+                "drawdown_min": 0.0,
+                "daily_pending": None,
+                "daily_prev_equity": None,
+                "daily_returns": RunningStats(),
+            }
+            for pside in ["long", "short"]
+        }
+
+    def update(self, fills_long: list, fills_short: list, stats: list):
+        for pside, fills in [("long", fills_long), ("short", fills_short)]:
+            if fills:
+                self.update_fills(pside, fills)
+        if stats:
+            self.update_stats(np.array(stats, dtype=np.float64))
+
+    def calc_pcosts(self, psizes: np.ndarray, pprices: np.ndarray) -> np.ndarray:
+        if self.config["inverse"]:
+            return np.abs(psizes / pprices) * self.config["c_mult"]
+        return np.abs(psizes * pprices) * self.config["c_mult"]
+
+    def update_fills(self, pside: str, fills: list):
+        side = self.sides[pside]
+        columns = list(zip(*fills))
+        timestamps, pnls, fees_paid = (np.array(columns[i], dtype=np.float64) for i in (1, 2, 3))
+        balances, equities = (np.array(columns[i], dtype=np.float64) for i in (4, 5))
+        psizes, pprices = (np.array(columns[i], dtype=np.float64) for i in (8, 9))
+        side["n_fills"] += len(fills)
+        for type_ in columns[10]:
+            side["type_counts"][type_] = side["type_counts"].get(type_, 0) + 1
+        side["profit_sum"] += pnls[pnls > 0.0].sum()
+        side["loss_sum"] += pnls[pnls < 0.0].sum()
+        side["fee_sum"] += fees_paid.sum()
+        side["volume_quote"] += self.calc_pcosts(psizes, pprices).sum()
+        side["eqbal_ratio_min_fills"] = min(
+            side["eqbal_ratio_min_fills"], (equities / balances).min()
+        )
+        if side["prev_fill_ts"] is not None:
+            timestamps_ = np.concatenate([[side["prev_fill_ts"]], timestamps])
+        else:
+            timestamps_ = timestamps
+        side["ms_diffs"].update(np.diff(timestamps_))
+        side["prev_fill_ts"] = timestamps[-1]
+
+    def update_stats(self, stats: np.ndarray):
+        if self.first_stats is None:
+            self.first_stats = stats[0]
+        self.last_stats = stats[-1]
+        timestamps, prices = stats[:, 0], stats[:, 7]
+        for pside, (i_psize, i_pprice, i_bkr, i_balance, i_equity) in [
+            ("long", (3, 4, 8, 10, 12)),
+            ("short", (5, 6, 9, 11, 13)),
+        ]:
+            side = self.sides[pside]
+            psizes, pprices = stats[:, i_psize], stats[:, i_pprice]
+            balances, equities = stats[:, i_balance], stats[:, i_equity]
+
+            for i, ts in enumerate(self.subdivision_tss):
+                if side["subdivision_balances"][i] is None and timestamps[-1] >= ts:
+                    idx = np.searchsorted(timestamps, ts)
+                    side["subdivision_balances"][i] = (timestamps[idx], balances[idx])
+
+            in_position = psizes != 0.0
+            side["pa_dists"].update(
+                np.abs(pprices[in_position] - prices[in_position]) / prices[in_position]
+            )
+
+            eqbal_ratios = equities / balances
+            side["eqbal_ratios"].update(eqbal_ratios)
+            side["eqbal_ratios_10_worst"] = np.sort(
+                np.concatenate([side["eqbal_ratios_10_worst"], eqbal_ratios])
+            )[:10]
+
+            wallet_exposure_limit = self.config[pside]["wallet_exposure_limit"]
+            if wallet_exposure_limit > 0.0:
+                exposure_ratios = (
+                    self.calc_pcosts(psizes, pprices) / balances / wallet_exposure_limit
+                )
+                side["exposure_ratios"].update(exposure_ratios)
+                side["n_at_max_exposure"] += int((exposure_ratios > 0.9).sum())
+
+            side["closest_bkr"] = min(side["closest_bkr"], stats[:, i_bkr].min())
+
+            peaks = np.maximum.accumulate(
+                np.concatenate([[side["equity_peak"] or equities[0]], equities])
+            )[1:]
+            side["equity_peak"] = peaks[-1]
+            side["drawdown_min"] = min(side["drawdown_min"], (equities / peaks - 1.0).min())
+
+            # last equity of each day; last day of chunk may continue in next chunk
+            days = timestamps // MS_DAY
+            day_ends = np.append(np.flatnonzero(np.diff(days)), len(days) - 1)
+            daily_equities = equities[day_ends]
+            if side["daily_pending"] is not None and side["daily_pending"][0] != days[0]:
+                closed = np.concatenate([[side["daily_pending"][1]], daily_equities[:-1]])
+            else:
+                closed = daily_equities[:-1]
+            side["daily_pending"] = (days[-1], daily_equities[-1])
+            self.update_daily_returns(side, closed)
+
+    def update_daily_returns(self, side: dict, daily_equities: np.ndarray):
+        if len(daily_equities) == 0:
+            return
+        if side["daily_prev_equity"] is not None:
+            daily_equities_ = np.concatenate([[side["daily_prev_equity"]], daily_equities])
+        else:
+            daily_equities_ = daily_equities
+        side["daily_returns"].update(daily_equities_[1:] / daily_equities_[:-1] - 1.0)
+        side["daily_prev_equity"] = daily_equities[-1]
+
+    def get_result(self) -> dict:
+        first, last = self.first_stats, self.last_stats
+        n_days = (last[0] - first[0]) / MS_DAY
+        analysis = {
+            "exchange": self.config["exchange"] if "exchange" in self.config else "unknown",
+            "symbol": self.config["symbol"] if "symbol" in self.config else "unknown",
+            "starting_balance": first[10],
+            "n_days": n_days,
+        }
+        for pside, (i_balance, i_equity, i_bkr) in [("long", (10, 12, 8)), ("short", (11, 13, 9))]:
+            side = self.sides[pside]
+            if side["daily_pending"] is not None:
+                self.update_daily_returns(side, np.array([side["daily_pending"][1]]))
+                side["daily_pending"] = None
+
+            final_balance = last[i_balance]
+            if final_balance <= 0.0:
+                adg = adg_weighted = final_balance
+            else:
+                adgs = []
+                for ts_balance in side["subdivision_balances"]:
+                    if ts_balance is None:
+                        adgs.append(0.0)
+                        continue
+                    n_days_ = (last[0] - ts_balance[0]) / MS_DAY
+                    if n_days_ == 0.0 or ts_balance[1] == 0.0:
+                        adgs.append(0.0)
+                    else:
+                        adgs.append((final_balance / ts_balance[1]) ** (1 / n_days_) - 1)
+                adg, adg_weighted = adgs[0], np.mean(adgs)
+            wallet_exposure_limit = self.config[pside]["wallet_exposure_limit"]
+
+            pa_dists, eqbal_ratios = side["pa_dists"], side["eqbal_ratios"]
+            daily_returns, ms_diffs = side["daily_returns"], side["ms_diffs"]
+            type_counts = side["type_counts"]
+
+            def count_types(*substrings):
+                return sum(
+                    n for type_, n in type_counts.items() if any(s in type_ for s in substrings)
+                )
+
+            profit_sum, loss_sum = side["profit_sum"], side["loss_sum"]
+            n_stats = eqbal_ratios.n
+            analysis.update(
+                {
+                    f"pa_distance_mean_{pside}": pa_dists.mean if pa_dists.n else 100.0,
+                    f"pa_distance_max_{pside}": pa_dists.max if pa_dists.n else 100.0,
+                    f"pa_distance_std_{pside}": pa_dists.std if pa_dists.n > 1 else 1.0,
+                    f"equity_balance_ratio_mean_{pside}": eqbal_ratios.mean,
+                    f"equity_balance_ratio_std_{pside}": eqbal_ratios.std,
+                    f"gain_{pside}": final_balance / first[i_balance] - 1,
+                    f"adg_{pside}": adg if adg == adg else -1.0,
+                    f"adg_weighted_{pside}": adg_weighted if adg_weighted == adg_weighted else -1.0,
+                    f"adg_per_exposure_{pside}": adg / wallet_exposure_limit
+                    if wallet_exposure_limit > 0.0
+                    else 0.0,
+                    f"adg_weighted_per_exposure_{pside}": adg_weighted / wallet_exposure_limit
+                    if wallet_exposure_limit > 0.0
+                    else 0.0,
+                    f"exposure_ratios_mean_{pside}": side["exposure_ratios"].mean,
+                    f"time_at_max_exposure_{pside}": side["n_at_max_exposure"] / n_stats
+                    if n_stats
+                    else 1.0,
+                    f"n_fills_{pside}": side["n_fills"],
+                    f"n_closes_{pside}": count_types("close"),
+                    f"n_normal_closes_{pside}": count_types("nclose"),
+                    f"n_entries_{pside}": count_types("entry"),
+                    f"n_ientries_{pside}": count_types("ientry"),
+                    f"n_rentries_{pside}": count_types("rentry"),
+                    f"n_unstuck_closes_{pside}": count_types("unstuck_close", "clock_close"),
+                    f"n_unstuck_entries_{pside}": count_types("unstuck_entry", "clock_entry"),
+                    f"avg_fills_per_day_{pside}": side["n_fills"] / n_days,
+                    f"hrs_stuck_max_{pside}": ms_diffs.max / (1000.0 * 60 * 60)
+                    if ms_diffs.n
+                    else np.nan,
+                    f"hrs_stuck_avg_{pside}": ms_diffs.mean / (1000.0 * 60 * 60)
+                    if ms_diffs.n
+                    else np.nan,
+                    f"loss_sum_{pside}": loss_sum,
+                    f"profit_sum_{pside}": profit_sum,
+                    f"pnl_sum_{pside}": (pnl_sum := profit_sum + loss_sum),
+                    f"loss_profit_ratio_{pside}": (abs(loss_sum) / profit_sum)
+                    if profit_sum
+                    else 1.0,
+                    f"fee_sum_{pside}": side["fee_sum"],
+                    f"net_pnl_plus_fees_{pside}": pnl_sum + side["fee_sum"],
+                    f"final_equity_{pside}": last[i_equity],
+                    f"final_balance_{pside}": final_balance,
+                    f"closest_bkr_{pside}": side["closest_bkr"],
+                    f"eqbal_ratio_min_{pside}": min(
+                        side["eqbal_ratio_min_fills"], eqbal_ratios.min
+                    ),
+                    f"eqbal_ratio_mean_of_10_worst_{pside}": side["eqbal_ratios_10_worst"].mean(),
+                    f"eqbal_ratio_mean_{pside}": eqbal_ratios.mean,
+                    f"eqbal_ratio_std_{pside}": eqbal_ratios.std,
+                    f"volume_quote_{pside}": side["volume_quote"],
+                    f"drawdown_max_{pside}": -side["drawdown_min"],
+                    f"sharpe_ratio_{pside}": daily_returns.mean / daily_returns.std
+                    if daily_returns.std
+                    else 0.0,
+                }
+            )
+        return sort_dict_keys(analysis)
+
+
+class FillsSpiller:
+    """
+    appends fills and stats of each chunk to csv files in dirpath
+    """
+
+    def __init__(self, dirpath: str):
+        self.filepaths = {
+            key: os.path.join(dirpath, f"{key}.csv")
+            for key in ["fills_long", "fills_short", "stats"]
+        }
+        for filepath in self.filepaths.values():
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+    def spill(self, key: str, rows: list):
+        if not rows:
+            return
+        filepath = self.filepaths[key]
+        pd.DataFrame(rows, columns=STATS_COLUMNS if key == "stats" else FILLS_COLUMNS).to_csv(
+            filepath, mode="a", header=not os.path.exists(filepath), index=False
+        )
+
+
+def backtest_streaming(
+    config: dict, data: np.ndarray, chunk_size: int = 1000000, spill_dirpath: str = None
+) -> (dict, tuple):
+    """
+    backtests data in chunks of chunk_size ticks, carrying over state and open orders between chunks
+    data may be memory mapped, e.g. np.load(filepath, mmap_mode="r");
+    only one chunk at a time is copied to memory
+    fills and stats are appended to csv files in spill_dirpath, if given
+    returns analysis, (k_end, abort_k_long, abort_k_short)
+    clock mode is not supported
+    """
+    config.update(make_compatible(config))
+    passivbot_mode = determine_passivbot_mode(config)
+    if passivbot_mode == "recursive_grid":
+        backtest_chunk = backtest_recursive_grid_chunk
+        entries_long = entries_short = (0.0, 0.0, "")
+    elif passivbot_mode == "neat_grid":
+        backtest_chunk = backtest_neat_grid_chunk
+        entries_long, entries_short = [(0.0, 0.0, "")], [(0.0, 0.0, "")]
+    else:
+        raise Exception(f"streaming backtest not supported for passivbot mode {passivbot_mode}")
+    xk = create_xk(config)
+    n_ticks = len(data)
+    closes_long, closes_short = [(0.0, 0.0, "")], [(0.0, 0.0, "")]
+    state = init_backtest_state(
+        config["starting_balance"],
+        float(data[0, 0]),
+        float(data[0, -1]),
+        xk["do_long"],
+        xk["do_short"],
+    )
+    analyzer = StreamingAnalyzer(config, float(data[0, 0]), float(data[-1, 0]))
+    spiller = FillsSpiller(spill_dirpath) if spill_dirpath is not None else None
+    ks = (n_ticks, 0, 0)
+    for i0 in range(1, n_ticks, chunk_size):
+        # first row of window is last tick of previous chunk
+        window = np.array(data[i0 - 1 : i0 + chunk_size], dtype=np.float64)
+        (
+            fills_long,
+            fills_short,
+            stats,
+            ks,
+            state,
+            entries_long,
+            entries_short,
+            closes_long,
+            closes_short,
+        ) = backtest_chunk(
+            window,
+            i0 - 1,
+            n_ticks,
+            state,
+            entries_long,
+            entries_short,
+            closes_long,
+            closes_short,
+            config["starting_balance"],
+            config["latency_simulation_ms"],
+            config["maker_fee"],
+            **xk,
+        )
+        analyzer.update(fills_long, fills_short, stats)
+        if spiller is not None:
+            spiller.spill("fills_long", fills_long)
+            spiller.spill("fills_short", fills_short)
+            spiller.spill("stats", stats)
+        if ks[0] < i0 - 1 + len(window):
+            # bankruptcy or abort
+            break
+    return analyzer.get_result(), ks
+
+
+def plot_wrap_streaming(config: dict, data: np.ndarray):
+    print("n_days", config["n_days"])
+    print("starting_balance", config["starting_balance"])
+    print(f"backtesting in chunks of {config['streaming_chunk_size']} ticks...")
+    config["plots_dirpath"] = make_get_filepath(
+        os.path.join(config["plots_dirpath"], f"{ts_to_date(time())[:19].replace(':', '')}", "")
+    )
+    sts = time()
+    result, _ = backtest_streaming(
+        config, data, config["streaming_chunk_size"], config["plots_dirpath"]
+    )
+    print(f"{time() - sts:.2f} seconds elapsed")
+    config["result"] = result
+    dump_live_config(config, config["plots_dirpath"] + "live_config.json")
+    json.dump(denumpyize(config), open(config["plots_dirpath"] + "result.json", "w"), indent=4)
+    print(make_table(config).get_string(border=True, padding_width=1))
+    print(f"fills and stats dumped to {config['plots_dirpath']}")
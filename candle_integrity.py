@@ -0,0 +1,140 @@
+import json
+import os
+from time import time
+
+import numpy as np
+
+INTERVAL = 60 * 1000
+VALIDATION_VERSION = 1
+
+
+def calc_identical_runs(hlc: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    hlc: rows [timestamp, high, low, close, ...]
+    returns (run_ends, run_lengths) of consecutive candles identical to their predecessor
+    run_ends are indices into np.diff(hlc), i.e. index of last identical diff + 1
+    """
+    identical = (np.diff(hlc[:, 1:], axis=0) == 0.0).all(axis=1)
+    edges = np.diff(np.concatenate([[0], identical.astype(np.int8), [0]]))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    return run_ends, run_ends - run_starts
+
+
+def calc_gaps(timestamps: np.ndarray, interval: float = INTERVAL) -> np.ndarray:
+    """
+    returns gaps [[index, timestamp before gap, n missing candles]]
+    n missing candles is negative for duplicate or unsorted timestamps
+    """
+    diffs = np.diff(timestamps)
+    idxs = np.flatnonzero(diffs != interval)
+    return np.column_stack([idxs, timestamps[idxs], diffs[idxs] / interval - 1])
+
+
+def calc_repair_plan(
+    timestamps: np.ndarray, interval: float = INTERVAL, max_gap: float = INTERVAL * 60 * 12
+) -> dict:
+    """
+    returns {"gaps", "n_missing", "max_gap", "repairable"}
+    gaps are repairable by forward filling if timestamps are increasing and no gap exceeds max_gap
+    """
+    gaps = calc_gaps(timestamps, interval)
+    max_gap_ = float((gaps[:, 2].max() + 1) * interval) if len(gaps) else float(interval)
+    return {
+        "gaps": gaps,
+        "n_missing": int(gaps[:, 2].sum()) if len(gaps) else 0,
+        "max_gap": max_gap_,
+        "repairable": bool((gaps[:, 2] > 0).all()) and max_gap_ <= max_gap,
+    }
+
+
+def repair_gaps(ohlcv: np.ndarray, interval: float = INTERVAL) -> np.ndarray:
+    """
+    ohlcv: rows [timestamp, open, high, low, close, volume] with increasing timestamps
+    returns ohlcv with missing candles inserted; close is forward filled,
+    open, high and low are set to close and volume to zero
+    """
+    idxs = np.round((ohlcv[:, 0] - ohlcv[0, 0]) / interval).astype(np.int64)
+    n = idxs[-1] + 1
+    if n == len(ohlcv):
+        return ohlcv
+    filled = np.zeros(n, dtype=bool)
+    filled[idxs] = True
+    # index of last present candle for each row
+    src = np.maximum.accumulate(np.where(filled, np.arange(n), 0))
+    closes = np.empty(n)
+    closes[idxs] = ohlcv[:, 4]
+    closes = closes[src]
+    timestamps = ohlcv[0, 0] + np.arange(n) * interval
+    repaired = np.column_stack([timestamps] + [closes] * 4 + [np.zeros(n)])
+    repaired[idxs, 1:] = ohlcv[:, 1:6]
+    return repaired
+
+
+def validate_candles(hlc: np.ndarray, interval: float = INTERVAL) -> dict:
+    """
+    one pass over hlc rows [timestamp, high, low, close, ...]
+    returns summary of identical candle runs and gaps, with throughput in candles per second
+    """
+    start = time()
+    run_ends, run_lengths = calc_identical_runs(hlc)
+    gaps = calc_gaps(hlc[:, 0], interval)
+    i_longest = int(run_lengths.argmax()) if len(run_lengths) else None
+    elapsed = time() - start
+    return {
+        "version": VALIDATION_VERSION,
+        "n_candles": len(hlc),
+        "longest_identical": int(run_lengths[i_longest]) if i_longest is not None else 0,
+        "longest_identical_end": int(run_ends[i_longest]) if i_longest is not None else 0,
+        "n_gaps": len(gaps),
+        "n_missing": int(gaps[:, 2].clip(min=0).sum()) if len(gaps) else 0,
+        "max_gap": float((gaps[:, 2].max() + 1) * interval) if len(gaps) else float(interval),
+        "elapsed": elapsed,
+        "candles_per_second": len(hlc) / elapsed if elapsed > 0.0 else float("inf"),
+    }
+
+
+def load_sidecar(filepath: str, suffix: str):
+    """
+    returns content of sidecar json of filepath, or None if filepath changed since sidecar dump
+    """
+    stat = os.stat(filepath)
+    try:
+        sidecar = json.load(open(filepath + suffix))
+        if sidecar["size"] == stat.st_size and sidecar["mtime_ns"] == stat.st_mtime_ns:
+            return sidecar["content"]
+    except:
+        pass
+    return None
+
+
+def dump_sidecar(filepath: str, suffix: str, content):
+    stat = os.stat(filepath)
+    sidecar = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "content": content}
+    json.dump(sidecar, open(filepath + suffix, "w"))
+
+
+def validate_candles_cached(filepath: str, hlc: np.ndarray = None, interval: float = INTERVAL):
+    """
+    returns (validation, from_cache)
+    validation is cached alongside the cache file and reused until file changes
+    """
+    validation = load_sidecar(filepath, ".validation.json")
+    if validation is not None and validation.get("version") == VALIDATION_VERSION:
+        return validation, True
+    if hlc is None:
+        hlc = np.load(filepath)
+    validation = validate_candles(hlc, interval)
+    dump_sidecar(filepath, ".validation.json", validation)
+    return validation, False
+
+
+def format_validation(validation: dict, symbol: str) -> str:
+    line = (
+        f"{symbol} most n days of consecutive identical ohlcvs: "
+        + f"{validation['longest_identical'] / 60 / 24:.3f}, "
+        + f"index last: {validation['longest_identical_end']}"
+    )
+    if validation["n_gaps"]:
+        line += f", {validation['n_gaps']} gaps, {validation['n_missing']} missing candles"
+    return line + f" ({validation['candles_per_second']:.0f} candles/s)"
@@ -2,6 +2,7 @@ import argparse
 import asyncio
 import datetime
 import gzip
+import hashlib
 import os
 import sys
 import requests
@@ -21,6 +22,15 @@ from dateutil import parser
 from tqdm import tqdm
 
 from njit_funcs import calc_samples, round_up, round_dn, round_
+from candle_integrity import (
+    validate_candles,
+    validate_candles_cached,
+    format_validation,
+    calc_repair_plan,
+    repair_gaps,
+    load_sidecar,
+    dump_sidecar,
+)
 from procedures import (
     prepare_backtest_config,
     make_get_filepath,
@@ -929,19 +939,20 @@ class Downloader:
         np.save(self.tick_filepath, array)
         print_(["Saved single file!"])
 
-    async def get_sampled_ticks(self) -> np.ndarray:
+    async def get_sampled_ticks(self, mmap_mode=None) -> np.ndarray:
         """
         Function for direct use in the backtester. Checks if the numpy arrays exist and if so loads them.
         If they do not exist or if their length doesn't match, download the missing data and create them.
+        @param mmap_mode: passed to np.load, e.g. "r" to memory map ticks instead of loading them.
         @return: numpy array.
         """
         if os.path.exists(self.tick_filepath):
             print_(["Loading cached tick data from", self.tick_filepath])
-            tick_data = np.load(self.tick_filepath)
+            tick_data = np.load(self.tick_filepath, mmap_mode=mmap_mode)
             return tick_data
         await self.download_ticks()
         await self.prepare_files()
-        tick_data = np.load(self.tick_filepath)
+        tick_data = np.load(self.tick_filepath, mmap_mode=mmap_mode)
         return tick_data
 
 
@@ -1222,45 +1233,48 @@ async def download_ohlcvs_binance(
 
 
 def count_longest_identical_data(hlc, symbol):
-    line = f"checking ohlcv integrity of {symbol}"
-    diffs = (np.diff(hlc[:, 1:], axis=0) == [0.0, 0.0, 0.0]).all(axis=1)
-    longest_consecutive = 0
-    counter = 0
-    i_ = 0
-    for i, x in enumerate(diffs):
-        if x:
-            counter += 1
-        else:
-            if counter > longest_consecutive:
-                longest_consecutive = counter
-                i_ = i
-            counter = 0
-    print(
-        f"{symbol} most n days of consecutive identical ohlcvs: {longest_consecutive / 60 / 24:.3f}, index last: {i_}"
-    )
-    return longest_consecutive
+    validation = validate_candles(hlc)
+    print(format_validation(validation, symbol))
+    return validation["longest_identical"]
 
 
 def attempt_gap_fix_hlcs(df):
     interval = 60 * 1000
     max_gap = interval * 60 * 12  # 12 hours
-    greatest_gap = df.timestamp.diff().max()
-    if greatest_gap == interval:
+    plan = calc_repair_plan(df.timestamp.values, interval, max_gap)
+    if len(plan["gaps"]) == 0:
         return df
-    if greatest_gap > max_gap:
+    if plan["max_gap"] > max_gap:
         raise Exception(
-            f"ohlcvs gap greater than {max_gap / (1000 * 60 * 60)} hours: {greatest_gap / (1000 * 60 * 60)} hours"
+            f"ohlcvs gap greater than {max_gap / (1000 * 60 * 60)} hours: {plan['max_gap'] / (1000 * 60 * 60)} hours"
         )
-    print("gap(s) in ohlcvs... attempting fix")
-    new_timestamps = np.arange(df["timestamp"].iloc[0], df["timestamp"].iloc[-1] + interval, interval)
-    new_df = df.set_index("timestamp").reindex(new_timestamps)
-    new_df.close = new_df.close.ffill()
-    new_df.open = new_df.open.fillna(new_df.close)
-    new_df.high = new_df.high.fillna(new_df.close)
-    new_df.low = new_df.low.fillna(new_df.close)
-    new_df.volume = new_df.volume.fillna(0.0)
-    new_df = new_df.reset_index()
-    return new_df[["timestamp", "open", "high", "low", "close", "volume"]]
+    print(f"{len(plan['gaps'])} gap(s) in ohlcvs, {plan['n_missing']} missing... attempting fix")
+    if not plan["repairable"]:
+        df = df.drop_duplicates(subset=["timestamp"]).sort_values("timestamp")
+    columns = ["timestamp", "open", "high", "low", "close", "volume"]
+    return pd.DataFrame(repair_gaps(df[columns].values.astype(float), interval), columns=columns)
+
+
+def get_hlc_cache_filepath(symbol, start_date, end_date, base_dir, spot, exchange) -> str:
+    cache_fname = (
+        f"{ts_to_date_utc(date_to_ts2(start_date))[:10]}_"
+        + f"{ts_to_date_utc(date_to_ts2(end_date))[:10]}_ohlcv_cache.npy"
+    )
+    return make_get_filepath(
+        os.path.join(base_dir, exchange + ("_spot" if spot else ""), symbol, "caches", cache_fname)
+    )
+
+
+def get_hlc_cache_digest(filepath: str) -> str:
+    """
+    returns sha1 of hlc cache contents
+    digest is kept in a sidecar file and recomputed only if cache file changed
+    """
+    sha1 = load_sidecar(filepath, ".sha1.json")
+    if sha1 is None:
+        sha1 = hashlib.sha1(np.load(filepath).tobytes()).hexdigest()
+        dump_sidecar(filepath, ".sha1.json", sha1)
+    return sha1
 
 
 async def load_hlc_cache(
@@ -1271,17 +1285,14 @@ async def load_hlc_cache(
     base_dir="backtests",
     spot=False,
     exchange="binance",
+    mmap_mode=None,
 ):
-    cache_fname = (
-        f"{ts_to_date_utc(date_to_ts2(start_date))[:10]}_"
-        + f"{ts_to_date_utc(date_to_ts2(end_date))[:10]}_ohlcv_cache.npy"
-    )
-
-    filepath = make_get_filepath(
-        os.path.join(base_dir, exchange + ("_spot" if spot else ""), symbol, "caches", cache_fname)
-    )
+    """
+    mmap_mode: passed to np.load, e.g. "r" to memory map hlcs instead of loading them
+    """
+    filepath = get_hlc_cache_filepath(symbol, start_date, end_date, base_dir, spot, exchange)
     if os.path.exists(filepath):
-        data = np.load(filepath)
+        data = np.load(filepath, mmap_mode=mmap_mode)
     else:
         if exchange == "bybit":
             df = await download_ohlcvs_bybit(symbol, start_date, end_date, spot, download_only=False)
@@ -1292,8 +1303,12 @@ async def load_hlc_cache(
         df = df[df.timestamp <= date_to_ts2(end_date)]
         data = df[["timestamp", "high", "low", "close"]].values
         np.save(filepath, data)
+        if mmap_mode is not None:
+            data = np.load(filepath, mmap_mode=mmap_mode)
     try:
-        count_longest_identical_data(data, symbol)
+        validation, from_cache = validate_candles_cached(filepath, data)
+        if not from_cache:
+            print(format_validation(validation, symbol))
     except Exception as e:
         print("error checking integrity", e)
     return data
@@ -1320,26 +1335,80 @@ async def prepare_multsymbol_data(
     """
     if end_date in ["today", "now", ""]:
         end_date = ts_to_date_utc(utc_ms())[:10]
-    hlcs = []
     interval = 60000.0
+    columns = []
     for symbol in symbols:
         data = await load_hlc_cache(symbol, False, start_date, end_date, base_dir, False, exchange)
-        assert (
-            np.diff(data[:, 0]) == interval
-        ).all(), f"gaps in hlc data {symbol}"  # verify integrous 1m hlcs
-        dft = pd.DataFrame(
-            data, columns=["timestamp"] + [f"{symbol}_{key}" for key in ["high", "low", "close"]]
+        # verify integrous 1m hlcs; validation is cached alongside hlc cache
+        validation, _ = validate_candles_cached(
+            get_hlc_cache_filepath(symbol, start_date, end_date, base_dir, False, exchange), data
         )
-        hlcs.append(dft)
+        assert validation["n_gaps"] == 0, f"gaps in hlc data {symbol}"
+        columns.append(data)
+
+    # align symbols by shared minute index; minutes missing for a symbol are zeros
+    first_ts = min([x[0, 0] for x in columns])
+    last_ts = max([x[-1, 0] for x in columns])
+    hlcs = np.zeros((len(symbols), int(round((last_ts - first_ts) / interval)) + 1, 3))
+    for i, data in enumerate(columns):
+        start_idx = int(round((data[0, 0] - first_ts) / interval))
+        hlcs[i, start_idx : start_idx + len(data)] = np.where(
+            np.isnan(data[:, 1:]), 0.0, data[:, 1:]
+        )
+    return first_ts, hlcs
+
 
-    tss = np.arange(
-        min([x.timestamp.iloc[0] for x in hlcs]),
-        max([x.timestamp.iloc[-1] for x in hlcs]) + interval,
-        interval,
+async def load_multsymbol_hlcs(
+    symbols, start_date, end_date, base_dir, exchange, max_n_views=8, max_size_gb=10.0
+) -> np.ndarray:
+    """
+    returns hlcs as prepare_multsymbol_data(), using a small on disk LRU of assembled arrays
+    views are keyed by content hash of per-symbol hlc caches, so any ordering of the same symbols
+    with the same data reuses the same view
+    least recently used views are evicted beyond max_n_views or max_size_gb
+    """
+    if end_date in ["today", "now", ""]:
+        end_date = ts_to_date_utc(utc_ms())[:10]
+    symbols_sorted = sorted(set(symbols))
+    digests = []
+    for symbol in symbols_sorted:
+        filepath = get_hlc_cache_filepath(symbol, start_date, end_date, base_dir, False, exchange)
+        if not os.path.exists(filepath):
+            await load_hlc_cache(symbol, False, start_date, end_date, base_dir, False, exchange)
+        digests.append(get_hlc_cache_digest(filepath))
+    key = hashlib.sha1(
+        json.dumps([exchange, start_date, end_date, list(zip(symbols_sorted, digests))]).encode()
+    ).hexdigest()
+    views_dirpath = make_get_filepath(os.path.join(base_dir, "multisymbol", exchange, "views", ""))
+    view_fpath = os.path.join(views_dirpath, f"{key}.npy")
+    if os.path.exists(view_fpath):
+        hlcs = np.load(view_fpath)
+        os.utime(view_fpath)  # mark as recently used
+        print(f"loaded multisymbol hlcs from cache {view_fpath}")
+    else:
+        _, hlcs = await prepare_multsymbol_data(
+            symbols_sorted, start_date, end_date, base_dir, exchange
+        )
+        np.save(view_fpath, hlcs)
+        evict_multsymbol_views(views_dirpath, max_n_views, max_size_gb)
+    if symbols_sorted != list(symbols):
+        hlcs = hlcs[[symbols_sorted.index(symbol) for symbol in symbols]]
+    return hlcs
+
+
+def evict_multsymbol_views(views_dirpath, max_n_views, max_size_gb):
+    views = sorted(
+        [os.path.join(views_dirpath, f) for f in os.listdir(views_dirpath) if f.endswith(".npy")],
+        key=os.path.getmtime,
+        reverse=True,
     )
-    df = pd.concat([x.set_index("timestamp").reindex(tss) for x in hlcs], axis=1, join="outer")
-    df = df.fillna(0.0)
-    return df.index[0], np.array([df.values[:, i : i + 3] for i in range(0, len(symbols) * 3, 3)])
+    size_gb = 0.0
+    for i, view_fpath in enumerate(views):
+        size_gb += os.path.getsize(view_fpath) / 1024**3
+        # always keep most recent view
+        if i > 0 and (i >= max_n_views or size_gb > max_size_gb):
+            print(f"evicting multisymbol hlcs cache {view_fpath}")
+            os.remove(view_fpath)
 
 
 async def main():
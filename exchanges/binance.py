@@ -602,6 +602,8 @@ class BinanceBot(Bot):
                 income_type=income_type,
                 limit=1000,
             )
+            if not fetched:
+                break
             print_(["fetched income", ts_to_date(fetched[0]["timestamp"])])
             if fetched == income[-len(fetched) :]:
                 break
@@ -19,15 +19,14 @@ from njit_funcs import (
     calc_diff,
 )
 from passivbot import Bot
-from procedures import print_, print_async_exception
+from procedures import print_, print_async_exception, make_get_filepath
 from pure_funcs import (
     ts_to_date,
     sort_dict_keys,
-    calc_pprice_long,
     format_float,
-    get_position_fills,
     spotify_config,
 )
+from spot_position import SpotPositionTracker
 
 
 class BinanceBotSpot(Bot):
@@ -158,6 +157,12 @@ class BinanceBotSpot(Bot):
                     self.min_cost = self.config["min_cost"] = 0.0
                 break
 
+        self.position_tracker = SpotPositionTracker(
+            make_get_filepath(
+                f"caches/{self.exchange}/{self.user}_{self.symbol}_spot_position.json"
+            ),
+            self.coin,
+        )
         await super()._init()
         await self.init_order_book()
         await self.update_position()
@@ -245,9 +250,13 @@ class BinanceBotSpot(Bot):
         ]
 
     async def fetch_position(self) -> dict:
-        balances, _ = await asyncio.gather(
-            self.private_get(self.endpoints["balance"]), self.update_fills()
+        from_id = self.position_tracker.next_from_id()
+        balances, fetched_fills = await asyncio.gather(
+            self.private_get(self.endpoints["balance"]),
+            self.update_fills(from_id=from_id),
         )
+        # trades of one order are deduplicated in self.fills, so apply fetched trades directly
+        self.position_tracker.apply_fills(fetched_fills)
         balance = {}
         for elm in balances["balances"]:
             balance[elm["asset"]] = {"free": float(elm["free"])}
@@ -258,6 +267,12 @@ class BinanceBotSpot(Bot):
         if "BNB" in balance:
             balance["BNB"]["onhand"] = max(0.0, balance["BNB"]["onhand"] - 0.01)
         self.balance = balance
+        if from_id is not None and self.position_tracker.is_drifted(
+            round_dn(balance.get(self.coin, {"onhand": 0.0})["onhand"], self.qty_step),
+            self.qty_step,
+        ):
+            # only fills since last_fill_id were fetched; refetch recent history to reconstruct from
+            await self.update_fills()
         return self.calc_simulated_position(self.balance, self.fills)
 
     def calc_simulated_position(self, balance: dict, long_fills: [dict]) -> dict:
@@ -266,10 +281,9 @@ class BinanceBotSpot(Bot):
         long_pfills = [{order...}, ...]
         """
         psize_long = round_dn(balance[self.coin]["onhand"], self.qty_step)
-        long_pfills, short_pfills = get_position_fills(psize_long, 0.0, self.fills)
-        pprice_long = calc_pprice_long(psize_long, long_pfills) if psize_long else 0.0
+        pprice_long = self.position_tracker.calc_pprice(psize_long, self.fills, self.qty_step)
         if psize_long * pprice_long < self.min_cost:
-            psize_long, pprice_long, long_pfills = 0.0, 0.0, []
+            psize_long, pprice_long = 0.0, 0.0
         position = {
             "long": {
                 "size": psize_long,
@@ -20,6 +20,8 @@ assert (
 
 
 class BybitBot(Bot):
+    amend_supported = True
+
     def __init__(self, config: dict):
         self.exchange = "bybit"
         self.market_type = config["market_type"] = "linear_perpetual"
@@ -262,6 +264,37 @@ class BybitBot(Bot):
             traceback.print_exc()
             return {}
 
+    async def execute_amendments(self, amendments: [(dict, dict)]) -> [(dict, dict)]:
+        res = await asyncio.gather(*[self.execute_amendment(x) for x in amendments])
+        return [x for x in res if x]
+
+    async def execute_amendment(self, amendment: (dict, dict)) -> (dict, dict):
+        old, order = amendment
+        executed = None
+        try:
+            # amended order keeps its id and post only time in force
+            executed = await self.cc.edit_order(
+                old["order_id"],
+                self.symbol,
+                "limit",
+                order["side"],
+                amount=abs(order["qty"]),
+                price=order["price"],
+                params={"positionIdx": 1 if order["position_side"] == "long" else 2},
+            )
+            return old, {
+                **old,
+                "order_id": executed["id"] if executed.get("id") else old["order_id"],
+                "symbol": self.symbol,
+                "qty": abs(order["qty"]),
+                "price": order["price"],
+            }
+        except Exception as e:
+            logging.error(f"error amending order {old} -> {order} {e}")
+            print_async_exception(executed)
+            traceback.print_exc()
+            return ()
+
     async def fetch_account(self):
         return
 
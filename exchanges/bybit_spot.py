@@ -18,15 +18,14 @@ from njit_funcs import (
     calc_pnl_long,
 )
 from passivbot import Bot
-from procedures import print_async_exception, print_
+from procedures import print_async_exception, print_, make_get_filepath
 from pure_funcs import (
     sort_dict_keys,
     spotify_config,
-    get_position_fills,
-    calc_pprice_long,
     format_float,
     ts_to_date,
 )
+from spot_position import SpotPositionTracker
 
 
 class BybitBotSpot(Bot):
@@ -151,6 +150,12 @@ class BybitBotSpot(Bot):
         else:
             raise Exception(f"unknown symbol {self.symbol}")
 
+        self.position_tracker = SpotPositionTracker(
+            make_get_filepath(
+                f"caches/{self.exchange}/{self.user}_{self.symbol}_spot_position.json"
+            ),
+            self.coin,
+        )
         await super()._init()
         await self.init_order_book()
         await self.update_position()
@@ -241,9 +246,13 @@ class BybitBotSpot(Bot):
         ]
 
     async def fetch_position(self) -> dict:
-        balances, _ = await asyncio.gather(
-            self.private_get(self.endpoints["balance"]), self.update_fills()
+        from_id = self.position_tracker.next_from_id()
+        balances, fetched_fills = await asyncio.gather(
+            self.private_get(self.endpoints["balance"]),
+            self.update_fills(from_id=from_id),
         )
+        # trades of one order are deduplicated in self.fills, so apply fetched trades directly
+        self.position_tracker.apply_fills(fetched_fills)
         balances = balances["result"]["balances"]
         balance = {}
         for elm in balances:
@@ -253,6 +262,12 @@ class BybitBotSpot(Bot):
                 balance[elm["coin"]]["free"] + balance[elm["coin"]]["locked"]
             )
         self.balance = balance
+        if from_id is not None and self.position_tracker.is_drifted(
+            round_dn(balance.get(self.coin, {"onhand": 0.0})["onhand"], self.qty_step),
+            self.qty_step,
+        ):
+            # only fills since last_fill_id were fetched; refetch recent history to reconstruct from
+            await self.update_fills()
         return self.calc_simulated_position(self.balance, self.fills)
 
     def calc_simulated_position(self, balance: dict, long_fills: [dict]) -> dict:
@@ -262,10 +277,9 @@ class BybitBotSpot(Bot):
         """
         if self.coin in balance:
             psize_long = round_dn(balance[self.coin]["onhand"], self.qty_step)
-            long_pfills, short_pfills = get_position_fills(psize_long, 0.0, self.fills)
-            pprice_long = calc_pprice_long(psize_long, long_pfills) if psize_long else 0.0
+            pprice_long = self.position_tracker.calc_pprice(psize_long, self.fills, self.qty_step)
             if psize_long * pprice_long < self.min_cost:
-                psize_long, pprice_long, long_pfills = 0.0, 0.0, []
+                psize_long, pprice_long = 0.0, 0.0
             wallet_balance = (
                 balance[self.quote]["onhand"] + balance[self.coin]["onhand"] * pprice_long
             )
@@ -204,12 +204,31 @@ class BitgetBot(Passivbot):
         start_time: int = None,
         end_time: int = None,
     ):
-        limit = 100
         if start_time is None and end_time is None:
             return await self.fetch_pnl()
+        if start_time is None:
+            return await self.fetch_pnls_paginated(end_time=end_time)
+        if end_time is None:
+            end_time = utc_ms() + 1000 * 60 * 60 * 24
+        # fetch weekly windows concurrently, paginating within each window
+        return await self.fetch_windowed(
+            lambda sts, ets: self.fetch_pnls_paginated(start_time=sts, end_time=ets),
+            start_time,
+            end_time,
+            1000 * 60 * 60 * 24 * 7,
+        )
+
+    async def fetch_pnls_paginated(
+        self,
+        start_time: int = None,
+        end_time: int = None,
+    ):
+        limit = 100
         all_fetched = {}
         while True:
             fetched = await self.fetch_pnl(start_time=start_time, end_time=end_time)
+            if fetched is False:
+                return False
             if fetched == []:
                 break
             for elm in fetched:
@@ -11,6 +11,8 @@ from procedures import print_async_exception, utc_ms
 
 
 class BybitBot(Passivbot):
+    amend_supported = True
+
     def __init__(self, config: dict):
         super().__init__(config)
         self.ccp = getattr(ccxt_pro, self.exchange)(
@@ -205,23 +207,16 @@ class BybitBot(Passivbot):
     ):
         if start_time is not None:
             week = 1000 * 60 * 60 * 24 * 7
-            income = []
             if end_time is None:
                 end_time = int(utc_ms() + 1000 * 60 * 60 * 24)
             # bybit has limit of 7 days per pageinated fetch
-            # fetch multiple times
-            i = 1
-            while i < 52:  # limit n fetches to 52 (one year)
-                sts = end_time - week * i
-                ets = sts + week
-                sts = max(sts, start_time)
-                fetched = await self.fetch_pnl(symbol=symbol, start_time=sts, end_time=ets)
-                income.extend(fetched)
-                if sts <= start_time:
-                    break
-                i += 1
-                logging.debug(f"fetching income for more than a week {ts_to_date_utc(sts)}")
-            return sorted({elm["id"]: elm for elm in income}.values(), key=lambda x: x["timestamp"])
+            # fetch weekly windows concurrently, limit lookback to 51 weeks
+            return await self.fetch_windowed(
+                lambda sts, ets: self.fetch_pnl(symbol=symbol, start_time=sts, end_time=ets),
+                max(start_time, end_time - week * 51),
+                end_time,
+                week,
+            )
         else:
             return await self.fetch_pnl(symbol=symbol, start_time=start_time, end_time=end_time)
 
@@ -366,6 +361,42 @@ class BybitBot(Passivbot):
     async def execute_orders(self, orders: [dict]) -> [dict]:
         return await self.execute_multiple(orders, "execute_order", self.max_n_creations_per_batch)
 
+    async def execute_amendment(self, amendment: (dict, dict)) -> (dict, dict):
+        old, order = amendment
+        executed = None
+        try:
+            # amended order keeps its id and post only time in force
+            executed = await self.cca.edit_order(
+                old["id"],
+                order["symbol"],
+                "limit",
+                order["side"],
+                amount=abs(order["qty"]),
+                price=order["price"],
+                params={"positionIdx": 1 if order["position_side"] == "long" else 2},
+            )
+            return old, {
+                "id": executed["id"] if executed.get("id") else old["id"],
+                "symbol": order["symbol"],
+                "side": order["side"],
+                "position_side": order["position_side"],
+                "qty": abs(order["qty"]),
+                "amount": abs(order["qty"]),
+                "price": order["price"],
+                "timestamp": utc_ms(),
+            }
+        except Exception as e:
+            logging.error(f"error amending order {old} -> {order} {e}")
+            print_async_exception(executed)
+            traceback.print_exc()
+            return ()
+
+    async def execute_amendments(self, amendments: [(dict, dict)]) -> [(dict, dict)]:
+        res = await self.execute_multiple(
+            amendments, "execute_amendment", self.max_n_creations_per_batch
+        )
+        return [x for x in res if x]
+
     async def update_exchange_config(self):
         try:
             res = await self.cca.set_position_mode(True)
@@ -0,0 +1,399 @@
+import os
+import asyncio
+from time import perf_counter, process_time
+
+import numpy as np
+
+import passivbot_multi
+from passivbot_multi import Passivbot, logging
+from njit_funcs import calc_new_psize_pprice, calc_pnl_long, calc_pnl_short
+from procedures import make_get_filepath
+from replay_log import load_recording, split_recording
+
+
+class ReplayClock:
+    # virtual time in millis, stands in for utc_ms
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ReplayClient:
+    # stands in for the ccxt client, serving recorded markets
+    def __init__(self, markets: dict):
+        self.markets = markets
+
+    async def load_markets(self):
+        return self.markets
+
+    async def close(self):
+        pass
+
+
+class ReplayBot(Passivbot):
+    """
+    stand-in exchange replaying a log recorded with passivbot_multi.py --record
+    recorded tickers are fed to the bot in recorded order on virtual time
+    bot's orders are matched against recorded tickers, fills are full and at order price
+    initial positions, balance, open orders, pnls and ohlcvs are taken from the recording
+    """
+
+    def __init__(self, config: dict, recording_path: str, speed: float = 0.0, maker_fee=0.0002):
+        self.recording = split_recording(load_recording(recording_path))
+        self.clock = ReplayClock(float(self.recording["start_ts"]))
+        # the live loop reads time through passivbot_multi.utc_ms
+        passivbot_multi.utc_ms = self.clock
+        super().__init__(config)
+        self.speed = speed  # virtual seconds per wall second; 0.0 is as fast as possible
+        self.maker_fee = maker_fee
+        self.cca = ReplayClient(self.recording["markets"])
+        self.ccp = self.cca
+        self.pnls_cache_filepath = make_get_filepath(f"caches/replay/{self.user}_pnls.json")
+        self.max_n_cancellations_per_batch = 10
+        self.max_n_creations_per_batch = 6
+        # amend in place only as the recorded exchange would
+        self.amend_supported = self.exchange == "bybit"
+
+        self.sim_balance = self.recording["balance"] or 0.0
+        self.sim_positions = {}
+        for elm in self.recording["positions"] or []:
+            pos = self.sim_positions.setdefault(
+                elm["symbol"], {"long": [0.0, 0.0], "short": [0.0, 0.0]}
+            )
+            sign = -1.0 if elm["position_side"] == "short" else 1.0
+            pos[elm["position_side"]] = [abs(elm["size"]) * sign, elm["price"]]
+        self.sim_orders = {elm["id"]: elm for elm in self.recording["open_orders"] or []}
+        self.sim_pnls = list(self.recording["pnls"] or [])
+        self.sim_tickers = {
+            symbol: dict(zip(["bid", "ask", "last"], ticker))
+            for symbol, ticker in self.recording["tickers"].items()
+        }
+        self.order_id_counter = 0
+        self.fill_timestamps = {}  # symbol -> virtual timestamp of fill not yet reacted to
+        self.metrics = {
+            "n_events": 0,
+            "events_cpu": 0.0,
+            "n_steps": 0,
+            "steps_cpu": 0.0,
+            "execution_millis": [],
+            "reaction_millis": [],
+            "n_fills": 0,
+            "n_created": 0,
+            "n_cancelled": 0,
+            "n_amended": 0,
+            "n_rejected": 0,
+        }
+
+    def get_user_info(self) -> dict:
+        return {
+            "exchange": self.recording["meta"].get("exchange", "replay"),
+            "key": "",
+            "secret": "",
+            "passphrase": "",
+        }
+
+    async def init_bot(self):
+        # replays start from recorded pnls only
+        if os.path.exists(self.pnls_cache_filepath):
+            os.remove(self.pnls_cache_filepath)
+        await self.init_symbols()
+        for symbol in self.symbols:
+            elm = self.markets_dict[symbol]
+            self.symbol_ids[symbol] = elm["id"]
+            self.min_costs[symbol] = (
+                0.1 if elm["limits"]["cost"]["min"] is None else elm["limits"]["cost"]["min"]
+            )
+            self.min_qtys[symbol] = elm["limits"]["amount"]["min"]
+            self.qty_steps[symbol] = elm["precision"]["amount"]
+            self.price_steps[symbol] = elm["precision"]["price"]
+            self.c_mults[symbol] = elm["contractSize"] or 1.0
+            self.coins[symbol] = symbol.replace("/USDT:USDT", "")
+            self.tickers[symbol] = {"bid": 0.0, "ask": 0.0, "last": 0.0}
+            self.open_orders[symbol] = []
+            self.positions[symbol] = {
+                "long": {"size": 0.0, "price": 0.0},
+                "short": {"size": 0.0, "price": 0.0},
+            }
+            self.upd_timestamps["open_orders"][symbol] = 0.0
+            self.upd_timestamps["tickers"][symbol] = 0.0
+            self.upd_timestamps["positions"][symbol] = 0.0
+        await super().init_bot()
+
+    async def start_bot(self):
+        await self.init_bot()
+        logging.info(f"done initiating bot, replaying {len(self.recording['stream'])} events")
+        wall_sts = perf_counter()
+        await self.replay()
+        self.metrics["wall_seconds"] = perf_counter() - wall_sts
+        return self.calc_metrics()
+
+    async def replay(self):
+        next_step_ts = self.clock.now + 1000.0
+        for ts, tickers in self.recording["stream"]:
+            next_step_ts = await self.step_until(ts, next_step_ts)
+            self.clock.now = max(self.clock.now, ts)
+            cpu_sts = process_time()
+            for symbol, bid, ask, last in tickers:
+                self.sim_tickers[symbol] = {"bid": bid, "ask": ask, "last": last}
+                if symbol in self.symbols:
+                    self.handle_ticker_update(
+                        {"symbol": symbol, "bid": bid, "ask": ask, "last": last}
+                    )
+                self.match_orders(symbol)
+            self.metrics["events_cpu"] += process_time() - cpu_sts
+            self.metrics["n_events"] += 1
+        await self.step_until(self.recording["end_ts"], next_step_ts)
+
+    async def step_until(self, ts: float, next_step_ts: float) -> float:
+        # runs the execution loop once per virtual second up to ts
+        while next_step_ts <= ts:
+            self.clock.now = next_step_ts
+            if self.speed > 0.0:
+                await asyncio.sleep(1.0 / self.speed)
+            cpu_sts = process_time()
+            await self.execution_step()
+            self.metrics["steps_cpu"] += process_time() - cpu_sts
+            self.metrics["n_steps"] += 1
+            next_step_ts += 1000.0
+        return next_step_ts
+
+    async def execute_to_exchange(self):
+        sts = perf_counter()
+        res = await super().execute_to_exchange()
+        self.metrics["execution_millis"].append((perf_counter() - sts) * 1000)
+        return res
+
+    def match_orders(self, symbol: str):
+        # fills open orders crossed by last price
+        last = self.sim_tickers[symbol]["last"]
+        for order in [x for x in self.sim_orders.values() if x["symbol"] == symbol]:
+            if (order["side"] == "buy" and last < order["price"]) or (
+                order["side"] == "sell" and last > order["price"]
+            ):
+                self.fill_order(order)
+
+    def fill_order(self, order: dict):
+        del self.sim_orders[order["id"]]
+        pos = self.sim_positions.setdefault(
+            order["symbol"], {"long": [0.0, 0.0], "short": [0.0, 0.0]}
+        )
+        psize, pprice = pos[order["position_side"]]
+        c_mult = self.c_mults[order["symbol"]] if order["symbol"] in self.symbols else 1.0
+        qty_step = self.qty_steps[order["symbol"]] if order["symbol"] in self.symbols else 0.0
+        qty = abs(order["qty"])
+        pnl = 0.0
+        if order["position_side"] == "long":
+            if order["side"] == "buy":
+                pos["long"] = list(
+                    calc_new_psize_pprice(psize, pprice, qty, order["price"], qty_step)
+                )
+            else:
+                qty = min(qty, psize)
+                pnl = calc_pnl_long(pprice, order["price"], qty, False, c_mult)
+                pos["long"] = [psize - qty, pprice] if psize - qty > qty_step / 2 else [0.0, 0.0]
+        else:
+            if order["side"] == "sell":
+                pos["short"] = list(
+                    calc_new_psize_pprice(psize, pprice, -qty, order["price"], qty_step)
+                )
+            else:
+                qty = min(qty, abs(psize))
+                pnl = calc_pnl_short(pprice, order["price"], qty, False, c_mult)
+                pos["short"] = (
+                    [psize + qty, pprice] if abs(psize) - qty > qty_step / 2 else [0.0, 0.0]
+                )
+        self.sim_balance += pnl - qty * order["price"] * c_mult * self.maker_fee
+        self.metrics["n_fills"] += 1
+        self.fill_timestamps.setdefault(order["symbol"], self.clock.now)
+        if pnl != 0.0:
+            self.sim_pnls.append(
+                {
+                    "id": f"{order['id']}_{self.metrics['n_fills']}",
+                    "symbol": order["symbol"],
+                    "timestamp": self.clock.now,
+                    "pnl": pnl,
+                }
+            )
+        if order["symbol"] in self.symbols:
+            self.handle_order_update([{**order, "filled": qty, "status": "closed"}])
+            self.handle_balance_update({"USDT": {"total": self.sim_balance}})
+
+    def record_reaction(self, symbol: str):
+        if symbol in self.fill_timestamps:
+            reaction_millis = self.clock.now - self.fill_timestamps.pop(symbol)
+            self.metrics["reaction_millis"].append(reaction_millis)
+
+    async def start_websockets(self):
+        pass
+
+    async def fetch_open_orders(self, symbol: str = None) -> [dict]:
+        return sorted(
+            [dict(x) for x in self.sim_orders.values() if symbol is None or x["symbol"] == symbol],
+            key=lambda x: x["timestamp"],
+        )
+
+    async def fetch_positions(self):
+        positions = []
+        for symbol in self.sim_positions:
+            for pside in ["long", "short"]:
+                if self.sim_positions[symbol][pside][0] != 0.0:
+                    positions.append(
+                        {
+                            "symbol": symbol,
+                            "position_side": pside,
+                            "size": self.sim_positions[symbol][pside][0],
+                            "price": self.sim_positions[symbol][pside][1],
+                            "timestamp": self.clock.now,
+                        }
+                    )
+        return positions, self.sim_balance
+
+    async def fetch_tickers(self):
+        return {symbol: {"symbol": symbol, **t} for symbol, t in self.sim_tickers.items()}
+
+    async def fetch_ohlcv(self, symbol: str, timeframe="1m"):
+        return self.recording["ohlcvs"].get(symbol, False)
+
+    async def fetch_pnls(self, symbol: str = None, start_time: int = None, end_time: int = None):
+        return [
+            x
+            for x in self.sim_pnls
+            if (symbol is None or x["symbol"] == symbol)
+            and (start_time is None or x["timestamp"] >= start_time)
+            and (end_time is None or x["timestamp"] <= end_time)
+        ]
+
+    async def execute_cancellation(self, order: dict) -> dict:
+        if order["id"] not in self.sim_orders:
+            return {}
+        del self.sim_orders[order["id"]]
+        self.metrics["n_cancelled"] += 1
+        self.record_reaction(order["symbol"])
+        return {
+            "symbol": order["symbol"],
+            "side": order["side"],
+            "id": order["id"],
+            "position_side": order["position_side"],
+            "qty": order["qty"],
+            "price": order["price"],
+        }
+
+    async def execute_cancellations(self, orders: [dict]) -> [dict]:
+        if len(orders) > self.max_n_cancellations_per_batch:
+            # prioritize cancelling reduce-only orders
+            orders = [x for x in orders if x["reduce_only"]] + [
+                x for x in orders if not x["reduce_only"]
+            ]
+        return await self.execute_multiple(
+            orders, "execute_cancellation", self.max_n_cancellations_per_batch
+        )
+
+    async def execute_order(self, order: dict) -> dict:
+        ticker = self.sim_tickers[order["symbol"]]
+        if (order["side"] == "buy" and order["price"] >= ticker["ask"]) or (
+            order["side"] == "sell" and order["price"] <= ticker["bid"]
+        ):
+            # post only order would have been taker
+            self.metrics["n_rejected"] += 1
+            return {}
+        self.order_id_counter += 1
+        executed = {
+            "id": str(self.order_id_counter),
+            "symbol": order["symbol"],
+            "side": order["side"],
+            "position_side": order["position_side"],
+            "qty": abs(order["qty"]),
+            "amount": abs(order["qty"]),
+            "price": order["price"],
+            "timestamp": self.clock.now,
+            "status": "open",
+            "custom_id": order.get("custom_id"),
+        }
+        self.sim_orders[executed["id"]] = executed
+        self.metrics["n_created"] += 1
+        self.record_reaction(order["symbol"])
+        return dict(executed)
+
+    async def execute_orders(self, orders: [dict]) -> [dict]:
+        return await self.execute_multiple(orders, "execute_order", self.max_n_creations_per_batch)
+
+    async def execute_multiple(self, orders: [dict], type_: str, max_n_executions: int):
+        # sequential, so replays are deterministic
+        results = []
+        for order in orders[:max_n_executions]:
+            result = await getattr(self, type_)(order)
+            if result:
+                results.append(result)
+        return results
+
+    async def execute_amendment(self, amendment: (dict, dict)) -> (dict, dict):
+        old, order = amendment
+        if old["id"] not in self.sim_orders:
+            return ()
+        ticker = self.sim_tickers[order["symbol"]]
+        if (order["side"] == "buy" and order["price"] >= ticker["ask"]) or (
+            order["side"] == "sell" and order["price"] <= ticker["bid"]
+        ):
+            # post only order is cancelled instead of amended into a taker
+            del self.sim_orders[old["id"]]
+            self.metrics["n_rejected"] += 1
+            return ()
+        amended = {
+            **self.sim_orders[old["id"]],
+            "qty": abs(order["qty"]),
+            "amount": abs(order["qty"]),
+            "price": order["price"],
+        }
+        self.sim_orders[old["id"]] = amended
+        self.metrics["n_amended"] += 1
+        self.record_reaction(order["symbol"])
+        return old, dict(amended)
+
+    async def execute_amendments(self, amendments: [(dict, dict)]) -> [(dict, dict)]:
+        return await self.execute_multiple(
+            amendments, "execute_amendment", self.max_n_creations_per_batch
+        )
+
+    async def update_exchange_config(self):
+        return True
+
+    def calc_metrics(self) -> dict:
+        m = self.metrics
+        n_fills = max(m["n_fills"], 1)
+        virtual_seconds = (self.recording["end_ts"] - self.recording["start_ts"]) / 1000
+        live_orders = self.recording["live_orders"]
+        return {
+            "replayed_hours": virtual_seconds / 60 / 60,
+            "wall_seconds": m["wall_seconds"],
+            "speedup": virtual_seconds / max(m["wall_seconds"], 1e-9),
+            "n_events": m["n_events"],
+            "cpu_micros_per_event": m["events_cpu"] / max(m["n_events"], 1) * 1e6,
+            "n_loop_steps": m["n_steps"],
+            "cpu_micros_per_loop_step": m["steps_cpu"] / max(m["n_steps"], 1) * 1e6,
+            "n_executions": len(m["execution_millis"]),
+            "execution_millis_mean": float(np.mean(m["execution_millis"] or [0.0])),
+            "execution_millis_p99": float(np.percentile(m["execution_millis"] or [0.0], 99)),
+            "reaction_millis_mean": float(np.mean(m["reaction_millis"] or [0.0])),
+            "reaction_millis_max": float(np.max(m["reaction_millis"] or [0.0])),
+            "n_fills": m["n_fills"],
+            "n_created": m["n_created"],
+            "n_cancelled": m["n_cancelled"],
+            "n_amended": m["n_amended"],
+            "n_rejected": m["n_rejected"],
+            "created_per_fill": m["n_created"] / n_fills,
+            "cancelled_per_fill": m["n_cancelled"] / n_fills,
+            "amended_per_fill": m["n_amended"] / n_fills,
+            "n_kept": self.order_diff_counters["kept"],
+            "n_kept_within_tolerance": self.order_diff_counters["tolerated"],
+            "recorded_live_created": len([x for x in live_orders if x["status"] == "open"]),
+            "recorded_live_cancelled": len(
+                [x for x in live_orders if x["status"] in ["canceled", "expired"]]
+            ),
+            **{
+                f"n_rest_refreshes_{resource}": counters["fetched"]
+                for resource, counters in self.snapshots.counters.items()
+            },
+            "final_balance": self.sim_balance,
+        }
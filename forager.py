@@ -24,6 +24,8 @@ from procedures import (
     utc_ms,
     make_get_filepath,
     get_first_ohlcv_timestamps,
+    load_markets_cached,
+    dump_markets_store,
 )
 from njit_funcs import calc_emas
 from pure_funcs import determine_pos_side_ccxt, date_to_ts2
@@ -53,7 +55,7 @@ def score_func(ohlcv):
 
 def calc_unilateralness(ohlcv):
     # higher means more unilateral
-    closes = np.array(ohlcv)[:, 4]
+    closes = np.asarray(ohlcv)[:, 4]
     spans = [int(round(len(closes) * i)) for i in np.linspace(0.1, 0.9, 4)]
     emas = calc_emas(closes, np.array(spans))
     return abs(sum([(1 - emas[:, i] / emas[:, i - 1]).mean() for i in range(1, len(emas[0]))]))
@@ -61,20 +63,129 @@ def calc_unilateralness(ohlcv):
 
 def calc_noisiness(ohlcv):
     # higher is more noisy
-    highs = np.array(ohlcv)[:, 2]
-    lows = np.array(ohlcv)[:, 3]
-    closes = np.array(ohlcv)[:, 4]
+    ohlcv = np.asarray(ohlcv)
+    highs = ohlcv[:, 2]
+    lows = ohlcv[:, 3]
+    closes = ohlcv[:, 4]
     range_mean = ((highs - lows) / closes).mean()
     return range_mean
 
 
 def calc_volume_sum(ohlcv):
-    vols = np.array(ohlcv)[:, 5]
-    closes = np.array(ohlcv)[:, 4]
+    ohlcv = np.asarray(ohlcv)
+    vols = ohlcv[:, 5]
+    closes = ohlcv[:, 4]
     return (vols * closes).sum()
 
 
-def sort_symbols(ohlcvs, config):
+def calc_row_sums(ohlcv):
+    # per row terms of calc_volume_sum and calc_noisiness, summed: [volume sum, range sum]
+    ohlcv = np.asarray(ohlcv).reshape(-1, 6)
+    return np.array(
+        [
+            (ohlcv[:, 5] * ohlcv[:, 4]).sum(),
+            ((ohlcv[:, 2] - ohlcv[:, 3]) / ohlcv[:, 4]).sum(),
+        ]
+    )
+
+
+class OHLCVCache:
+    """
+    rolling per symbol ohlcv windows, kept as numpy arrays between forager cycles
+    symbols whose last cached candle is still the open one are not fetched;
+    otherwise only candles since the last cached one are fetched, replacing it
+    volume and noisiness are kept as running sums, updated with appended and dropped candles;
+    other ranking metrics are memoized per symbol and recomputed only when the window changed
+    """
+
+    def __init__(self):
+        # {symbol: np.ndarray [[timestamp, open, high, low, close, volume]]}
+        self.ohlcvs = {}
+        # {symbol: n candles in window}
+        self.window_lens = {}
+        # {symbol: utc ms of last fetch}
+        self.fetched_at = {}
+        # {symbol: np.ndarray [volume sum, range sum]}, see calc_row_sums
+        self.row_sums = {}
+        # {(symbol, metric title): (window key, value)}
+        self.metrics = {}
+        self.report = {}
+
+    async def update(self, cc, symbols, config):
+        interval_ms = cc.parse_timeframe(config["ohlcv_interval"]) * 1000
+        now = utc_ms()
+        full, incremental, skipped = [], [], []
+        for symbol in symbols:
+            if symbol not in self.ohlcvs or len(self.ohlcvs[symbol]) == 0:
+                full.append(symbol)
+            elif now - self.ohlcvs[symbol][-1][0] > interval_ms * self.window_lens[symbol]:
+                # gap longer than window; refetch whole window
+                full.append(symbol)
+            elif now < self.ohlcvs[symbol][-1][0] + interval_ms:
+                # last cached candle is still open; it is refreshed once its interval has closed
+                skipped.append(symbol)
+            else:
+                # refetch from last cached candle, which may have been incomplete
+                incremental.append(symbol)
+        n_candles_fetched = 0
+        fetched = await get_ohlcvs(cc, full, config)
+        for symbol in fetched:
+            self.ohlcvs[symbol] = np.array(fetched[symbol], dtype=np.float64).reshape(-1, 6)
+            self.window_lens[symbol] = len(self.ohlcvs[symbol])
+            self.row_sums[symbol] = calc_row_sums(self.ohlcvs[symbol])
+            self.fetched_at[symbol] = now
+            n_candles_fetched += len(self.ohlcvs[symbol])
+        since = {s: int(self.ohlcvs[s][-1][0]) for s in incremental}
+        # enough candles to backfill the whole gap since last cached candle
+        limit = {s: int((now - since[s]) // interval_ms) + 2 for s in incremental}
+        fetched = await get_ohlcvs(cc, incremental, config, since=since, limit=limit)
+        for symbol in fetched:
+            new = np.array(fetched[symbol], dtype=np.float64).reshape(-1, 6)
+            n_candles_fetched += len(new)
+            if len(new) > 0:
+                # last cached candle may have been incomplete; replace overlapping candles
+                old = self.ohlcvs[symbol]
+                replaced = old[old[:, 0] >= new[0][0]]
+                combined = np.concatenate([old[old[:, 0] < new[0][0]], new])
+                dropped = combined[: max(0, len(combined) - self.window_lens[symbol])]
+                self.ohlcvs[symbol] = combined[len(dropped) :]
+                self.row_sums[symbol] += (
+                    calc_row_sums(new) - calc_row_sums(replaced) - calc_row_sums(dropped)
+                )
+            self.fetched_at[symbol] = now
+        n_calls_made = len(full) + len(incremental)
+        self.report = {
+            "n_symbols": len(symbols),
+            "n_full_fetches": len(full),
+            "n_incremental_fetches": len(incremental),
+            "n_rest_calls_made": n_calls_made,
+            "n_rest_calls_saved": len(skipped),
+            "n_candles_fetched": n_candles_fetched,
+        }
+        print(
+            f"ohlcv cache: {len(full)} full fetches, {len(incremental)} incremental fetches, "
+            f"{n_calls_made} REST calls made, {len(skipped)} saved, "
+            f"fetched {n_candles_fetched} candles"
+        )
+        return {s: self.ohlcvs[s] for s in symbols if s in self.ohlcvs}
+
+    def calc_metric(self, symbol, title, func, ohlcv):
+        if symbol in self.row_sums and ohlcv is self.ohlcvs[symbol]:
+            if title == "volume":
+                return self.row_sums[symbol][0]
+            if title == "noisiness":
+                return self.row_sums[symbol][1] / len(ohlcv)
+        key = (symbol, title)
+        # last candle may be replaced in place by a refetch, so its values are part of the key
+        window_key = (len(ohlcv), ohlcv[0][0], tuple(ohlcv[-1]))
+        if key in self.metrics and self.metrics[key][0] == window_key:
+            return self.metrics[key][1]
+        value = func(ohlcv)
+        self.metrics[key] = (window_key, value)
+        return value
+
+
+def sort_symbols(ohlcvs, config, ohlcv_cache=None):
     min_n_syms = max(config["n_longs"], config["n_shorts"])
     print("min_n_syms", min_n_syms)
     filtered_syms = list(ohlcvs)
@@ -86,9 +197,13 @@ def sort_symbols(ohlcvs, config):
     ]:
         if config[f"{title}_clip_threshold"] == 0.0:
             continue
-        by_func = sorted(
-            [(func(ohlcvs[sym]), sym) for sym in filtered_syms], reverse=higher_is_better
-        )
+        if ohlcv_cache is None:
+            values = [func(ohlcvs[sym]) for sym in filtered_syms]
+        else:
+            values = [
+                ohlcv_cache.calc_metric(sym, title, func, ohlcvs[sym]) for sym in filtered_syms
+            ]
+        by_func = sorted(zip(values, filtered_syms), reverse=higher_is_better)
         print(
             f"sorted by {title} {'high to low' if higher_is_better else 'low to high'} n syms: {len(by_func)}"
         )
@@ -101,7 +216,7 @@ def sort_symbols(ohlcvs, config):
     return by_func
 
 
-def generate_yaml(
+def calc_bot_instances(
     sorted_syms,
     config,
     current_positions_long,
@@ -109,14 +224,13 @@ def generate_yaml(
     current_open_orders_long,
     current_open_orders_short,
 ):
-    yaml = f"session_name: {config['user']}\nwindows:\n"
+    """
+    returns [(symbol, passivbot command, is_active)]; bots not active are on graceful stop
+    commands exclude before_command and start delay
+    """
     user = config["user"]
     twe_long = config["twe_long"]
     twe_short = config["twe_short"]
-    if config["before_command"] and not config["before_command"].strip().endswith("&&"):
-        before_command = config["before_command"] + " && "
-    else:
-        before_command = config["before_command"]
 
     n_longs = config["n_longs"]
     n_shorts = config["n_shorts"]
@@ -185,9 +299,7 @@ def generate_yaml(
             bots_on_gs.append(elm)
 
     bot_instances = []
-    sleep_duration = -config["sleep_interval"]
     for sym, long_enabled, short_enabled in active_bots + bots_on_gs:
-        sleep_duration += config["sleep_interval"]
         lm = "n" if long_enabled and lw > 0.0 else "gs"
         sm = "n" if short_enabled and sw > 0.0 else "gs"
         if sym in config["live_configs_map_long"]:
@@ -210,33 +322,44 @@ def generate_yaml(
             conf_path_long = conf_path_short
 
         if conf_path_long == conf_path_short:
-            pane = f"    - shell_command:\n      - {before_command} sleep {sleep_duration}; python3 passivbot.py {user} {sym} {conf_path_long} "
-            pane += f"-lw {lw} -sw {sw} -lm {lm} -sm {sm} -lev {config['leverage']} -cd -pt {config['price_distance_threshold']}"
-            bot_instances.append((sym, pane))
+            cmd = f"python3 passivbot.py {user} {sym} {conf_path_long} "
+            cmd += f"-lw {lw} -sw {sw} -lm {lm} -sm {sm} -lev {config['leverage']} -cd -pt {config['price_distance_threshold']}"
+            bot_instances.append((sym, cmd, sym in active_longs or sym in active_shorts))
         else:
             # long and short use different configs
             long_active = sym in active_longs or sym in current_positions_long
             short_active = sym in active_shorts or sym in current_positions_short
             if long_active and short_active:
                 # two separate bot instances for long & short
-                pane = f"    - shell_command:\n      - {before_command} sleep {sleep_duration}; python3 passivbot.py {user} {sym} {conf_path_long} "
-                pane += f"-lw {lw} -sw {sw} -lm {lm} -sm m -lev {config['leverage']} -cd -pt {config['price_distance_threshold']}"
-                bot_instances.append((sym, pane))
-                pane = f"    - shell_command:\n      - {before_command} sleep {sleep_duration}; python3 passivbot.py {user} {sym} {conf_path_short} "
-                pane += f"-lw {lw} -sw {sw} -lm m -sm {sm} -lev {config['leverage']} -cd -pt {config['price_distance_threshold']}"
-                bot_instances.append((sym, pane))
+                cmd = f"python3 passivbot.py {user} {sym} {conf_path_long} "
+                cmd += f"-lw {lw} -sw {sw} -lm {lm} -sm m -lev {config['leverage']} -cd -pt {config['price_distance_threshold']}"
+                bot_instances.append((sym, cmd, sym in active_longs or sym in active_shorts))
+                cmd = f"python3 passivbot.py {user} {sym} {conf_path_short} "
+                cmd += f"-lw {lw} -sw {sw} -lm m -sm {sm} -lev {config['leverage']} -cd -pt {config['price_distance_threshold']}"
+                bot_instances.append((sym, cmd, sym in active_longs or sym in active_shorts))
             elif long_active:
-                pane = f"    - shell_command:\n      - {before_command} sleep {sleep_duration}; python3 passivbot.py {user} {sym} {conf_path_long} "
-                pane += f"-lw {lw} -sw {sw} -lm {lm} -sm {sm} -lev {config['leverage']} -cd -pt {config['price_distance_threshold']}"
-                bot_instances.append((sym, pane))
+                cmd = f"python3 passivbot.py {user} {sym} {conf_path_long} "
+                cmd += f"-lw {lw} -sw {sw} -lm {lm} -sm {sm} -lev {config['leverage']} -cd -pt {config['price_distance_threshold']}"
+                bot_instances.append((sym, cmd, sym in active_longs or sym in active_shorts))
             elif short_active:
-                pane = f"    - shell_command:\n      - {before_command} sleep {sleep_duration}; python3 passivbot.py {user} {sym} {conf_path_short} "
-                pane += f"-lw {lw} -sw {sw} -lm {lm} -sm {sm} -lev {config['leverage']} -cd -pt {config['price_distance_threshold']}"
-                bot_instances.append((sym, pane))
+                cmd = f"python3 passivbot.py {user} {sym} {conf_path_short} "
+                cmd += f"-lw {lw} -sw {sw} -lm {lm} -sm {sm} -lev {config['leverage']} -cd -pt {config['price_distance_threshold']}"
+                bot_instances.append((sym, cmd, sym in active_longs or sym in active_shorts))
+    return bot_instances
+
+
+def generate_yaml(bot_instances, config):
+    yaml = f"session_name: {config['user']}\nwindows:\n"
+    before_command = get_before_command(config)
     both_on_gs = False
     z = 0
-    for sym, pane in bot_instances:
-        if not both_on_gs and sym not in active_longs and sym not in active_shorts:
+    sleep_duration, prev_sym = -config["sleep_interval"], None
+    for sym, cmd, is_active in bot_instances:
+        if sym != prev_sym:
+            sleep_duration += config["sleep_interval"]
+            prev_sym = sym
+        pane = f"    - shell_command:\n      - {before_command} sleep {sleep_duration}; {cmd}"
+        if not both_on_gs and not is_active:
             z = 0
             both_on_gs = True
         if z % config["max_n_panes"] == 0:
@@ -249,7 +372,17 @@ def generate_yaml(
     return yaml
 
 
-async def get_ohlcvs(cc, symbols, config):
+def get_before_command(config):
+    if config["before_command"] and not config["before_command"].strip().endswith("&&"):
+        return config["before_command"] + " && "
+    return config["before_command"]
+
+
+async def get_ohlcvs(cc, symbols, config, since=None, limit=None):
+    """
+    since: optional {symbol: timestamp}; fetch only candles from timestamp onwards
+    limit: optional {symbol: n candles} to fetch from since
+    """
     ohs = {}
     n = 5
     if cc.id == "bybit":
@@ -265,8 +398,10 @@ async def get_ohlcvs(cc, symbols, config):
             "1w": 604800,
         }
         max_n_ohlcvs = 200
-        since = int(utc_ms() - interval_map[config["ohlcv_interval"]] * max_n_ohlcvs * 1000)
-        extra_args = {"since": since}
+        default_since = int(
+            utc_ms() - interval_map[config["ohlcv_interval"]] * max_n_ohlcvs * 1000
+        )
+        extra_args = {"since": default_since}
     else:
         extra_args = {}
     print("n syms", len(symbols))
@@ -274,7 +409,15 @@ async def get_ohlcvs(cc, symbols, config):
         js = list(range(i, min(len(symbols), i + n)))
         fetched = await asyncio.gather(
             *[
-                cc.fetch_ohlcv(symbols[j], timeframe=config["ohlcv_interval"], **extra_args)
+                cc.fetch_ohlcv(
+                    symbols[j],
+                    timeframe=config["ohlcv_interval"],
+                    **(
+                        {"since": since[symbols[j]], "limit": (limit or {}).get(symbols[j])}
+                        if since is not None and symbols[j] in since
+                        else extra_args
+                    ),
+                )
                 for j in js
             ]
         )
@@ -329,6 +472,14 @@ async def get_current_symbols(cc):
 
 async def get_min_costs_and_contract_multipliers(cc):
     exchange = cc.id
+    if not cc.markets:
+        # markets store is shared with backtest and optimize; avoids refetching all markets on start
+        markets = load_markets_cached(exchange)
+        if markets is None:
+            await cc.load_markets()
+            dump_markets_store(exchange, list(cc.markets.values()))
+        else:
+            cc.set_markets(markets)
     info = await cc.load_markets()
 
     # tickers format is {"COIN/USDT:USDT": {"last": float, ...}, ...}
@@ -389,7 +540,7 @@ async def get_min_costs_and_contract_multipliers(cc):
     return min_costs, c_mults
 
 
-async def dump_yaml(cc, config):
+async def dump_yaml(cc, config, ohlcv_cache=None):
     max_min_cost = config["max_min_cost"]
     print("getting min costs...")
     min_costs, c_mults = await get_min_costs_and_contract_multipliers(cc)
@@ -484,16 +635,18 @@ async def dump_yaml(cc, config):
     print("current_open_orders long", sorted(current_open_orders_long))
     print("current_open_orders short", sorted(current_open_orders_short))
     print("getting ohlcvs...")
-    ohs = await get_ohlcvs(cc, [symbols_map_inv[sym] for sym in approved], config)
+    if ohlcv_cache is None:
+        ohs = await get_ohlcvs(cc, [symbols_map_inv[sym] for sym in approved], config)
+    else:
+        ohs = await ohlcv_cache.update(cc, [symbols_map_inv[sym] for sym in approved], config)
     max_len_ohlcv = max([len(ohs[s]) for s in ohs])
     print("max_len_ohlcv", max_len_ohlcv)
-    ohs = {symbols_map[k]: v for k, v in ohs.items() if len(v) == max_len_ohlcv}
+    ohs = {symbols_map[k]: np.array(v) for k, v in ohs.items() if len(v) == max_len_ohlcv}
     for sym in ohs:
-        for i in range(len(ohs[sym])):
-            ohs[sym][i][5] *= c_mults[symbols_map_inv[sym]]
-    sorted_syms = sort_symbols(ohs, config)  # sorted best to worst
+        ohs[sym][:, 5] *= c_mults[symbols_map_inv[sym]]
+    sorted_syms = sort_symbols(ohs, config, ohlcv_cache)  # sorted best to worst
     print(f"generating yaml {config['yaml_filepath']}...")
-    yaml = generate_yaml(
+    bot_instances = calc_bot_instances(
         sorted_syms,
         config,
         current_positions_long,
@@ -501,8 +654,113 @@ async def dump_yaml(cc, config):
         current_open_orders_long,
         current_open_orders_short,
     )
+    yaml = generate_yaml(bot_instances, config)
     with open(config["yaml_filepath"], "w") as f:
         f.write(yaml)
+    return bot_instances
+
+
+def tmux_session_exists(session):
+    return subprocess.run(["tmux", "has-session", "-t", session], capture_output=True).returncode == 0
+
+
+def list_tmux_panes(session):
+    # pane ids in yaml order: windows by index, panes by index
+    res = subprocess.run(
+        ["tmux", "list-panes", "-s", "-t", session, "-F", "#{pane_id}"],
+        capture_output=True,
+        text=True,
+    )
+    return res.stdout.split() if res.returncode == 0 else []
+
+
+def get_tmux_pane_states(session):
+    """
+    returns {pane_id: (pane_dead, pane_current_command)}
+    """
+    res = subprocess.run(
+        ["tmux", "list-panes", "-s", "-t", session, "-F"]
+        + ["#{pane_id} #{pane_dead} #{pane_current_command}"],
+        capture_output=True,
+        text=True,
+    )
+    if res.returncode != 0:
+        return {}
+    states = {}
+    for line in res.stdout.splitlines():
+        pane_id, pane_dead, current_command = (line.split(" ", 2) + ["", ""])[:3]
+        states[pane_id] = (pane_dead == "1", current_command.strip())
+    return states
+
+
+def is_bot_pane_alive(pane_dead, current_command):
+    # crashed bot leaves pane at shell prompt; sleep is staggered start before bot launches
+    return not pane_dead and (current_command.startswith("python") or current_command == "sleep")
+
+
+def restart_session(config, bot_instances):
+    """
+    kills tmux session and loads yaml; returns {command: pane_id}
+    """
+    subprocess.run(["tmux", "kill-session", "-t", config["user"]])
+    subprocess.run(["tmuxp", "load", "-d", config["yaml_filepath"]])
+    pane_ids = list_tmux_panes(config["user"])
+    if len(pane_ids) != len(bot_instances):
+        print(f"warning: {len(pane_ids)} panes for {len(bot_instances)} bots; next rollover restarts all")
+        return {}
+    return {cmd: pane_id for (sym, cmd, is_active), pane_id in zip(bot_instances, pane_ids)}
+
+
+def rollover_diff(config, bot_instances, panes):
+    """
+    diffs new bot commands against running panes {command: pane_id}
+    stops panes whose command is no longer wanted and starts panes for new commands
+    bots whose command is unchanged keep running; crashed bots are restarted
+    returns updated {command: pane_id}
+    """
+    pane_states = get_tmux_pane_states(config["user"])
+    running = {cmd: pane_id for cmd, pane_id in panes.items() if pane_id in pane_states}
+    crashed = {
+        cmd: pane_id
+        for cmd, pane_id in running.items()
+        if not is_bot_pane_alive(*pane_states[pane_id])
+    }
+    for cmd, pane_id in crashed.items():
+        subprocess.run(["tmux", "kill-pane", "-t", pane_id])
+        del running[cmd]
+    wanted = {cmd: sym for sym, cmd, is_active in bot_instances}
+    to_stop = {cmd: pane_id for cmd, pane_id in running.items() if cmd not in wanted}
+    to_start = [(sym, cmd) for sym, cmd, is_active in bot_instances if cmd not in running]
+    reconfigured = {cmd.split()[3] for cmd in to_stop} & {sym for sym, cmd in to_start}
+    restarted = {cmd.split()[3] for cmd in crashed if cmd in wanted}
+    for cmd, pane_id in to_stop.items():
+        subprocess.run(["tmux", "kill-pane", "-t", pane_id])
+        del running[cmd]
+    before_command = get_before_command(config)
+    root_dir = os.path.expanduser(config["passivbot_root_dir"])
+    for i, (sym, cmd) in enumerate(to_start):
+        res = subprocess.run(
+            ["tmux", "new-window", "-d", "-P", "-F", "#{pane_id}", "-t", f"{config['user']}:"]
+            + ["-n", f"{config['user']}_{sym}", "-c", root_dir],
+            capture_output=True,
+            text=True,
+        )
+        pane_id = res.stdout.strip()
+        if res.returncode != 0 or not pane_id:
+            print(f"error starting pane for {sym}: {res.stderr.strip()}")
+            continue
+        sleep_duration = i * config["sleep_interval"]
+        subprocess.run(
+            ["tmux", "send-keys", "-t", pane_id, f"{before_command} sleep {sleep_duration}; {cmd}"]
+            + ["Enter"]
+        )
+        running[cmd] = pane_id
+    print(
+        f"rollover: {len(running) - len(to_start)} bots kept, {len(to_stop)} stopped, "
+        f"{len(to_start)} started, of which {len(reconfigured)} reconfigured "
+        f"{sorted(reconfigured)} and {len(restarted)} restarted after crash {sorted(restarted)}"
+    )
+    return running
 
 
 async def main():
@@ -575,6 +833,7 @@ async def main():
         ("passivbot_root_dir", "~/passivbot"),
         ("sleep_interval", 5),
         ("before_command", ""),
+        ("rollover_mode", "restart"),
     ]:
         if key not in config:
             config[key] = value
@@ -591,19 +850,25 @@ async def main():
     exchange, key, secret, passphrase = load_exchange_key_secret_passphrase(config["user"])
     max_n_tries_per_hour = 5
     error_timestamps = []
+    ohlcv_cache = OHLCVCache()
+    # {passivbot command: tmux pane id} of bots started by this forager
+    panes = {}
     while True:
         try:
             cc = getattr(ccxt, exchange_map[exchange])(
                 {"apiKey": key, "secret": secret, "password": passphrase}
             )
-            await dump_yaml(cc, config)
-            print("waiting one minute to avoid API rate limiting...")
-            for i in range(60, -1, -1):
-                time.sleep(1)
-                print(f"\rcountdown: {i}    ", end=" ")
-            print()
-            subprocess.run(["tmux", "kill-session", "-t", config["user"]])
-            subprocess.run(["tmuxp", "load", "-d", config["yaml_filepath"]])
+            bot_instances = await dump_yaml(cc, config, ohlcv_cache)
+            if config["rollover_mode"] == "diff" and panes and tmux_session_exists(config["user"]):
+                # unchanged bots keep running; no waiting needed for restarts
+                panes = rollover_diff(config, bot_instances, panes)
+            else:
+                print("waiting one minute to avoid API rate limiting...")
+                for i in range(60, -1, -1):
+                    time.sleep(1)
+                    print(f"\rcountdown: {i}    ", end=" ")
+                print()
+                panes = restart_session(config, bot_instances)
             if args.no_loop:
                 return
             for i in range(config["update_interval_minutes"] * 60, -1, -1):
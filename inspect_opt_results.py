@@ -77,6 +77,8 @@ def main():
         args.results_fpath = os.path.join(args.results_fpath, "all_results.txt")
     with open(args.results_fpath) as f:
         results = [json.loads(x) for x in f.readlines()]
+    # drop results scored on partial date range by successive halving
+    results = [r for r in results if r.get("fidelity", 1.0) >= 1.0]
     print(f"{'n results': <{klen}} {len(results)}")
     passivbot_mode = determine_passivbot_mode(make_compatible(results[-1]["config"]))
     all_scores = []
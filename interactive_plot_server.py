@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import threading
+import webbrowser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import pandas as pd
+
+from procedures import make_get_filepath
+
+# level of detail pyramid; each level is aggregated from the previous one
+LEVELS = [
+    ("1m", 60 * 1000),
+    ("5m", 5 * 60 * 1000),
+    ("1h", 60 * 60 * 1000),
+    ("1d", 24 * 60 * 60 * 1000),
+]
+FILL_KINDS = ["entry", "profit", "loss"]
+FILL_COLUMNS = ["timestamp", "price", "qty", "pnl", "wallet_exposure", "n_fills"]
+
+
+def calc_ohlc(data: np.ndarray, is_ohlcv: bool = True) -> np.ndarray:
+    """
+    data: ohlcv cache rows [timestamp, high, low, close] or ticks rows [timestamp, qty, price]
+    returns 1m candles [[timestamp, open, high, low, close]]
+    open is previous candle's close, as in interactive_plot.create_graphs
+    """
+    timestamps = data[:, 0]
+    if is_ohlcv:
+        highs, lows, closes = data[:, 1], data[:, 2], data[:, 3]
+    else:
+        highs = lows = closes = data[:, 2]
+    return aggregate_ohlc(
+        np.column_stack([timestamps, closes, highs, lows, closes]).astype(np.float64), LEVELS[0][1]
+    )
+
+
+def aggregate_ohlc(ohlc: np.ndarray, interval_ms: int) -> np.ndarray:
+    """
+    aggregates candles [[timestamp, open, high, low, close]] into candles of interval_ms
+    """
+    buckets = ohlc[:, 0] // interval_ms
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(buckets)) + 1])
+    ends = np.concatenate([starts[1:], [len(ohlc)]]) - 1
+    opens = np.concatenate([[ohlc[0, 4]], ohlc[ends[:-1], 4]])
+    return np.column_stack(
+        [
+            buckets[starts] * interval_ms,
+            opens,
+            np.maximum.reduceat(ohlc[:, 2], starts),
+            np.minimum.reduceat(ohlc[:, 3], starts),
+            ohlc[ends, 4],
+        ]
+    )
+
+
+def calc_fill_clusters(fills: pd.DataFrame, interval_ms: int) -> dict:
+    """
+    clusters fills per candle of interval_ms into entries, profits and losses
+    returns {kind: np.ndarray [[timestamp, vwap price, qty sum, pnl sum, wallet_exposure, n_fills]]}
+    """
+    clusters = {}
+    if fills.empty:
+        return {kind: np.empty((0, len(FILL_COLUMNS))) for kind in FILL_KINDS}
+    fdf = fills.reset_index(drop=True)
+    is_entry = fdf.type.str.contains("entry")
+    kinds = {
+        "entry": fdf[is_entry],
+        "profit": fdf[~is_entry & (fdf.pnl >= 0.0)],
+        "loss": fdf[~is_entry & (fdf.pnl < 0.0)],
+    }
+    for kind, kdf in kinds.items():
+        if kdf.empty:
+            clusters[kind] = np.empty((0, len(FILL_COLUMNS)))
+            continue
+        kdf = kdf.assign(
+            bucket=kdf.timestamp // interval_ms * interval_ms,
+            cost=kdf.price * kdf.qty.abs(),
+            qty_abs=kdf.qty.abs(),
+        )
+        grouped = kdf.groupby("bucket")
+        agg = pd.DataFrame(
+            {
+                "timestamp": grouped.timestamp.first(),
+                "price": grouped.cost.sum() / grouped.qty_abs.sum(),
+                "qty": grouped.qty.sum(),
+                "pnl": grouped.pnl.sum(),
+                "wallet_exposure": grouped.wallet_exposure.last(),
+                "n_fills": grouped.size(),
+            }
+        )
+        clusters[kind] = agg[FILL_COLUMNS].values.astype(np.float64)
+    return clusters
+
+
+def build_pyramid(data: np.ndarray, longs: pd.DataFrame, shorts: pd.DataFrame, is_ohlcv=True):
+    """
+    precomputes candles and fill clusters for all levels of detail
+    returns {"{level}_candles": arr, "{level}_{side}_{kind}": arr}
+    """
+    pyramid = {}
+    ohlc = calc_ohlc(data, is_ohlcv)
+    for level, interval_ms in LEVELS:
+        ohlc = aggregate_ohlc(ohlc, interval_ms)
+        pyramid[f"{level}_candles"] = ohlc
+        for side, fills in [("long", longs), ("short", shorts)]:
+            for kind, arr in calc_fill_clusters(fills, interval_ms).items():
+                pyramid[f"{level}_{side}_{kind}"] = arr
+    return pyramid
+
+
+def dump_pyramid(pyramid: dict, meta: dict, dirpath: str):
+    np.savez_compressed(os.path.join(dirpath, "interactive_plot_pyramid.npz"), **pyramid)
+    json.dump(meta, open(os.path.join(dirpath, "interactive_plot_meta.json"), "w"))
+
+
+def load_pyramid(dirpath: str) -> (dict, dict):
+    with np.load(os.path.join(dirpath, "interactive_plot_pyramid.npz")) as data:
+        pyramid = {k: data[k] for k in data.files}
+    meta = json.load(open(os.path.join(dirpath, "interactive_plot_meta.json")))
+    return pyramid, meta
+
+
+class ChartData:
+    def __init__(self, pyramid: dict, meta: dict, max_candles: int = 2000):
+        self.pyramid = pyramid
+        self.meta = meta
+        self.max_candles = max_candles
+        candles = pyramid[f"{LEVELS[0][0]}_candles"]
+        self.ts_min, self.ts_max = float(candles[0, 0]), float(candles[-1, 0])
+
+    def select_level(self, start: float, end: float) -> str:
+        # finest level with no more than max_candles candles in window
+        for level, interval_ms in LEVELS:
+            if (end - start) / interval_ms <= self.max_candles:
+                return level
+        return LEVELS[-1][0]
+
+    def get_window(self, start: float, end: float) -> dict:
+        level = self.select_level(start, end)
+        candles = self.pyramid[f"{level}_candles"]
+        ia, ib = np.searchsorted(candles[:, 0], [start, end], side="left")
+        window = {
+            "level": level,
+            "candles": candles[max(0, ia - 1) : ib + 1].tolist(),
+            "fills": {},
+        }
+        for side in ["long", "short"]:
+            for kind in FILL_KINDS:
+                arr = self.pyramid[f"{level}_{side}_{kind}"]
+                ia, ib = np.searchsorted(arr[:, 0], [start, end], side="left")
+                window["fills"][f"{side}_{kind}"] = arr[ia:ib].tolist()
+        return window
+
+
+def make_handler(chart_data: ChartData):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/":
+                html = HTML_TEMPLATE.replace("%TITLE%", chart_data.meta["title"])
+                self.respond(html, "text/html")
+            elif url.path == "/meta":
+                meta = {**chart_data.meta, "ts_min": chart_data.ts_min, "ts_max": chart_data.ts_max}
+                self.respond(json.dumps(meta), "application/json")
+            elif url.path == "/data":
+                query = parse_qs(url.query)
+                start = float(query.get("start", [chart_data.ts_min])[0])
+                end = float(query.get("end", [chart_data.ts_max])[0])
+                self.respond(json.dumps(chart_data.get_window(start, end)), "application/json")
+            else:
+                self.send_error(404)
+
+        def respond(self, content: str, content_type: str):
+            body = content.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(dirpath: str, host: str = "127.0.0.1", port: int = 8050, open_browser: bool = True):
+    pyramid, meta = load_pyramid(dirpath)
+    server = ThreadingHTTPServer((host, port), make_handler(ChartData(pyramid, meta)))
+    url = f"http://{host}:{server.server_address[1]}/"
+    print(f"serving interactive plot at {url} ctrl+c to stop")
+    if open_browser:
+        threading.Timer(0.5, webbrowser.open, args=(url,)).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def dump_interactive_plot_data(
+    config: dict, data: np.ndarray, longs: pd.DataFrame, shorts: pd.DataFrame
+):
+    pyramid = build_pyramid(data, longs, shorts, config["ohlcv"])
+    meta = {
+        "title": f"{config['symbol']} : {config['start_date']} to {config['end_date']}",
+        "levels": [level for level, _ in LEVELS],
+    }
+    dump_pyramid(pyramid, meta, make_get_filepath(config["plots_dirpath"]))
+    print(
+        f"explore interactive plot with: python3 interactive_plot_server.py {config['plots_dirpath']}"
+    )
+
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>%TITLE%</title>
+<script src="https://assets.pyecharts.org/assets/echarts.min.js"></script>
+</head>
+<body style="margin:0">
+<div id="chart" style="width:100%;height:100vh"></div>
+<script>
+const chart = echarts.init(document.getElementById("chart"));
+const styles = {
+  long_entry: ["triangle", "#1f77b4"], long_profit: ["circle", "#14b143"], long_loss: ["circle", "#ef232a"],
+  short_entry: ["triangle", "#ff7f0e"], short_profit: ["diamond", "#14b143"], short_loss: ["diamond", "#ef232a"],
+};
+let meta = null;
+let timer = null;
+function fillSeries(name, rows) {
+  return {
+    name: name, type: "scatter", symbol: styles[name][0], symbolRotate: name.endsWith("entry") ? 0 : 180,
+    symbolSize: (v) => Math.min(24, 8 + 2 * Math.log2(v[5])), itemStyle: {color: styles[name][1]},
+    data: rows.map((r) => [r[0], r[1], r[2], r[3], r[4], r[5]]),
+    tooltip: {formatter: (p) => name + "<br>" + new Date(p.value[0]).toISOString() + "<br>price " + p.value[1]
+      + "<br>n fills " + p.value[5] + "<br>pnl " + p.value[3].toFixed(6) + "<br>WE " + (p.value[4] * 100).toFixed(2) + "%"},
+  };
+}
+function render(window_) {
+  const series = [{
+    name: "candles " + window_.level, type: "candlestick",
+    data: window_.candles.map((c) => [c[0], c[1], c[4], c[3], c[2]]),
+    itemStyle: {color: "#14b143", color0: "#ef232a", borderColor: "#14b143", borderColor0: "#ef232a"},
+  }];
+  for (const name in window_.fills) series.push(fillSeries(name, window_.fills[name]));
+  chart.setOption({title: {text: meta.title + " (" + window_.level + ")"}, series: series}, {replaceMerge: ["series"]});
+}
+function load(start, end) {
+  fetch("/data?start=" + start + "&end=" + end).then((r) => r.json()).then(render);
+}
+fetch("/meta").then((r) => r.json()).then((m) => {
+  meta = m;
+  chart.setOption({
+    animation: false, tooltip: {trigger: "item"}, legend: {top: 30},
+    xAxis: {type: "time", min: m.ts_min, max: m.ts_max}, yAxis: {scale: true},
+    dataZoom: [{type: "inside", filterMode: "none"}, {type: "slider", filterMode: "none"}],
+    series: [],
+  });
+  chart.on("datazoom", () => {
+    const dz = chart.getOption().dataZoom[0];
+    const span = meta.ts_max - meta.ts_min;
+    clearTimeout(timer);
+    timer = setTimeout(() => load(meta.ts_min + span * dz.start / 100, meta.ts_min + span * dz.end / 100), 150);
+  });
+  load(m.ts_min, m.ts_max);
+});
+</script>
+</body>
+</html>
+"""
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="interactive_plot_server",
+        description="serve interactive chart of backtest dumped with interactive_plot_mode: server",
+    )
+    parser.add_argument("plots_dirpath", type=str, help="backtest plots dir")
+    parser.add_argument("-p", "--port", type=int, required=False, dest="port", default=8050)
+    parser.add_argument(
+        "-nb",
+        "--no_browser",
+        "--no-browser",
+        action="store_true",
+        help="don't open browser",
+    )
+    args = parser.parse_args()
+    serve(args.plots_dirpath, port=args.port, open_browser=not args.no_browser)
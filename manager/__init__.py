@@ -85,13 +85,12 @@ class Manager:
     def find_unsynced_instances(self) -> List[Instance]:
         """Get all passivbot instances running on this machine"""
         signature = f"^{' '.join(INSTANCE_SIGNATURE_BASE)}"
-        pids = ProcessManager.get_pid(signature, all_matches=True)
-        if len(pids) == 0:
+        processes = ProcessManager.get_table().find(signature)
+        if len(processes) == 0:
             return []
 
-        instances_cmds = [ProcessManager.info(pid) for pid in pids]
         instanaces = []
-        for cmd in instances_cmds:
+        for _, cmd in processes:
             args = cmd.split(" ")
             if len(args) <= 3:
                 continue
@@ -117,6 +116,68 @@ class Manager:
 
         return instanaces
 
+    def start_instances(self, instances: List[Instance], silent: bool = False,
+                        progress: Callable = None) -> Tuple[List[Instance], List[Instance]]:
+        """Launch all instances at once, then wait for them with one process table scan per retry"""
+        commands = []
+        pending = []
+        failed = []
+        for instance in instances:
+            instance.reset_state()
+            log_file = instance.get_log_file(silent)
+            if log_file is None:
+                failed.append(instance)
+                continue
+
+            commands.append((instance.get_cmd(), log_file))
+            pending.append(instance)
+
+        ProcessManager.add_nohup_processes(commands)
+
+        signatures = [instance.get_pid_signature() for instance in pending]
+        retries = 5 + len(pending) // 10
+        started_pids = ProcessManager.wait_pids_start(signatures, retries)
+
+        started = []
+        for instance in pending:
+            if instance.get_pid_signature() in started_pids:
+                started.append(instance)
+            else:
+                failed.append(instance)
+
+            if callable(progress):
+                progress(len(started))
+
+        return started, failed
+
+    def stop_instances(self, instances: List[Instance], force: bool = False,
+                       progress: Callable = None) -> Tuple[List[Instance], List[Instance]]:
+        """Signal all instances at once, then wait for all of them to exit"""
+        table = ProcessManager.get_table(refresh=True)
+        pids = {}
+        for instance in instances:
+            instance.reset_state()
+            instance_pids = table.get_pids(instance.get_pid_signature())
+            if len(instance_pids) > 0:
+                pids[instance.get_id()] = instance_pids[0]
+
+        alive = ProcessManager.kill_many(list(pids.values()), force)
+
+        stopped = []
+        failed = []
+        for instance in instances:
+            pid = pids.get(instance.get_id())
+            if pid is None or pid in alive:
+                failed.append(instance)
+            else:
+                stopped.append(instance)
+
+            instance.reset_state()
+            if callable(progress):
+                progress(len(stopped))
+
+        return stopped, failed
+
     def group_instances_by_user(self, instances: List[Instance]) -> Dict[str, List[Instance]]:
         groups = {}
         for key, group in groupby(instances, lambda i: i.get_user()):
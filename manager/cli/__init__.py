@@ -10,6 +10,8 @@ from .commands.sync import Sync
 from .commands.stop import Stop
 from .commands.start import Start
 from .commands.restart import Restart
+from .commands.supervise import Supervise
+from .commands.health import Health
 
 
 class ManagerCLI(CLI):
@@ -21,6 +23,8 @@ class ManagerCLI(CLI):
         self.add_command("sync", Sync)
         self.add_command("list", List)
         self.add_command("info", Info)
+        self.add_command("supervise", Supervise)
+        self.add_command("health", Health)
         self.add_command("init", Init)
         self.add_command("help", Help)
 
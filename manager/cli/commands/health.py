@@ -0,0 +1,45 @@
+from manager.supervisor import Supervisor
+from manager.cli.cli import CLICommand
+from manager.constants import logger
+from manager.cli.color import Color
+from time import time
+
+
+class Health(CLICommand):
+    doc = """Show health of instances run by the supervisor."""
+    args_optional = ["query"]
+
+    @staticmethod
+    def run(cli):
+        status = Supervisor.load_status()
+        if status is None:
+            logger.info("Supervisor has not been run yet")
+            return
+
+        age = time() - status["timestamp"]
+        if status["stopping"] or age > 60:
+            logger.info(Color.apply(
+                Color.YELLOW, f"Supervisor is not running, last status is {age:.0f}s old"))
+
+        query = [q.lower() for q in cli.args]
+        instances = [i for i in status["instances"]
+                     if all(q in i["id"].lower() for q in query)]
+
+        def fmt(value, spec="", suffix=""):
+            return "-" if value is None else f"{value:{spec}}{suffix}"
+
+        lines = ["    {:1} {:<30} {:>8} {:>10} {:>8} {:>10} {:>9}".format(
+            "", "id", "pid", "uptime", "cpu", "rss", "restarts") + "  heartbeat"]
+        for i in instances:
+            color = Color.GREEN if i["running"] else Color.RED
+            uptime = fmt(i["uptime"] and i["uptime"] / 60, ".0f", "m")
+            rss = fmt(i["rss"] and i["rss"] / 1024 ** 2, ".1f", "MB")
+            heartbeat = fmt(i["heartbeat_age"], ".0f", "s ago")
+            if not i["running"]:
+                heartbeat = f"restart in {fmt(i['next_start_in'], '.0f', 's')}"
+            lines.append("    {:1} {:<30} {:>8} {:>10} {:>8} {:>10} {:>9}  {}".format(
+                Color.apply(color, "●"), i["id"], fmt(i["pid"]), uptime,
+                fmt(i["cpu_pct"], ".1f", "%"), rss, i["restarts"], heartbeat))
+
+        for line in lines:
+            logger.info(line)
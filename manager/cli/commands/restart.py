@@ -22,18 +22,24 @@ class Restart(CLICommand):
             return
 
         logger.info("Restarting instances. It may take a while...")
-        restarted_instances = []
-        failed = []
         progress = cli.add_progress(f"restarted 0/{len(instances_to_restart)}")
+        running = [i for i in instances_to_restart if i.is_running()]
+        _, failed = cli.manager.stop_instances(running, force)
+        failed_ids = set(instance.get_id() for instance in failed)
+
+        to_start = []
         for instance in instances_to_restart:
+            if instance.get_id() in failed_ids:
+                continue
+
             instance.apply_flags(cli.modifiers)
-            if instance.restart(force, silent):
-                restarted_instances.append(instance.get_id())
-            else:
-                failed.append(instance.get_id())
+            to_start.append(instance)
 
-            progress.update(
-                f"restarted {len(restarted_instances)}/{len(instances_to_restart)}")
+        started, failed_start = cli.manager.start_instances(
+            to_start, silent,
+            lambda n: progress.update(f"restarted {n}/{len(instances_to_restart)}"))
+        restarted_instances = [instance.get_id() for instance in started]
+        failed = [instance.get_id() for instance in failed + failed_start]
 
         progress.finish(f"Restarted {len(restarted_instances)} instance(s)")
 
@@ -22,15 +22,12 @@ class Start(CLICommand):
             return
 
         logger.info("Starting instances...")
-        started_instances = []
-        failed = []
         for instance in instances_to_start:
             instance.apply_flags(cli.modifiers)
-            started = instance.start(silent)
-            if started:
-                started_instances.append(instance.get_id())
-            else:
-                failed.append(instance.get_id())
+
+        started, failed = cli.manager.start_instances(instances_to_start, silent)
+        started_instances = [instance.get_id() for instance in started]
+        failed = [instance.get_id() for instance in failed]
 
         logger.info(f"Started {len(started_instances)} instance(s)")
 
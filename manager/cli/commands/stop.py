@@ -23,17 +23,12 @@ class Stop(CLICommand):
             return
 
         logger.info("Stopping instances. It may take a while...")
-        stopped_instances = []
-        failed = []
         progress = cli.add_progress(f"stopped 0/{len(instances_to_stop)}")
-        for instance in instances_to_stop:
-            if instance.stop(force):
-                stopped_instances.append(instance.get_id())
-            else:
-                failed.append(instance.get_id())
-
-            progress.update(
-                f"stopped {len(stopped_instances)}/{len(instances_to_stop)}")
+        stopped, failed = cli.manager.stop_instances(
+            instances_to_stop, force,
+            lambda n: progress.update(f"stopped {n}/{len(instances_to_stop)}"))
+        stopped_instances = [instance.get_id() for instance in stopped]
+        failed = [instance.get_id() for instance in failed]
 
         progress.finish(f"Stopped {len(stopped_instances)} instance(s)")
 
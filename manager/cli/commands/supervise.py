@@ -0,0 +1,39 @@
+from manager.supervisor import Supervisor
+from manager.cli.cli import CLICommand
+from manager.constants import logger
+
+
+class Supervise(CLICommand):
+    doc = """Run instances that match the arguments under a supervisor.
+    The supervisor stays in the foreground, restarts instances
+    that exit or stop sending heartbeats, with exponential backoff.
+    Settings are read from the "supervisor" section of the config."""
+    args_optional = ["query"]
+    flags = ["-a", "-s", "-y", "-m"]
+
+    @staticmethod
+    def run(cli):
+        instances = cli.get_instances_for_action(
+            lambda i: i.is_in_config())
+        if len(instances) == 0:
+            return
+
+        running = [i for i in instances if i.is_running()]
+        if len(running) > 0:
+            logger.warn(
+                f"{len(running)} instance(s) are already running outside of the supervisor, stop them first:")
+            for instance in running:
+                logger.warn(f"- {instance.get_id()}")
+            return
+
+        if cli.confirm_action("supervise", instances) != True:
+            return
+
+        for instance in instances:
+            instance.apply_flags(cli.modifiers)
+
+        settings = cli.manager.config_parser.get_config().get("supervisor") or {}
+        if cli.flags.get("silent", False):
+            settings["silent"] = True
+
+        Supervisor(instances, settings).run()
@@ -38,3 +38,6 @@ SERVICES_PATH = "/etc/systemd/system"
 
 INSTANCE_SIGNATURE_BASE = [PYTHON_EXC_ALIAS, "-u",
                            os.path.join(PASSIVBOT_PATH, "passivbot.py")]
+
+# env variable through which the supervisor tells a bot where to write its heartbeat
+HEARTBEAT_FILEPATH_ENV = "PASSIVBOT_HEARTBEAT_FILEPATH"
@@ -1,5 +1,5 @@
 from constants import INSTANCE_SIGNATURE_BASE, PASSIVBOT_PATH
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Union
 from pm import ProcessManager
 import os
 
@@ -117,8 +117,9 @@ class Instance:
         self.is_running_ = None
         self.pid_ = None
 
-    def start(self, silent: bool = False) -> bool:
-        self.reset_state()
+    def get_log_file(self, silent: bool = False) -> Union[str, None]:
+        if silent is True:
+            return "/dev/null"
 
         log_file = os.path.join(
             PASSIVBOT_PATH, f"logs/{self.get_user()}/{self.get_symbol()}.log")
@@ -127,14 +128,18 @@ class Instance:
             if not os.path.exists(os.path.dirname(log_file)):
                 os.makedirs(os.path.dirname(log_file))
         except:
-            return False
+            return None
 
-        cmd = self.get_cmd()
+        return log_file
 
-        if silent is True:
-            log_file = "/dev/null"
+    def start(self, silent: bool = False) -> bool:
+        self.reset_state()
+
+        log_file = self.get_log_file(silent)
+        if log_file is None:
+            return False
 
-        ProcessManager.add_nohup_process(cmd, log_file)
+        ProcessManager.add_nohup_processes([(self.get_cmd(), log_file)])
         self.proc_id = ProcessManager.wait_pid_start(self.get_pid_signature())
         if self.proc_id is None:
             return False
@@ -143,6 +148,7 @@ class Instance:
 
     def stop(self, force=False) -> bool:
         self.reset_state()
+        ProcessManager.refresh()
         if not self.is_running():
             return False
 
@@ -155,6 +161,7 @@ class Instance:
 
     def restart(self, force=False, silent=False) -> bool:
         self.reset_state()
+        ProcessManager.refresh()
         if self.is_running():
             stopped = self.stop(force)
             if not stopped:
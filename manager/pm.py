@@ -1,11 +1,128 @@
-from typing import List, Union
-from constants import USER
+from typing import Dict, List, Tuple, Union
+from constants import USER, INSTANCE_SIGNATURE_BASE
 from time import sleep
 import subprocess
 import os
+import re
+
+PROC_PATH = "/proc"
+
+
+class ProcessTable:
+    def __init__(self, entries: List[Tuple[int, str]]):
+        """
+        Snapshot of the user's processes.
+        :param entries: List of (pid, cmdline) pairs.
+        """
+        self.entries = entries
+        self.cmdlines: Dict[int, str] = dict(entries)
+        # signature -> pids; instance signatures (base command, user, symbol) are indexed up front,
+        # any other signature is matched once against all entries and memoized
+        self.index: Dict[str, List[int]] = {}
+        n_base = len(INSTANCE_SIGNATURE_BASE)
+        for pid, cmdline in entries:
+            tokens = cmdline.split(" ")
+            if len(tokens) >= n_base + 2 and tokens[:n_base] == INSTANCE_SIGNATURE_BASE:
+                signature = f"^{' '.join(tokens[:n_base + 2])}"
+                self.index.setdefault(signature, []).append(pid)
+
+    @staticmethod
+    def scan() -> "ProcessTable":
+        """
+        Take a snapshot of the process table of the current user.
+        Reads /proc once where available, otherwise makes a single ps call.
+        """
+        if os.path.isdir(PROC_PATH):
+            return ProcessTable(ProcessTable.read_proc())
+
+        return ProcessTable(ProcessTable.read_ps())
+
+    @staticmethod
+    def read_proc() -> List[Tuple[int, str]]:
+        uid = os.getuid()
+        entries = []
+        for name in os.listdir(PROC_PATH):
+            if not name.isdigit():
+                continue
+
+            path = os.path.join(PROC_PATH, name)
+            try:
+                if os.stat(path).st_uid != uid:
+                    continue
+
+                with open(os.path.join(path, "cmdline"), "rb") as f:
+                    raw = f.read()
+            except OSError:
+                # process exited while scanning
+                continue
+
+            if len(raw) == 0:
+                # kernel threads and zombies have no cmdline
+                continue
+
+            cmdline = raw.rstrip(b"\0").replace(b"\0", b" ").decode("utf-8", "replace")
+            entries.append((int(name), cmdline))
+
+        return sorted(entries)
+
+    @staticmethod
+    def read_ps() -> List[Tuple[int, str]]:
+        """
+        man: https://man7.org/linux/man-pages/man1/ps.1.html
+        """
+        cmd = ["ps", "-U", USER, "-o", "pid=,args="]
+        try:
+            output = subprocess.check_output(cmd).decode("utf-8")
+        except subprocess.CalledProcessError:
+            return []
+
+        entries = []
+        for line in output.split("\n"):
+            pid, _, cmdline = line.strip().partition(" ")
+            if pid.isdigit():
+                entries.append((int(pid), cmdline.strip()))
+
+        return sorted(entries)
+
+    def get_pids(self, signature: str) -> List[int]:
+        """
+        Get the process ids matching the signature, same semantics as pgrep -f.
+        :param signature: Regular expression matched against full command lines.
+        """
+        if signature not in self.index:
+            pattern = re.compile(signature)
+            self.index[signature] = [
+                pid for pid, cmdline in self.entries if pattern.search(cmdline)]
+
+        return self.index[signature]
+
+    def find(self, signature: str) -> List[Tuple[int, str]]:
+        return [(pid, self.cmdlines[pid]) for pid in self.get_pids(signature)]
+
+    def info(self, pid: int) -> Union[str, None]:
+        return self.cmdlines.get(pid)
 
 
 class ProcessManager:
+    table_: Union[ProcessTable, None] = None
+    CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    @staticmethod
+    def get_table(refresh: bool = False) -> ProcessTable:
+        """
+        Get the process table snapshot shared by all queries.
+        :param refresh: If True, rescan the process table.
+        """
+        if refresh or ProcessManager.table_ is None:
+            ProcessManager.table_ = ProcessTable.scan()
+
+        return ProcessManager.table_
+
+    @staticmethod
+    def refresh():
+        ProcessManager.get_table(refresh=True)
+
     @staticmethod
     def add(command: List[str]) -> int:
         """
@@ -33,46 +150,73 @@ class ProcessManager:
             nohup_command.extend([">", "/dev/null", "2>&1", "&"])
         return ProcessManager.add(nohup_command)
 
+    @staticmethod
+    def add_nohup_processes(commands: List[Tuple[List[str], str]]) -> int:
+        """
+        Launch many no hang up processes at once, without waiting on a shell for each one.
+        :param commands: List of (command, log file path) pairs.
+        :return: Number of processes launched.
+        """
+        launched = 0
+        for command, log_file_path in commands:
+            try:
+                with open(log_file_path or os.devnull, "ab") as log_file:
+                    subprocess.Popen(
+                        ["nohup"] + command,
+                        stdin=subprocess.DEVNULL,
+                        stdout=log_file,
+                        stderr=subprocess.STDOUT,
+                        start_new_session=True,
+                    )
+                launched += 1
+            except OSError:
+                continue
+
+        return launched
+
     @staticmethod
     def get_pid(signature: str, all_matches: bool = False) -> Union[int, None, List[int]]:
         """
-        Use pgrep to get the process id of the process with the given query string.
+        Get the process id of the process with the given query string from the process table snapshot.
         :param signature: The signature to search for.
         :return: The process id of the process with the given query string.
-
-        man: https://man7.org/linux/man-pages/man1/pgrep.1.html
         """
-        try:
-            cmd = ["pgrep", "-U", USER, "-f", signature]
-            pids = subprocess.check_output(cmd).decode("utf-8").strip()
-        except subprocess.CalledProcessError:
-            if all_matches:
-                return []
-
-            return None
-
-        matches = pids.split("\n")
-        if len(matches) == 0:
-            if all_matches:
-                return []
-
-            return None
-
+        pids = ProcessManager.get_table().get_pids(signature)
         if all_matches:
-            return [int(pid) for pid in matches]
-        else:
-            return int(matches[0])
+            return pids
+
+        return pids[0] if len(pids) > 0 else None
 
     @staticmethod
     def wait_pid_start(signature: str, retries: int = 5, cooldown: float = 0.5) -> Union[int, None]:
+        pids = ProcessManager.wait_pids_start([signature], retries, cooldown)
+        return pids.get(signature)
+
+    @staticmethod
+    def wait_pids_start(
+        signatures: List[str], retries: int = 5, cooldown: float = 0.5
+    ) -> Dict[str, int]:
+        """
+        Wait for the processes with the given signatures to appear, one scan per retry.
+        :return: Dict of signature to pid of the processes that started.
+        """
+        started = {}
         for i in range(0, retries):
-            pid = ProcessManager.get_pid(signature)
-            if pid is not None:
-                return pid
+            table = ProcessManager.get_table(refresh=True)
+            for signature in signatures:
+                if signature in started:
+                    continue
+
+                pids = table.get_pids(signature)
+                if len(pids) > 0:
+                    started[signature] = pids[0]
+
+            if len(started) == len(signatures):
+                break
 
             sleep(cooldown)
 
-        return None
+        return started
 
     @staticmethod
     def is_running(signature: str) -> bool:
@@ -90,12 +234,46 @@ class ProcessManager:
         :param pid: The process id of the process to get the info of.
         :return: The info of the process with the given pid.
         """
-        cmd = ["ps", "-p", str(pid), "-o", "args="]
+        return ProcessManager.get_table().info(pid)
+
+    @staticmethod
+    def stats(pid: int) -> Union[Tuple[int, int], None]:
+        """
+        Get resource usage of the process with the given pid from /proc.
+        :return: (cpu time in clock ticks, resident set size in bytes), None if unavailable.
+
+        man: https://man7.org/linux/man-pages/man5/proc.5.html
+        """
         try:
-            return subprocess.check_output(cmd).decode("utf-8").strip()
-        except subprocess.CalledProcessError:
+            with open(os.path.join(PROC_PATH, str(pid), "stat"), "r") as f:
+                # fields after the parenthesized command name, which may contain spaces
+                fields = f.read().rpartition(")")[2].split()
+            with open(os.path.join(PROC_PATH, str(pid), "statm"), "r") as f:
+                rss_pages = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError, TypeError):
             return None
 
+        # utime and stime are fields 14 and 15, the first field here is field 3
+        cpu_ticks = int(fields[11]) + int(fields[12])
+        return cpu_ticks, rss_pages * ProcessManager.PAGE_SIZE
+
+    @staticmethod
+    def is_alive(pid: int) -> bool:
+        try:
+            # reap the process if it was launched by this manager, so it won't linger as a zombie
+            os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            pass
+
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+
+        return True
+
     @staticmethod
     def kill(pid: int, force: bool = False, max_retries: int = -1) -> bool:
         """
@@ -104,16 +282,32 @@ class ProcessManager:
         :param force: If True, kill the process with the given pid with SIGKILL.
         :return: The error code of the kill command.
         """
-        cmd = ["kill"]
-        if force:
-            cmd.append("-9")
+        return len(ProcessManager.kill_many([pid], force, max_retries)) == 0
 
-        cmd.append(str(pid))
-        os.system(" ".join(cmd))
-        while ProcessManager.info(pid) is not None:
+    @staticmethod
+    def kill_many(pids: List[int], force: bool = False, max_retries: int = -1) -> List[int]:
+        """
+        Signal all the given processes first, then wait for them to exit together.
+        :param pids: The process ids of the processes to kill.
+        :param force: If True, kill the processes with SIGKILL.
+        :return: The process ids that are still alive after max_retries.
+        """
+        sig = 9 if force else 15
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                continue
+            except PermissionError:
+                continue
+
+        alive = [pid for pid in pids if ProcessManager.is_alive(pid)]
+        while len(alive) > 0:
             sleep(0.15)
+            alive = [pid for pid in alive if ProcessManager.is_alive(pid)]
             max_retries -= 1
             if max_retries == 0:
-                return False
+                break
 
-        return True
+        ProcessManager.table_ = None
+        return alive
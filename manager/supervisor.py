@@ -0,0 +1,247 @@
+from constants import PASSIVBOT_PATH, HEARTBEAT_FILEPATH_ENV, logger
+from typing import Dict, List, Union
+from instance import Instance
+from pm import ProcessManager
+from time import time, sleep
+import subprocess
+import signal
+import json
+import os
+
+SUPERVISOR_PATH = os.path.join(PASSIVBOT_PATH, "caches/manager")
+SUPERVISOR_STATUS_PATH = os.path.join(SUPERVISOR_PATH, "supervisor.json")
+
+
+class SupervisedInstance:
+    def __init__(self, instance: Instance, settings: Dict):
+        self.instance = instance
+        self.settings = settings
+        self.process: Union[subprocess.Popen, None] = None
+        self.log_file = None
+        self.heartbeat_filepath = os.path.join(
+            SUPERVISOR_PATH, "heartbeats", f"{instance.get_id()}.heartbeat")
+
+        self.started_at = 0.0
+        self.next_start_at = 0.0
+        self.backoff = settings["backoff_initial"]
+        self.restarts = 0
+        self.last_exit = None
+
+        # previous (cpu ticks, wall time) sample, to compute cpu usage between checks
+        self.cpu_sample = None
+        self.cpu_pct = None
+        self.rss = None
+
+    def get_id(self) -> str:
+        return self.instance.get_id()
+
+    def get_pid(self) -> Union[int, None]:
+        return self.process.pid if self.process is not None else None
+
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def get_heartbeat_age(self) -> Union[float, None]:
+        try:
+            return time() - os.path.getmtime(self.heartbeat_filepath)
+        except OSError:
+            return None
+
+    def start(self) -> bool:
+        log_file = self.instance.get_log_file(self.settings["silent"])
+        if log_file is None:
+            return False
+
+        try:
+            if os.path.exists(self.heartbeat_filepath):
+                os.remove(self.heartbeat_filepath)
+
+            env = os.environ.copy()
+            env[HEARTBEAT_FILEPATH_ENV] = self.heartbeat_filepath
+            self.log_file = open(log_file, "ab")
+            self.process = subprocess.Popen(
+                self.instance.get_cmd(),
+                cwd=PASSIVBOT_PATH,
+                env=env,
+                stdin=subprocess.DEVNULL,
+                stdout=self.log_file,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+        except OSError as e:
+            logger.error(f"{self.get_id()}: failed to start: {e}")
+            return False
+
+        self.started_at = time()
+        self.cpu_sample = None
+        return True
+
+    def stop(self, force: bool = False, timeout: float = 10.0):
+        if self.is_running():
+            self.process.send_signal(signal.SIGKILL if force else signal.SIGTERM)
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+        self.on_exit()
+
+    def on_exit(self):
+        if self.process is not None:
+            self.last_exit = self.process.poll()
+
+        if self.log_file is not None:
+            self.log_file.close()
+
+        self.process = None
+        self.log_file = None
+        self.cpu_pct = None
+        self.rss = None
+
+    def schedule_restart(self, now: float):
+        """Restart after the current backoff, doubling it for the next time"""
+        self.next_start_at = now + self.backoff
+        self.backoff = min(self.backoff * 2, self.settings["backoff_max"])
+
+    def update_stats(self, now: float):
+        stats = ProcessManager.stats(self.get_pid())
+        if stats is None:
+            return
+
+        cpu_ticks, self.rss = stats
+        if self.cpu_sample is not None and now > self.cpu_sample[1]:
+            self.cpu_pct = (
+                (cpu_ticks - self.cpu_sample[0]) / ProcessManager.CLOCK_TICKS
+                / (now - self.cpu_sample[1]) * 100
+            )
+
+        self.cpu_sample = (cpu_ticks, now)
+
+    def check(self, now: float):
+        """Start, restart or keep the instance, returns an event description or None"""
+        if self.process is None:
+            if now < self.next_start_at:
+                return None
+
+            if not self.start():
+                self.schedule_restart(now)
+                return "failed to start"
+
+            return "started" if self.restarts == 0 else f"restarted ({self.restarts})"
+
+        if not self.is_running():
+            self.on_exit()
+            self.restarts += 1
+            self.schedule_restart(now)
+            return f"exited with code {self.last_exit}, restarting in {self.next_start_at - now:.0f}s"
+
+        uptime = now - self.started_at
+        heartbeat_age = self.get_heartbeat_age()
+        if heartbeat_age is None:
+            heartbeat_age = uptime
+
+        if uptime > self.settings["startup_grace"] and heartbeat_age > self.settings["heartbeat_timeout"]:
+            self.stop()
+            self.restarts += 1
+            self.schedule_restart(now)
+            return (f"no heartbeat for {heartbeat_age:.0f}s, "
+                    f"restarting in {self.next_start_at - now:.0f}s")
+
+        if uptime > self.settings["stable_after"]:
+            self.backoff = self.settings["backoff_initial"]
+
+        self.update_stats(now)
+        return None
+
+    def get_status(self, now: float) -> Dict:
+        return {
+            "id": self.get_id(),
+            "pid": self.get_pid(),
+            "running": self.is_running(),
+            "uptime": now - self.started_at if self.is_running() else None,
+            "restarts": self.restarts,
+            "next_start_in": max(0.0, self.next_start_at - now) if not self.is_running() else None,
+            "last_exit": self.last_exit,
+            "heartbeat_age": self.get_heartbeat_age(),
+            "cpu_pct": self.cpu_pct,
+            "rss": self.rss,
+        }
+
+
+class Supervisor:
+    default_settings = {
+        # seconds between checks of all instances
+        "check_interval": 5.0,
+        # seconds without heartbeat before an instance is considered hung and restarted
+        "heartbeat_timeout": 600.0,
+        # seconds after start before heartbeat is checked
+        "startup_grace": 120.0,
+        # restart delay doubles on every restart, from backoff_initial up to backoff_max seconds
+        "backoff_initial": 10.0,
+        "backoff_max": 60.0 * 30,
+        # seconds of uptime after which backoff is reset
+        "stable_after": 60.0 * 10,
+        # seconds between instance starts, to spread out exchange initialization
+        "start_stagger": 1.0,
+        "silent": False,
+    }
+
+    def __init__(self, instances: List[Instance], settings: Dict = None):
+        self.settings = {**self.default_settings, **(settings or {})}
+        self.instances = [SupervisedInstance(instance, self.settings) for instance in instances]
+        self.stopping = False
+
+        now = time()
+        for i, supervised in enumerate(self.instances):
+            supervised.next_start_at = now + i * self.settings["start_stagger"]
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def run(self):
+        if not os.path.exists(os.path.join(SUPERVISOR_PATH, "heartbeats")):
+            os.makedirs(os.path.join(SUPERVISOR_PATH, "heartbeats"))
+
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        logger.info(f"Supervising {len(self.instances)} instance(s), Ctrl+C to stop")
+        try:
+            while not self.stopping:
+                now = time()
+                for supervised in self.instances:
+                    event = supervised.check(now)
+                    if event is not None:
+                        logger.info(f"{supervised.get_id()}: {event}")
+
+                self.dump_status(now)
+                sleep(self.settings["check_interval"])
+        finally:
+            logger.info("Stopping supervised instances...")
+            for supervised in self.instances:
+                supervised.stop()
+
+            self.dump_status(time())
+            logger.info("Supervisor stopped")
+
+    def dump_status(self, now: float):
+        status = {
+            "pid": os.getpid(),
+            "timestamp": now,
+            "stopping": self.stopping,
+            "instances": [supervised.get_status(now) for supervised in self.instances],
+        }
+        tmp_path = f"{SUPERVISOR_STATUS_PATH}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(status, f)
+
+        os.replace(tmp_path, SUPERVISOR_STATUS_PATH)
+
+    @staticmethod
+    def load_status() -> Union[Dict, None]:
+        try:
+            with open(SUPERVISOR_STATUS_PATH, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
@@ -0,0 +1,250 @@
+from collections.abc import MutableMapping
+
+import numpy as np
+
+PSIDES = ("long", "short")
+
+# name: (shape of one symbol's row, dtype, fill value)
+STATE_ARRAYS = {
+    "poss_long": ((2,), np.float64, 0.0),  # [size, price]
+    "poss_short": ((2,), np.float64, 0.0),
+    "tickers": ((3,), np.float64, 0.0),  # [bid, ask, last]
+    "emas_long": ((3,), np.float64, 0.0),
+    "emas_short": ((3,), np.float64, 0.0),
+    "alphas_long": ((3,), np.float64, 0.0),
+    "alphas__long": ((3,), np.float64, 0.0),
+    "alphas_short": ((3,), np.float64, 0.0),
+    "alphas__short": ((3,), np.float64, 0.0),
+    "prev_prices": ((), np.float64, 0.0),
+    "upnls": ((), np.float64, 0.0),
+    "c_mults": ((), np.float64, 1.0),
+    "qty_steps": ((), np.float64, 0.0),
+    "price_steps": ((), np.float64, 0.0),
+    "min_qtys": ((), np.float64, 0.0),
+    "min_costs": ((), np.float64, 0.0),
+    "WE_limits": ((2,), np.float64, 0.0),  # [long, short]
+    "modes": ((2,), "<U16", ""),  # [long, short]
+    "AU_eligible": ((2,), np.bool_, False),  # [long, short]
+}
+
+
+def state_array(name: str) -> property:
+    """
+    property exposing the first len(symbols) rows of a state array's buffer
+    assigning an array to it writes into the buffer, so rows handed out stay current
+    """
+
+    def fget(self):
+        return self.buffers[name][: len(self.symbols)]
+
+    def fset(self, value):
+        self.buffers[name][: len(self.symbols)] = value
+
+    return property(fget, fset)
+
+
+class MultiSymbolState:
+    """
+    per symbol live state as struct of arrays, row i belongs to self.symbols[i]
+    rows are appended as symbols are added and never reordered
+    arrays are views into buffers whose capacity grows geometrically,
+    so rows handed out stay views into state until capacity grows
+    self.views holds dict views for code indexing state by symbol
+    """
+
+    def __init__(self):
+        self.symbols = []
+        self.idxs = {}
+        self.buffers = {}
+        self.capacity = 0
+        self.grow(8)
+        self.views = {
+            "positions": PositionsView(self),
+            "tickers": RecordsView(self, "tickers", ("bid", "ask", "last")),
+            **{
+                name: ArrayView(self, name)
+                for name in [
+                    "emas_long",
+                    "emas_short",
+                    "alphas_long",
+                    "alphas__long",
+                    "alphas_short",
+                    "alphas__short",
+                    "prev_prices",
+                    "upnls",
+                    "c_mults",
+                    "qty_steps",
+                    "price_steps",
+                    "min_qtys",
+                    "min_costs",
+                ]
+            },
+        }
+
+    def grow(self, capacity: int):
+        for name, (shape, dtype, fill) in STATE_ARRAYS.items():
+            buffer = np.full((capacity,) + shape, fill, dtype=dtype)
+            if name in self.buffers:
+                buffer[: self.capacity] = self.buffers[name]
+            self.buffers[name] = buffer
+        self.capacity = capacity
+
+    def reset_rows(self, name: str):
+        # sets rows of all symbols to the state array's fill value
+        self.buffers[name][: len(self.symbols)] = STATE_ARRAYS[name][2]
+
+    def add_symbol(self, symbol: str) -> int:
+        if symbol in self.idxs:
+            return self.idxs[symbol]
+        if len(self.symbols) == self.capacity:
+            self.grow(self.capacity * 2)
+        self.idxs[symbol] = len(self.symbols)
+        self.symbols.append(symbol)
+        return self.idxs[symbol]
+
+    def sync_live_configs(self, live_configs: dict):
+        # copies modes and wallet exposure limits from live configs
+        for symbol in live_configs:
+            i = self.add_symbol(symbol)
+            for j, pside in enumerate(PSIDES):
+                self.modes[i, j] = live_configs[symbol][pside]["mode"]
+                self.WE_limits[i, j] = live_configs[symbol][pside]["wallet_exposure_limit"]
+        self.AU_eligible = (
+            (self.modes != "manual") & (self.modes != "panic") & (self.modes != "tp_only")
+        )
+
+
+for _name in STATE_ARRAYS:
+    setattr(MultiSymbolState, _name, state_array(_name))
+
+
+def state_view(name: str) -> property:
+    """
+    property exposing bot.state.views[name]
+    assigning a dict to it replaces the view's contents: rows of all symbols are reset
+    to their fill value, then the dict's items are written into the state arrays
+    """
+
+    def fget(self):
+        return self.state.views[name]
+
+    def fset(self, value):
+        self.state.views[name].clear()
+        self.state.views[name].update(value)
+
+    return property(fget, fset)
+
+
+class ArrayView(MutableMapping):
+    # {symbol: row}; scalars are returned as float, vectors as views into the state array
+    # symbols cannot be removed; clear() resets rows to their fill value
+    def __init__(self, state: MultiSymbolState, name: str):
+        self.state = state
+        self.name = name
+
+    def __getitem__(self, symbol):
+        val = getattr(self.state, self.name)[self.state.idxs[symbol]]
+        return float(val) if val.ndim == 0 else val
+
+    def __setitem__(self, symbol, value):
+        i = self.state.add_symbol(symbol)
+        getattr(self.state, self.name)[i] = value
+
+    def __delitem__(self, symbol):
+        if symbol not in self.state.idxs:
+            raise KeyError(symbol)
+        raise TypeError("symbols cannot be removed from state")
+
+    def popitem(self):
+        raise TypeError("symbols cannot be removed from state")
+
+    def clear(self):
+        self.state.reset_rows(self.name)
+
+    def __iter__(self):
+        return iter(self.state.symbols)
+
+    def __len__(self):
+        return len(self.state.symbols)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class Record(MutableMapping):
+    # {key: value} view of one row of a state array
+    def __init__(self, state: MultiSymbolState, name: str, symbol: str, keys: tuple):
+        self.state = state
+        self.name = name
+        self.symbol = symbol
+        self.keys_ = keys
+        self.cols = {key: j for j, key in enumerate(keys)}
+
+    def __getitem__(self, key):
+        i = self.state.idxs[self.symbol]
+        return float(getattr(self.state, self.name)[i, self.cols[key]])
+
+    def __setitem__(self, key, value):
+        i = self.state.idxs[self.symbol]
+        getattr(self.state, self.name)[i, self.cols[key]] = value
+
+    def __delitem__(self, key):
+        if key not in self.cols:
+            raise KeyError(key)
+        raise TypeError("keys cannot be removed from state")
+
+    def popitem(self):
+        raise TypeError("keys cannot be removed from state")
+
+    def clear(self):
+        # resets row to fill value
+        i = self.state.idxs[self.symbol]
+        getattr(self.state, self.name)[i] = STATE_ARRAYS[self.name][2]
+
+    def __iter__(self):
+        return iter(self.keys_)
+
+    def __len__(self):
+        return len(self.keys_)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class RecordsView(ArrayView):
+    # {symbol: {key: value}}
+    def __init__(self, state: MultiSymbolState, name: str, keys: tuple):
+        super().__init__(state, name)
+        self.keys_ = keys
+
+    def __getitem__(self, symbol):
+        if symbol not in self.state.idxs:
+            raise KeyError(symbol)
+        return Record(self.state, self.name, symbol, self.keys_)
+
+    def __setitem__(self, symbol, value):
+        i = self.state.add_symbol(symbol)
+        getattr(self.state, self.name)[i] = [value[k] for k in self.keys_]
+
+
+class PositionsView(ArrayView):
+    # {symbol: {"long": {"size": size, "price": price}, "short": {...}}}
+    def __init__(self, state: MultiSymbolState):
+        super().__init__(state, "poss_long")
+
+    def __getitem__(self, symbol):
+        if symbol not in self.state.idxs:
+            raise KeyError(symbol)
+        return {
+            pside: Record(self.state, f"poss_{pside}", symbol, ("size", "price"))
+            for pside in PSIDES
+        }
+
+    def clear(self):
+        for pside in PSIDES:
+            self.state.reset_rows(f"poss_{pside}")
+
+    def __setitem__(self, symbol, value):
+        i = self.state.add_symbol(symbol)
+        for pside in PSIDES:
+            getattr(self.state, f"poss_{pside}")[i] = [value[pside]["size"], value[pside]["price"]]
@@ -322,6 +322,540 @@ def calc_clock_close_short(
     return (0.0, 0.0, "clock_close_short")
 
 
+@njit
+def calc_clock_emas(closes, alphas, alphas_):
+    """
+    returns emas [[ema0, ema1, ema2]] per minute, as used by backtest_clock:
+    emas[k] is updated with closes[k - 1]
+    """
+    emas = np.empty((len(closes), 3))
+    emas[0] = closes[0]
+    for k in range(1, len(closes)):
+        for i in range(3):
+            emas[k, i] = emas[k - 1, i] * alphas_[i] + closes[k - 1] * alphas[i]
+    return emas
+
+
+@njit
+def calc_clock_stats(
+    timestamp,
+    price,
+    balance_long,
+    psize_long,
+    pprice_long,
+    balance_short,
+    psize_short,
+    pprice_short,
+    closest_bkr_long,
+    closest_bkr_short,
+    inverse,
+    c_mult,
+):
+    """
+    psize_short is positive
+    returns stats row, closest_bkr_long, closest_bkr_short
+    """
+    bkr_price_long = calc_bankruptcy_price(
+        balance_long,
+        psize_long,
+        pprice_long,
+        0.0,
+        0.0,
+        inverse,
+        c_mult,
+    )
+    bkr_price_short = calc_bankruptcy_price(
+        balance_short,
+        0.0,
+        0.0,
+        psize_short,
+        pprice_short,
+        inverse,
+        c_mult,
+    )
+    closest_bkr_long = min(closest_bkr_long, abs(bkr_price_long - price) / price)
+    closest_bkr_short = min(closest_bkr_short, abs(bkr_price_short - price) / price)
+    upnl_long = calc_pnl_long(pprice_long, price, psize_long, inverse, c_mult)
+    upnl_short = calc_pnl_short(pprice_short, price, psize_short, inverse, c_mult)
+    equity_long = balance_long + upnl_long
+    equity_short = balance_short + upnl_short
+    return (
+        (
+            timestamp,
+            bkr_price_long,
+            bkr_price_short,
+            psize_long,
+            pprice_long,
+            -psize_short,
+            pprice_short,
+            price,
+            closest_bkr_long,
+            closest_bkr_short,
+            balance_long,
+            balance_short,
+            equity_long,
+            equity_short,
+        ),
+        closest_bkr_long,
+        closest_bkr_short,
+    )
+
+
+@njit
+def process_clock_minute_long(
+    k,
+    timestamps,
+    highs,
+    lows,
+    closes,
+    emas_long,
+    fills_long,
+    balance_long,
+    psize_long,
+    pprice_long,
+    prev_clock_fill_ts_entry_long,
+    prev_clock_fill_ts_close_long,
+    maker_fee,
+    inverse,
+    backwards_tp,
+    qty_step,
+    price_step,
+    min_qty,
+    min_cost,
+    c_mult,
+    ema_dist_entry,
+    ema_dist_close,
+    qty_pct_entry,
+    qty_pct_close,
+    we_multiplier_entry,
+    we_multiplier_close,
+    delay_weight_entry,
+    delay_weight_close,
+    delay_between_fills_ms_entry,
+    delay_between_fills_ms_close,
+    min_markup,
+    markup_range,
+    n_close_orders,
+    wallet_exposure_limit,
+):
+    """
+    simulates long orders placed previous minute and fills them at minute k,
+    appending to fills_long
+    returns balance_long, psize_long, pprice_long,
+    prev_clock_fill_ts_entry_long, prev_clock_fill_ts_close_long
+    """
+    # simulate what orders were placed previous minute
+    closes_long = [(0.0, np.inf, "")]
+    if psize_long != 0.0:
+        ask_price_long = calc_clock_price_ask(
+            emas_long.max(), closes[k - 1], ema_dist_close[0], price_step
+        )
+        if highs[k] > ask_price_long:
+            # clock close long
+            clock_close_long = calc_clock_close_long(
+                balance_long,
+                psize_long,
+                pprice_long,
+                closes[k - 1],
+                emas_long,
+                timestamps[k - 1],
+                prev_clock_fill_ts_close_long,
+                inverse,
+                qty_step,
+                price_step,
+                min_qty,
+                min_cost,
+                c_mult,
+                ema_dist_close[0],
+                qty_pct_close[0],
+                we_multiplier_close[0],
+                delay_weight_close[0],
+                delay_between_fills_ms_close[0],
+                wallet_exposure_limit[0],
+            )
+        else:
+            clock_close_long = (0.0, 0.0, "")
+        # check if markup close
+        if psize_long > 0.0 and highs[k] > pprice_long * (1 + min_markup[0]):
+            close_grid_long = calc_close_grid_long(
+                backwards_tp[0],
+                balance_long,
+                psize_long,
+                pprice_long,
+                closes[k - 1],
+                0.0,
+                0,
+                0,
+                inverse,
+                qty_step,
+                price_step,
+                min_qty,
+                min_cost,
+                c_mult,
+                wallet_exposure_limit[0],
+                min_markup[0],
+                markup_range[0],
+                n_close_orders[0],
+                0.0,
+                0.0,
+                0.0,
+                0.0,
+            )
+            # check whether to modify close grid
+            if close_grid_long and close_grid_long[0][0] != 0.0:
+                if clock_close_long[1] <= close_grid_long[0][1]:
+                    close_grid_long = calc_close_grid_long(
+                        backwards_tp[0],
+                        balance_long,
+                        max(0.0, round_(psize_long - abs(clock_close_long[0]), qty_step)),
+                        pprice_long,
+                        closes[k - 1],
+                        0.0,
+                        0,
+                        0,
+                        inverse,
+                        qty_step,
+                        price_step,
+                        min_qty,
+                        min_cost,
+                        c_mult,
+                        wallet_exposure_limit[0],
+                        min_markup[0],
+                        markup_range[0],
+                        n_close_orders[0],
+                        0.0,
+                        0.0,
+                        0.0,
+                        0.0,
+                    )
+                    closes_long = [clock_close_long] + close_grid_long
+                else:
+                    closes_long = close_grid_long
+        elif clock_close_long[0] != 0.0:
+            closes_long = [clock_close_long]
+
+    bid_price_long = calc_clock_price_bid(
+        emas_long.min(), closes[k - 1], ema_dist_entry[0], price_step
+    )
+    if lows[k] < bid_price_long:
+        # clock entry long
+        clock_entry_long = calc_clock_entry_long(
+            balance_long,
+            psize_long,
+            pprice_long,
+            closes[k - 1],
+            emas_long,
+            timestamps[k - 1],
+            prev_clock_fill_ts_entry_long,
+            inverse,
+            qty_step,
+            price_step,
+            min_qty,
+            min_cost,
+            c_mult,
+            ema_dist_entry[0],
+            qty_pct_entry[0],
+            we_multiplier_entry[0],
+            delay_weight_entry[0],
+            delay_between_fills_ms_entry[0],
+            wallet_exposure_limit[0],
+        )
+        if clock_entry_long[0] != 0.0:
+            prev_clock_fill_ts_entry_long = timestamps[k]
+            psize_long, pprice_long = clock_entry_long[3], clock_entry_long[4]
+            upnl = calc_pnl_long(pprice_long, closes[k], psize_long, inverse, c_mult)
+            equity_long = balance_long + upnl
+            pnl = 0.0
+            fee_paid = (
+                -qty_to_cost(clock_entry_long[0], clock_entry_long[1], inverse, c_mult)
+                * maker_fee
+            )
+            balance_long += fee_paid
+            fills_long.append(
+                (
+                    k,
+                    timestamps[k],
+                    pnl,
+                    fee_paid,
+                    balance_long,
+                    equity_long,
+                    clock_entry_long[0],
+                    clock_entry_long[1],
+                    psize_long,
+                    pprice_long,
+                    "clock_entry_long",
+                )
+            )
+    while closes_long:
+        if closes_long[0][0] != 0.0 and highs[k] > closes_long[0][1]:
+            # close long pos
+            if "clock" in closes_long[0][2]:
+                prev_clock_fill_ts_close_long = timestamps[k]
+            close_qty = min(psize_long, abs(closes_long[0][0]))
+            if close_qty == 0.0:
+                break
+            pnl = calc_pnl_long(pprice_long, closes_long[0][1], close_qty, inverse, c_mult)
+            fee_paid = -qty_to_cost(close_qty, closes_long[0][1], inverse, c_mult) * maker_fee
+            balance_long += pnl + fee_paid
+            psize_long = max(0.0, round_(psize_long - close_qty, qty_step))
+            if psize_long == 0.0:
+                pprice_long = 0.0
+                prev_clock_fill_ts_entry_long = 0.0
+            upnl = calc_pnl_long(pprice_long, closes[k], psize_long, inverse, c_mult)
+            equity_long = balance_long + upnl
+            fills_long.append(
+                (
+                    k,
+                    timestamps[k],
+                    pnl,
+                    fee_paid,
+                    balance_long,
+                    equity_long,
+                    -close_qty,
+                    closes_long[0][1],
+                    psize_long,
+                    pprice_long,
+                    closes_long[0][2],
+                )
+            )
+        closes_long = closes_long[1:]
+    return (
+        balance_long,
+        psize_long,
+        pprice_long,
+        prev_clock_fill_ts_entry_long,
+        prev_clock_fill_ts_close_long,
+    )
+
+
+@njit
+def process_clock_minute_short(
+    k,
+    timestamps,
+    highs,
+    lows,
+    closes,
+    emas_short,
+    fills_short,
+    balance_short,
+    psize_short,
+    pprice_short,
+    prev_clock_fill_ts_entry_short,
+    prev_clock_fill_ts_close_short,
+    maker_fee,
+    inverse,
+    backwards_tp,
+    qty_step,
+    price_step,
+    min_qty,
+    min_cost,
+    c_mult,
+    ema_dist_entry,
+    ema_dist_close,
+    qty_pct_entry,
+    qty_pct_close,
+    we_multiplier_entry,
+    we_multiplier_close,
+    delay_weight_entry,
+    delay_weight_close,
+    delay_between_fills_ms_entry,
+    delay_between_fills_ms_close,
+    min_markup,
+    markup_range,
+    n_close_orders,
+    wallet_exposure_limit,
+):
+    """
+    simulates short orders placed previous minute and fills them at minute k,
+    appending to fills_short
+    psize_short is positive
+    returns balance_short, psize_short, pprice_short,
+    prev_clock_fill_ts_entry_short, prev_clock_fill_ts_close_short
+    """
+    closes_short = [(0.0, 0.0, "")]
+    if psize_short != 0.0:
+        bid_price_short = calc_clock_price_bid(
+            emas_short.min(), closes[k - 1], ema_dist_close[1], price_step
+        )
+        if lows[k] < bid_price_short:
+            clock_close_short = calc_clock_close_short(
+                balance_short,
+                psize_short,
+                pprice_short,
+                closes[k - 1],
+                emas_short,
+                timestamps[k - 1],
+                prev_clock_fill_ts_close_short,
+                inverse,
+                qty_step,
+                price_step,
+                min_qty,
+                min_cost,
+                c_mult,
+                ema_dist_close[1],
+                qty_pct_close[1],
+                we_multiplier_close[1],
+                delay_weight_close[1],
+                delay_between_fills_ms_close[1],
+                wallet_exposure_limit[1],
+            )
+        else:
+            clock_close_short = (0.0, 0.0, "")
+        # check if markup close
+        if psize_short > 0.0 and lows[k] < pprice_short * (1 - min_markup[1]):
+            close_grid_short = calc_close_grid_short(
+                backwards_tp[1],
+                balance_short,
+                psize_short,
+                pprice_short,
+                closes[k - 1],
+                0.0,
+                0,
+                0,
+                inverse,
+                qty_step,
+                price_step,
+                min_qty,
+                min_cost,
+                c_mult,
+                wallet_exposure_limit[1],
+                min_markup[1],
+                markup_range[1],
+                n_close_orders[1],
+                0.0,
+                0.0,
+                0.0,
+                0.0,
+            )
+            if close_grid_short and close_grid_short[0][0] != 0.0:
+                if clock_close_short[1] >= close_grid_short[0][1]:
+                    close_grid_short = calc_close_grid_short(
+                        backwards_tp[1],
+                        balance_short,
+                        -max(
+                            0.0,
+                            round_(abs(psize_short) - abs(clock_close_short[0]), qty_step),
+                        ),
+                        pprice_short,
+                        closes[k - 1],
+                        0.0,
+                        0,
+                        0,
+                        inverse,
+                        qty_step,
+                        price_step,
+                        min_qty,
+                        min_cost,
+                        c_mult,
+                        wallet_exposure_limit[1],
+                        min_markup[1],
+                        markup_range[1],
+                        n_close_orders[1],
+                        0.0,
+                        0.0,
+                        0.0,
+                        0.0,
+                    )
+                    closes_short = [clock_close_short] + close_grid_short
+                else:
+                    closes_short = close_grid_short
+        elif clock_close_short[0] != 0.0:
+            closes_short = [clock_close_short]
+    ask_price_short = calc_clock_price_ask(
+        emas_short.max(), closes[k - 1], ema_dist_entry[1], price_step
+    )
+    if highs[k] > ask_price_short:
+        clock_entry_short = calc_clock_entry_short(
+            balance_short,
+            psize_short,
+            pprice_short,
+            closes[k - 1],
+            emas_short,
+            timestamps[k - 1],
+            prev_clock_fill_ts_entry_short,
+            inverse,
+            qty_step,
+            price_step,
+            min_qty,
+            min_cost,
+            c_mult,
+            ema_dist_entry[1],
+            qty_pct_entry[1],
+            we_multiplier_entry[1],
+            delay_weight_entry[1],
+            delay_between_fills_ms_entry[1],
+            wallet_exposure_limit[1],
+        )
+        if clock_entry_short[0] != 0.0:
+            prev_clock_fill_ts_entry_short = timestamps[k]
+            psize_short, pprice_short = abs(clock_entry_short[3]), clock_entry_short[4]
+            upnl = calc_pnl_short(pprice_short, closes[k], psize_short, inverse, c_mult)
+            equity_short = balance_short + upnl
+            pnl = 0.0
+            fee_paid = (
+                -qty_to_cost(clock_entry_short[0], clock_entry_short[1], inverse, c_mult)
+                * maker_fee
+            )
+            balance_short += fee_paid
+            fills_short.append(
+                (
+                    k,
+                    timestamps[k],
+                    pnl,
+                    fee_paid,
+                    balance_short,
+                    equity_short,
+                    -abs(clock_entry_short[0]),
+                    clock_entry_short[1],
+                    -psize_short,
+                    pprice_short,
+                    "clock_entry_short",
+                )
+            )
+    while closes_short:
+        if closes_short[0][0] != 0.0 and lows[k] < closes_short[0][1]:
+            # close short pos
+            if "clock" in closes_short[0][2]:
+                prev_clock_fill_ts_close_short = timestamps[k]
+            close_qty = min(abs(psize_short), abs(closes_short[0][0]))
+            if close_qty == 0.0:
+                break
+            pnl = calc_pnl_short(pprice_short, closes_short[0][1], close_qty, inverse, c_mult)
+            fee_paid = (
+                -qty_to_cost(close_qty, closes_short[0][1], inverse, c_mult) * maker_fee
+            )
+            balance_short += pnl + fee_paid
+            psize_short = max(0.0, round_(psize_short - close_qty, qty_step))
+            if psize_short == 0.0:
+                pprice_short = 0.0
+                prev_clock_fill_ts_entry_short = 0.0
+            upnl = calc_pnl_short(pprice_short, closes[k], psize_short, inverse, c_mult)
+            equity_short = balance_short + upnl
+            fills_short.append(
+                (
+                    k,
+                    timestamps[k],
+                    pnl,
+                    fee_paid,
+                    balance_short,
+                    equity_short,
+                    close_qty,
+                    closes_short[0][1],
+                    -psize_short,
+                    pprice_short,
+                    closes_short[0][2],
+                )
+            )
+        closes_short = closes_short[1:]
+    return (
+        balance_short,
+        psize_short,
+        pprice_short,
+        prev_clock_fill_ts_entry_short,
+        prev_clock_fill_ts_close_short,
+    )
+
+
 @njit
 def backtest_clock(
     hlc,
@@ -372,8 +906,6 @@ def backtest_clock(
         delay_between_fills_minutes_close[1] * 60 * 1000,
     )
     psize_long, pprice_long, psize_short, pprice_short = 0.0, 0.0, 0.0, 0.0
-    close_grid_long = [(0.0, np.inf, "")]
-    close_grid_short = [(0.0, 0.0, "")]
     balance_long, balance_short = starting_balance, starting_balance
 
     # older versions sometimes had negative delay weights
@@ -388,422 +920,565 @@ def backtest_clock(
     assert max(spans_short) < len(hlc), "ema span short larger than len(prices)"
     spans_long = np.where(spans_long < 1.0, 1.0, spans_long)
     spans_short = np.where(spans_short < 1.0, 1.0, spans_short)
-    max_span_long = int(round(max(spans_long)))
-    max_span_short = int(round(max(spans_short)))
     emas_long, emas_short = np.repeat(closes[0], 3), np.repeat(closes[0], 3)
     alphas_long = 2.0 / (spans_long + 1.0)
     alphas__long = 1.0 - alphas_long
     alphas_short = 2.0 / (spans_short + 1.0)
     alphas__short = 1.0 - alphas_short
 
-    prev_clock_fill_ts_entry_long, prev_clock_fill_ts_close_long = 0, 0
-    prev_clock_fill_ts_entry_short, prev_clock_fill_ts_close_short = 0, 0
-    fills_long, fills_short, stats = [], [], []
+    prev_clock_fill_ts_entry_long, prev_clock_fill_ts_close_long = 0.0, 0.0
+    prev_clock_fill_ts_entry_short, prev_clock_fill_ts_close_short = 0.0, 0.0
+    # fills are appended in process_clock_minute_long/short, so lists are explicitly typed
+    fills_long = [(0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, "")][:0]
+    fills_short = [(0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, "")][:0]
+    stats = []
     next_stats_update = 0
     closest_bkr_long, closest_bkr_short = 1.0, 1.0
     for k in range(1, len(hlc)):
         # process stats
         if timestamps[k] >= next_stats_update:
-            bkr_price_long = calc_bankruptcy_price(
+            row, closest_bkr_long, closest_bkr_short = calc_clock_stats(
+                timestamps[k],
+                closes[k],
                 balance_long,
                 psize_long,
                 pprice_long,
-                0.0,
-                0.0,
-                inverse,
-                c_mult,
-            )
-            bkr_price_short = calc_bankruptcy_price(
                 balance_short,
-                0.0,
-                0.0,
                 psize_short,
                 pprice_short,
+                closest_bkr_long,
+                closest_bkr_short,
                 inverse,
                 c_mult,
             )
-            closest_bkr_long = min(closest_bkr_long, abs(bkr_price_long - closes[k]) / closes[k])
-            closest_bkr_short = min(closest_bkr_short, abs(bkr_price_short - closes[k]) / closes[k])
-            upnl_long = calc_pnl_long(pprice_long, closes[k], psize_long, inverse, c_mult)
-            upnl_short = calc_pnl_short(pprice_short, closes[k], psize_short, inverse, c_mult)
-            equity_long = balance_long + upnl_long
-            equity_short = balance_short + upnl_short
-
-            stats.append(
-                (
-                    timestamps[k],
-                    bkr_price_long,
-                    bkr_price_short,
-                    psize_long,
-                    pprice_long,
-                    -psize_short,
-                    pprice_short,
-                    closes[k],
-                    closest_bkr_long,
-                    closest_bkr_short,
-                    balance_long,
-                    balance_short,
-                    equity_long,
-                    equity_short,
-                )
-            )
-            if equity_long <= 0.05:
+            stats.append(row)
+            if row[12] <= 0.05:
                 do_long = False
-            if equity_short <= 0.05:
+            if row[13] <= 0.05:
                 do_short = False
             next_stats_update = min(timestamps[-1], timestamps[k] + 1000 * 60 * 60)  # hourly
         if do_long:
             emas_long = calc_ema(alphas_long, alphas__long, emas_long, closes[k - 1])
-            # simulate what orders were placed previous minute
-            closes_long = [(0.0, np.inf, "")]
-            if psize_long != 0.0:
-                ask_price_long = calc_clock_price_ask(
-                    emas_long.max(), closes[k - 1], ema_dist_close[0], price_step
-                )
-                if highs[k] > ask_price_long:
-                    # clock close long
-                    clock_close_long = calc_clock_close_long(
-                        balance_long,
-                        psize_long,
-                        pprice_long,
-                        closes[k - 1],
-                        emas_long,
-                        timestamps[k - 1],
-                        prev_clock_fill_ts_close_long,
-                        inverse,
-                        qty_step,
-                        price_step,
-                        min_qty,
-                        min_cost,
-                        c_mult,
-                        ema_dist_close[0],
-                        qty_pct_close[0],
-                        we_multiplier_close[0],
-                        delay_weight_close[0],
-                        delay_between_fills_ms_close[0],
-                        wallet_exposure_limit[0],
-                    )
-                else:
-                    clock_close_long = (0.0, 0.0, "")
-                # check if markup close
-                if psize_long > 0.0 and highs[k] > pprice_long * (1 + min_markup[0]):
-                    close_grid_long = calc_close_grid_long(
-                        backwards_tp[0],
-                        balance_long,
-                        psize_long,
-                        pprice_long,
-                        closes[k - 1],
-                        0.0,
-                        0,
-                        0,
-                        inverse,
-                        qty_step,
-                        price_step,
-                        min_qty,
-                        min_cost,
-                        c_mult,
-                        wallet_exposure_limit[0],
-                        min_markup[0],
-                        markup_range[0],
-                        n_close_orders[0],
-                        0.0,
-                        0.0,
-                        0.0,
-                        0.0,
-                    )
-                    # check whether to modify close grid
-                    if close_grid_long and close_grid_long[0][0] != 0.0:
-                        if clock_close_long[1] <= close_grid_long[0][1]:
-                            close_grid_long = calc_close_grid_long(
-                                backwards_tp[0],
-                                balance_long,
-                                max(0.0, round_(psize_long - abs(clock_close_long[0]), qty_step)),
-                                pprice_long,
-                                closes[k - 1],
-                                0.0,
-                                0,
-                                0,
-                                inverse,
-                                qty_step,
-                                price_step,
-                                min_qty,
-                                min_cost,
-                                c_mult,
-                                wallet_exposure_limit[0],
-                                min_markup[0],
-                                markup_range[0],
-                                n_close_orders[0],
-                                0.0,
-                                0.0,
-                                0.0,
-                                0.0,
-                            )
-                            closes_long = [clock_close_long] + close_grid_long
-                        else:
-                            closes_long = close_grid_long
-                elif clock_close_long[0] != 0.0:
-                    closes_long = [clock_close_long]
-
-            bid_price_long = calc_clock_price_bid(
-                emas_long.min(), closes[k - 1], ema_dist_entry[0], price_step
+            (
+                balance_long,
+                psize_long,
+                pprice_long,
+                prev_clock_fill_ts_entry_long,
+                prev_clock_fill_ts_close_long,
+            ) = process_clock_minute_long(
+                k,
+                timestamps,
+                highs,
+                lows,
+                closes,
+                emas_long,
+                fills_long,
+                balance_long,
+                psize_long,
+                pprice_long,
+                prev_clock_fill_ts_entry_long,
+                prev_clock_fill_ts_close_long,
+                maker_fee,
+                inverse,
+                backwards_tp,
+                qty_step,
+                price_step,
+                min_qty,
+                min_cost,
+                c_mult,
+                ema_dist_entry,
+                ema_dist_close,
+                qty_pct_entry,
+                qty_pct_close,
+                we_multiplier_entry,
+                we_multiplier_close,
+                delay_weight_entry,
+                delay_weight_close,
+                delay_between_fills_ms_entry,
+                delay_between_fills_ms_close,
+                min_markup,
+                markup_range,
+                n_close_orders,
+                wallet_exposure_limit,
             )
-            if lows[k] < bid_price_long:
-                # clock entry long
-                clock_entry_long = calc_clock_entry_long(
-                    balance_long,
-                    psize_long,
-                    pprice_long,
-                    closes[k - 1],
-                    emas_long,
-                    timestamps[k - 1],
-                    prev_clock_fill_ts_entry_long,
-                    inverse,
-                    qty_step,
-                    price_step,
-                    min_qty,
-                    min_cost,
-                    c_mult,
-                    ema_dist_entry[0],
-                    qty_pct_entry[0],
-                    we_multiplier_entry[0],
-                    delay_weight_entry[0],
-                    delay_between_fills_ms_entry[0],
-                    wallet_exposure_limit[0],
-                )
-                if clock_entry_long[0] != 0.0:
-                    prev_clock_fill_ts_entry_long = timestamps[k]
-                    psize_long, pprice_long = clock_entry_long[3], clock_entry_long[4]
-                    upnl = calc_pnl_long(pprice_long, closes[k], psize_long, inverse, c_mult)
-                    equity_long = balance_long + upnl
-                    pnl = 0.0
-                    fee_paid = (
-                        -qty_to_cost(clock_entry_long[0], clock_entry_long[1], inverse, c_mult)
-                        * maker_fee
-                    )
-                    balance_long += fee_paid
-                    fills_long.append(
-                        (
-                            k,
-                            timestamps[k],
-                            pnl,
-                            fee_paid,
-                            balance_long,
-                            equity_long,
-                            clock_entry_long[0],
-                            clock_entry_long[1],
-                            psize_long,
-                            pprice_long,
-                            "clock_entry_long",
-                        )
-                    )
-            while closes_long:
-                if closes_long[0][0] != 0.0 and highs[k] > closes_long[0][1]:
-                    # close long pos
-                    if "clock" in closes_long[0][2]:
-                        prev_clock_fill_ts_close_long = timestamps[k]
-                    close_qty = min(psize_long, abs(closes_long[0][0]))
-                    if close_qty == 0.0:
-                        break
-                    pnl = calc_pnl_long(pprice_long, closes_long[0][1], close_qty, inverse, c_mult)
-                    fee_paid = -qty_to_cost(close_qty, closes_long[0][1], inverse, c_mult) * maker_fee
-                    balance_long += pnl + fee_paid
-                    psize_long = max(0.0, round_(psize_long - close_qty, qty_step))
-                    if psize_long == 0.0:
-                        pprice_long = 0.0
-                        prev_clock_fill_ts_entry_long = 0
-                    upnl = calc_pnl_long(pprice_long, closes[k], psize_long, inverse, c_mult)
-                    equity_long = balance_long + upnl
-                    fills_long.append(
-                        (
-                            k,
-                            timestamps[k],
-                            pnl,
-                            fee_paid,
-                            balance_long,
-                            equity_long,
-                            -close_qty,
-                            closes_long[0][1],
-                            psize_long,
-                            pprice_long,
-                            closes_long[0][2],
-                        )
-                    )
-                closes_long = closes_long[1:]
         if do_short:
             emas_short = calc_ema(alphas_short, alphas__short, emas_short, closes[k - 1])
-            closes_short = [(0.0, 0.0, "")]
-            if psize_short != 0.0:
-                bid_price_short = calc_clock_price_bid(
-                    emas_short.min(), closes[k - 1], ema_dist_close[1], price_step
+            (
+                balance_short,
+                psize_short,
+                pprice_short,
+                prev_clock_fill_ts_entry_short,
+                prev_clock_fill_ts_close_short,
+            ) = process_clock_minute_short(
+                k,
+                timestamps,
+                highs,
+                lows,
+                closes,
+                emas_short,
+                fills_short,
+                balance_short,
+                psize_short,
+                pprice_short,
+                prev_clock_fill_ts_entry_short,
+                prev_clock_fill_ts_close_short,
+                maker_fee,
+                inverse,
+                backwards_tp,
+                qty_step,
+                price_step,
+                min_qty,
+                min_cost,
+                c_mult,
+                ema_dist_entry,
+                ema_dist_close,
+                qty_pct_entry,
+                qty_pct_close,
+                we_multiplier_entry,
+                we_multiplier_close,
+                delay_weight_entry,
+                delay_weight_close,
+                delay_between_fills_ms_entry,
+                delay_between_fills_ms_close,
+                min_markup,
+                markup_range,
+                n_close_orders,
+                wallet_exposure_limit,
+            )
+    return fills_long, fills_short, stats
+
+
+@njit
+def find_next_clock_event_long(
+    k_start,
+    timestamps,
+    highs,
+    lows,
+    closes,
+    bids_entry,
+    asks_close,
+    balance_long,
+    psize_long,
+    pprice_long,
+    prev_clock_fill_ts_entry_long,
+    prev_clock_fill_ts_close_long,
+    inverse,
+    c_mult,
+    delay_weight_entry,
+    delay_weight_close,
+    delay_between_fills_ms_entry,
+    delay_between_fills_ms_close,
+    min_markup,
+    wallet_exposure_limit,
+):
+    """
+    returns first minute >= k_start at which process_clock_minute_long could fill,
+    given that position is unchanged until then, len(timestamps) if none
+    bids_entry and asks_close are clock prices per minute, see calc_clock_price_bid/ask
+    """
+    entry_possible = (
+        qty_to_cost(psize_long, pprice_long, inverse, c_mult) / balance_long
+        < wallet_exposure_limit * 0.99
+    )
+    markup_price = pprice_long * (1 + min_markup)
+    for k in range(k_start, len(timestamps)):
+        if (
+            entry_possible
+            and lows[k] < bids_entry[k]
+            and (
+                psize_long == 0.0
+                or timestamps[k - 1] - prev_clock_fill_ts_entry_long
+                > calc_delay_between_fills_ms_bid(
+                    pprice_long, closes[k - 1], delay_between_fills_ms_entry, delay_weight_entry
                 )
-                if lows[k] < bid_price_short:
-                    clock_close_short = calc_clock_close_short(
-                        balance_short,
-                        psize_short,
-                        pprice_short,
-                        closes[k - 1],
-                        emas_short,
-                        timestamps[k - 1],
-                        prev_clock_fill_ts_close_short,
-                        inverse,
-                        qty_step,
-                        price_step,
-                        min_qty,
-                        min_cost,
-                        c_mult,
-                        ema_dist_close[1],
-                        qty_pct_close[1],
-                        we_multiplier_close[1],
-                        delay_weight_close[1],
-                        delay_between_fills_ms_close[1],
-                        wallet_exposure_limit[1],
-                    )
-                else:
-                    clock_close_short = (0.0, 0.0, "")
-                # check if markup close
-                if psize_short > 0.0 and lows[k] < pprice_short * (1 - min_markup[1]):
-                    close_grid_short = calc_close_grid_short(
-                        backwards_tp[1],
-                        balance_short,
-                        psize_short,
-                        pprice_short,
-                        closes[k - 1],
-                        0.0,
-                        0,
-                        0,
-                        inverse,
-                        qty_step,
-                        price_step,
-                        min_qty,
-                        min_cost,
-                        c_mult,
-                        wallet_exposure_limit[1],
-                        min_markup[1],
-                        markup_range[1],
-                        n_close_orders[1],
-                        0.0,
-                        0.0,
-                        0.0,
-                        0.0,
-                    )
-                    if close_grid_short and close_grid_short[0][0] != 0.0:
-                        if clock_close_short[1] >= close_grid_short[0][1]:
-                            close_grid_short = calc_close_grid_short(
-                                backwards_tp[1],
-                                balance_short,
-                                -max(
-                                    0.0,
-                                    round_(abs(psize_short) - abs(clock_close_short[0]), qty_step),
-                                ),
-                                pprice_short,
-                                closes[k - 1],
-                                0.0,
-                                0,
-                                0,
-                                inverse,
-                                qty_step,
-                                price_step,
-                                min_qty,
-                                min_cost,
-                                c_mult,
-                                wallet_exposure_limit[1],
-                                min_markup[1],
-                                markup_range[1],
-                                n_close_orders[1],
-                                0.0,
-                                0.0,
-                                0.0,
-                                0.0,
-                            )
-                            closes_short = [clock_close_short] + close_grid_short
-                        else:
-                            closes_short = close_grid_short
-                elif clock_close_short[0] != 0.0:
-                    closes_short = [clock_close_short]
-            ask_price_short = calc_clock_price_ask(
-                emas_short.max(), closes[k - 1], ema_dist_entry[1], price_step
             )
-            if highs[k] > ask_price_short:
-                clock_entry_short = calc_clock_entry_short(
-                    balance_short,
-                    psize_short,
-                    pprice_short,
-                    closes[k - 1],
-                    emas_short,
-                    timestamps[k - 1],
-                    prev_clock_fill_ts_entry_short,
-                    inverse,
-                    qty_step,
-                    price_step,
-                    min_qty,
-                    min_cost,
-                    c_mult,
-                    ema_dist_entry[1],
-                    qty_pct_entry[1],
-                    we_multiplier_entry[1],
-                    delay_weight_entry[1],
-                    delay_between_fills_ms_entry[1],
-                    wallet_exposure_limit[1],
+        ):
+            return k
+        if psize_long != 0.0:
+            if highs[k] > markup_price:
+                return k
+            if highs[k] > asks_close[k] and timestamps[
+                k - 1
+            ] - prev_clock_fill_ts_close_long > calc_delay_between_fills_ms_ask(
+                pprice_long, closes[k - 1], delay_between_fills_ms_close, delay_weight_close
+            ):
+                return k
+    return len(timestamps)
+
+
+@njit
+def find_next_clock_event_short(
+    k_start,
+    timestamps,
+    highs,
+    lows,
+    closes,
+    asks_entry,
+    bids_close,
+    balance_short,
+    psize_short,
+    pprice_short,
+    prev_clock_fill_ts_entry_short,
+    prev_clock_fill_ts_close_short,
+    inverse,
+    c_mult,
+    delay_weight_entry,
+    delay_weight_close,
+    delay_between_fills_ms_entry,
+    delay_between_fills_ms_close,
+    min_markup,
+    wallet_exposure_limit,
+):
+    """
+    returns first minute >= k_start at which process_clock_minute_short could fill,
+    given that position is unchanged until then, len(timestamps) if none
+    psize_short is positive
+    """
+    entry_possible = (
+        qty_to_cost(psize_short, pprice_short, inverse, c_mult) / balance_short
+        < wallet_exposure_limit * 0.99
+    )
+    markup_price = pprice_short * (1 - min_markup)
+    for k in range(k_start, len(timestamps)):
+        if (
+            entry_possible
+            and highs[k] > asks_entry[k]
+            and (
+                psize_short == 0.0
+                or timestamps[k - 1] - prev_clock_fill_ts_entry_short
+                > calc_delay_between_fills_ms_ask(
+                    pprice_short, closes[k - 1], delay_between_fills_ms_entry, delay_weight_entry
                 )
-                if clock_entry_short[0] != 0.0:
-                    prev_clock_fill_ts_entry_short = timestamps[k]
-                    psize_short, pprice_short = abs(clock_entry_short[3]), clock_entry_short[4]
-                    upnl = calc_pnl_short(pprice_short, closes[k], psize_short, inverse, c_mult)
-                    equity_short = balance_short + upnl
-                    pnl = 0.0
-                    fee_paid = (
-                        -qty_to_cost(clock_entry_short[0], clock_entry_short[1], inverse, c_mult)
-                        * maker_fee
-                    )
-                    balance_short += fee_paid
-                    fills_short.append(
-                        (
-                            k,
-                            timestamps[k],
-                            pnl,
-                            fee_paid,
-                            balance_short,
-                            equity_short,
-                            -abs(clock_entry_short[0]),
-                            clock_entry_short[1],
-                            -psize_short,
-                            pprice_short,
-                            "clock_entry_short",
-                        )
-                    )
-            while closes_short:
-                if closes_short[0][0] != 0.0 and lows[k] < closes_short[0][1]:
-                    # close short pos
-                    if "clock" in closes_short[0][2]:
-                        prev_clock_fill_ts_close_short = timestamps[k]
-                    close_qty = min(abs(psize_short), abs(closes_short[0][0]))
-                    if close_qty == 0.0:
-                        break
-                    pnl = calc_pnl_short(pprice_short, closes_short[0][1], close_qty, inverse, c_mult)
-                    fee_paid = (
-                        -qty_to_cost(close_qty, closes_short[0][1], inverse, c_mult) * maker_fee
-                    )
-                    balance_short += pnl + fee_paid
-                    psize_short = max(0.0, round_(psize_short - close_qty, qty_step))
-                    if psize_short == 0.0:
-                        pprice_short = 0.0
-                        prev_clock_fill_ts_entry_short = 0
-                    upnl = calc_pnl_short(pprice_short, closes[k], psize_short, inverse, c_mult)
-                    equity_short = balance_short + upnl
-                    fills_short.append(
-                        (
-                            k,
-                            timestamps[k],
-                            pnl,
-                            fee_paid,
-                            balance_short,
-                            equity_short,
-                            close_qty,
-                            closes_short[0][1],
-                            -psize_short,
-                            pprice_short,
-                            closes_short[0][2],
-                        )
-                    )
-                closes_short = closes_short[1:]
+            )
+        ):
+            return k
+        if psize_short != 0.0:
+            if lows[k] < markup_price:
+                return k
+            if lows[k] < bids_close[k] and timestamps[
+                k - 1
+            ] - prev_clock_fill_ts_close_short > calc_delay_between_fills_ms_bid(
+                pprice_short, closes[k - 1], delay_between_fills_ms_close, delay_weight_close
+            ):
+                return k
+    return len(timestamps)
+
+
+@njit
+def calc_clock_bands(emas, closes, ema_dist_lower, ema_dist_upper, price_step):
+    """
+    returns clock bid and ask prices per minute, as computed in process_clock_minute_{pside}
+    """
+    bids, asks = np.zeros(len(closes)), np.zeros(len(closes))
+    for k in range(1, len(closes)):
+        bids[k] = calc_clock_price_bid(emas[k].min(), closes[k - 1], ema_dist_lower, price_step)
+        asks[k] = calc_clock_price_ask(emas[k].max(), closes[k - 1], ema_dist_upper, price_step)
+    return bids, asks
+
+
+@njit
+def backtest_clock_accelerated(
+    hlc,
+    starting_balance,
+    maker_fee,
+    inverse,
+    do_long,
+    do_short,
+    backwards_tp,
+    qty_step,
+    price_step,
+    min_qty,
+    min_cost,
+    c_mult,
+    ema_span_0,
+    ema_span_1,
+    ema_dist_entry,
+    ema_dist_close,
+    qty_pct_entry,
+    qty_pct_close,
+    we_multiplier_entry,
+    we_multiplier_close,
+    delay_weight_entry,
+    delay_weight_close,
+    delay_between_fills_minutes_entry,
+    delay_between_fills_minutes_close,
+    min_markup,
+    markup_range,
+    n_close_orders,
+    wallet_exposure_limit,
+):
+    """
+    same fills and stats as backtest_clock, but instead of simulating every minute,
+    jumps to the next minute at which a fill is possible:
+    EMAs and clock prices are precomputed for all minutes, then each side scans forward
+    for the first minute at which price crosses its clock or markup prices
+    after fill delay has passed
+    """
+    # hlc [[ts, high, low, close]] 1m
+    timestamps = hlc[:, 0]
+    highs = hlc[:, 1]
+    lows = hlc[:, 2]
+    closes = hlc[:, 3]
+    if wallet_exposure_limit[0] == 0.0:
+        do_long = False
+    if wallet_exposure_limit[1] == 0.0:
+        do_short = False
+    # (long, short)
+    delay_between_fills_ms_entry = (
+        delay_between_fills_minutes_entry[0] * 60 * 1000,
+        delay_between_fills_minutes_entry[1] * 60 * 1000,
+    )
+    delay_between_fills_ms_close = (
+        delay_between_fills_minutes_close[0] * 60 * 1000,
+        delay_between_fills_minutes_close[1] * 60 * 1000,
+    )
+    psize_long, pprice_long, psize_short, pprice_short = 0.0, 0.0, 0.0, 0.0
+    balance_long, balance_short = starting_balance, starting_balance
+
+    # older versions sometimes had negative delay weights
+    delay_weight_entry = (abs(delay_weight_entry[0]), abs(delay_weight_entry[1]))
+    delay_weight_close = (abs(delay_weight_close[0]), abs(delay_weight_close[1]))
+
+    spans_long = [ema_span_0[0], (ema_span_0[0] * ema_span_1[0]) ** 0.5, ema_span_1[0]]
+    spans_long = np.array(sorted(spans_long)) if do_long else np.ones(3)
+    spans_short = [ema_span_0[1], (ema_span_0[1] * ema_span_1[1]) ** 0.5, ema_span_1[1]]
+    spans_short = np.array(sorted(spans_short)) if do_short else np.ones(3)
+    assert max(spans_long) < len(hlc), "ema span long larger than len(prices)"
+    assert max(spans_short) < len(hlc), "ema span short larger than len(prices)"
+    spans_long = np.where(spans_long < 1.0, 1.0, spans_long)
+    spans_short = np.where(spans_short < 1.0, 1.0, spans_short)
+    alphas_long = 2.0 / (spans_long + 1.0)
+    alphas_short = 2.0 / (spans_short + 1.0)
+    emas_long = calc_clock_emas(closes, alphas_long, 1.0 - alphas_long)
+    emas_short = calc_clock_emas(closes, alphas_short, 1.0 - alphas_short)
+    bids_entry_long, asks_close_long = calc_clock_bands(
+        emas_long, closes, ema_dist_entry[0], ema_dist_close[0], price_step
+    )
+    bids_close_short, asks_entry_short = calc_clock_bands(
+        emas_short, closes, ema_dist_close[1], ema_dist_entry[1], price_step
+    )
+
+    prev_clock_fill_ts_entry_long, prev_clock_fill_ts_close_long = 0.0, 0.0
+    prev_clock_fill_ts_entry_short, prev_clock_fill_ts_close_short = 0.0, 0.0
+    # fills are appended in process_clock_minute_long/short, so lists are explicitly typed
+    fills_long = [(0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, "")][:0]
+    fills_short = [(0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, "")][:0]
+    stats = []
+    next_stats_update = 0.0
+    closest_bkr_long, closest_bkr_short = 1.0, 1.0
+    n = len(hlc)
+    k_next_long = (
+        find_next_clock_event_long(
+            1,
+            timestamps,
+            highs,
+            lows,
+            closes,
+            bids_entry_long,
+            asks_close_long,
+            balance_long,
+            psize_long,
+            pprice_long,
+            prev_clock_fill_ts_entry_long,
+            prev_clock_fill_ts_close_long,
+            inverse,
+            c_mult,
+            delay_weight_entry[0],
+            delay_weight_close[0],
+            delay_between_fills_ms_entry[0],
+            delay_between_fills_ms_close[0],
+            min_markup[0],
+            wallet_exposure_limit[0],
+        )
+        if do_long
+        else n
+    )
+    k_next_short = (
+        find_next_clock_event_short(
+            1,
+            timestamps,
+            highs,
+            lows,
+            closes,
+            asks_entry_short,
+            bids_close_short,
+            balance_short,
+            psize_short,
+            pprice_short,
+            prev_clock_fill_ts_entry_short,
+            prev_clock_fill_ts_close_short,
+            inverse,
+            c_mult,
+            delay_weight_entry[1],
+            delay_weight_close[1],
+            delay_between_fills_ms_entry[1],
+            delay_between_fills_ms_close[1],
+            min_markup[1],
+            wallet_exposure_limit[1],
+        )
+        if do_short
+        else n
+    )
+    k = 1
+    while True:
+        k_next_stats = max(k, np.searchsorted(timestamps, next_stats_update))
+        k = min(k_next_stats, k_next_long, k_next_short)
+        if k >= n:
+            break
+        if timestamps[k] >= next_stats_update:
+            row, closest_bkr_long, closest_bkr_short = calc_clock_stats(
+                timestamps[k],
+                closes[k],
+                balance_long,
+                psize_long,
+                pprice_long,
+                balance_short,
+                psize_short,
+                pprice_short,
+                closest_bkr_long,
+                closest_bkr_short,
+                inverse,
+                c_mult,
+            )
+            stats.append(row)
+            if row[12] <= 0.05:
+                do_long = False
+            if row[13] <= 0.05:
+                do_short = False
+            next_stats_update = min(timestamps[-1], timestamps[k] + 1000 * 60 * 60)  # hourly
+            if not do_long:
+                k_next_long = n
+            if not do_short:
+                k_next_short = n
+        if k == k_next_long:
+            (
+                balance_long,
+                psize_long,
+                pprice_long,
+                prev_clock_fill_ts_entry_long,
+                prev_clock_fill_ts_close_long,
+            ) = process_clock_minute_long(
+                k,
+                timestamps,
+                highs,
+                lows,
+                closes,
+                emas_long[k],
+                fills_long,
+                balance_long,
+                psize_long,
+                pprice_long,
+                prev_clock_fill_ts_entry_long,
+                prev_clock_fill_ts_close_long,
+                maker_fee,
+                inverse,
+                backwards_tp,
+                qty_step,
+                price_step,
+                min_qty,
+                min_cost,
+                c_mult,
+                ema_dist_entry,
+                ema_dist_close,
+                qty_pct_entry,
+                qty_pct_close,
+                we_multiplier_entry,
+                we_multiplier_close,
+                delay_weight_entry,
+                delay_weight_close,
+                delay_between_fills_ms_entry,
+                delay_between_fills_ms_close,
+                min_markup,
+                markup_range,
+                n_close_orders,
+                wallet_exposure_limit,
+            )
+            k_next_long = find_next_clock_event_long(
+                k + 1,
+                timestamps,
+                highs,
+                lows,
+                closes,
+                bids_entry_long,
+                asks_close_long,
+                balance_long,
+                psize_long,
+                pprice_long,
+                prev_clock_fill_ts_entry_long,
+                prev_clock_fill_ts_close_long,
+                inverse,
+                c_mult,
+                delay_weight_entry[0],
+                delay_weight_close[0],
+                delay_between_fills_ms_entry[0],
+                delay_between_fills_ms_close[0],
+                min_markup[0],
+                wallet_exposure_limit[0],
+            )
+        if k == k_next_short:
+            (
+                balance_short,
+                psize_short,
+                pprice_short,
+                prev_clock_fill_ts_entry_short,
+                prev_clock_fill_ts_close_short,
+            ) = process_clock_minute_short(
+                k,
+                timestamps,
+                highs,
+                lows,
+                closes,
+                emas_short[k],
+                fills_short,
+                balance_short,
+                psize_short,
+                pprice_short,
+                prev_clock_fill_ts_entry_short,
+                prev_clock_fill_ts_close_short,
+                maker_fee,
+                inverse,
+                backwards_tp,
+                qty_step,
+                price_step,
+                min_qty,
+                min_cost,
+                c_mult,
+                ema_dist_entry,
+                ema_dist_close,
+                qty_pct_entry,
+                qty_pct_close,
+                we_multiplier_entry,
+                we_multiplier_close,
+                delay_weight_entry,
+                delay_weight_close,
+                delay_between_fills_ms_entry,
+                delay_between_fills_ms_close,
+                min_markup,
+                markup_range,
+                n_close_orders,
+                wallet_exposure_limit,
+            )
+            k_next_short = find_next_clock_event_short(
+                k + 1,
+                timestamps,
+                highs,
+                lows,
+                closes,
+                asks_entry_short,
+                bids_close_short,
+                balance_short,
+                psize_short,
+                pprice_short,
+                prev_clock_fill_ts_entry_short,
+                prev_clock_fill_ts_close_short,
+                inverse,
+                c_mult,
+                delay_weight_entry[1],
+                delay_weight_close[1],
+                delay_between_fills_ms_entry[1],
+                delay_between_fills_ms_close[1],
+                min_markup[1],
+                wallet_exposure_limit[1],
+            )
+        k += 1
     return fills_long, fills_short, stats
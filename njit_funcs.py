@@ -1042,6 +1042,80 @@ def calc_bankruptcy_price(
     return max(0.0, bankruptcy_price)
 
 
+@njit
+def is_hopeless(
+    equity,
+    equity_peak,
+    balance,
+    ms_since_prev_fill,
+    abort_drawdown_max,
+    abort_hrs_stuck_max,
+    abort_eqbal_ratio_min,
+):
+    """
+    used by backtesters to abort early on candidates which can no longer score well
+    each criterion is disabled if set to 0.0
+    """
+    if abort_drawdown_max > 0.0 and equity_peak > 0.0:
+        if 1.0 - equity / equity_peak > abort_drawdown_max:
+            return True
+    if abort_hrs_stuck_max > 0.0:
+        if ms_since_prev_fill / (1000 * 60 * 60) > abort_hrs_stuck_max:
+            return True
+    if abort_eqbal_ratio_min > 0.0 and balance > 0.0:
+        if equity / balance < abort_eqbal_ratio_min:
+            return True
+    return False
+
+
+@njit
+def init_backtest_state(starting_balance, first_timestamp, first_close, do_long, do_short):
+    """
+    returns initial state carried between chunks of backtest_{passivbot_mode}_chunk:
+    (state_long, state_short, next_stats_update), where state_{pside} is
+    (
+        balance, equity, psize, pprice, bkr_price,
+        next_entry_update_ts, next_close_grid_update_ts, prev_AU_fill_ts_close,
+        closest_bkr, equity_peak, abort_k, emas, wallet_exposure, do_pside, prev_fill_ts,
+    )
+    """
+    state_long = (
+        starting_balance,
+        starting_balance,
+        0.0,
+        0.0,
+        0.0,
+        0.0,
+        0.0,
+        0.0,
+        1.0,
+        starting_balance,
+        0,
+        np.repeat(first_close, 3),
+        0.0,
+        do_long,
+        first_timestamp,
+    )
+    state_short = (
+        starting_balance,
+        starting_balance,
+        0.0,
+        0.0,
+        0.0,
+        0.0,
+        0.0,
+        0.0,
+        1.0,
+        starting_balance,
+        0,
+        np.repeat(first_close, 3),
+        0.0,
+        do_short,
+        first_timestamp,
+    )
+    return state_long, state_short, 0.0
+
+
 @njit
 def basespace(start, end, base, n):
     if base == 1.0:
@@ -22,6 +22,8 @@ from njit_funcs import (
     find_entry_qty_bringing_wallet_exposure_to_target,
     calc_auto_unstuck_entry_long,
     calc_auto_unstuck_entry_short,
+    is_hopeless,
+    init_backtest_state,
 )
 
 
@@ -42,6 +44,55 @@ else:
     from numba import njit
 
 
+@njit
+def init_neat_grid_cache(max_n_entry_orders, n_slots=16):
+    """
+    ring buffer of whole neat entry grids keyed by [balance, initial_entry_price]
+    a whole grid depends only on those two and on config, so cache must not outlive config
+    n_slots=0 disables caching
+    returns (keys, grids, cursor)
+    """
+    keys = np.full((n_slots, 2), np.nan)
+    grids = np.zeros((n_slots, max_n_entry_orders, 5))
+    cursor = np.zeros(1, dtype=np.int64)
+    return keys, grids, cursor
+
+
+@njit
+def get_cached_neat_grid(grid_cache, balance, initial_entry_price):
+    # returns copy of cached grid, or empty grid if not cached
+    keys, grids, cursor = grid_cache
+    for i in range(len(keys)):
+        if keys[i][0] == balance and keys[i][1] == initial_entry_price:
+            return grids[i].copy()
+    return np.empty((0, 5))
+
+
+@njit
+def set_cached_neat_grid(grid_cache, balance, initial_entry_price, grid):
+    keys, grids, cursor = grid_cache
+    if len(keys) == 0 or len(grid) != grids.shape[1]:
+        return
+    i = cursor[0]
+    keys[i][0] = balance
+    keys[i][1] = initial_entry_price
+    grids[i] = grid
+    cursor[0] = (i + 1) % len(keys)
+
+
+@njit
+def find_nearest_node(grid, psize):
+    # returns (diff, i) of node whose psize is closest to psize; lowest i on ties
+    abs_psize = abs(psize)
+    diff = abs(abs(grid[0][2]) - abs_psize) / abs_psize
+    i = 0
+    for j in range(1, len(grid)):
+        diff_ = abs(abs(grid[j][2]) - abs_psize) / abs_psize
+        if diff_ < diff:
+            diff, i = diff_, j
+    return diff, i
+
+
 @njit
 def calc_neat_grid_long(
     balance,
@@ -66,6 +117,7 @@ def calc_neat_grid_long(
     auto_unstuck_wallet_exposure_threshold,
     auto_unstuck_ema_dist,
     auto_unstuck_on_timer,
+    grid_cache,
 ) -> [(float, float, str)]:
     if wallet_exposure_limit == 0.0:
         return [(0.0, 0.0, "")]
@@ -131,6 +183,7 @@ def calc_neat_grid_long(
         initial_qty_pct,
         eqty_exp_base,
         eprice_exp_base,
+        grid_cache,
     )
     if len(grid) == 0:
         return [(0.0, 0.0, "")]
@@ -174,6 +227,7 @@ def calc_neat_grid_short(
     auto_unstuck_wallet_exposure_threshold,
     auto_unstuck_ema_dist,
     auto_unstuck_on_timer,
+    grid_cache,
 ) -> [(float, float, str)]:
     if wallet_exposure_limit == 0.0:
         return [(0.0, 0.0, "")]
@@ -240,6 +294,7 @@ def calc_neat_grid_short(
         initial_qty_pct,
         eqty_exp_base,
         eprice_exp_base,
+        grid_cache,
     )
     if len(grid) == 0:
         return [(0.0, 0.0, "")]
@@ -276,28 +331,32 @@ def approximate_neat_grid_long(
     initial_qty_pct,
     eqty_exp_base,
     eprice_exp_base,
+    grid_cache,
     crop: bool = True,
 ):
     def eval_(ientry_price_guess, psize_):
         ientry_price_guess = round_(ientry_price_guess, price_step)
-        grid = calc_whole_neat_entry_grid_long(
-            balance,
-            ientry_price_guess,
-            inverse,
-            qty_step,
-            price_step,
-            min_qty,
-            min_cost,
-            c_mult,
-            grid_span,
-            wallet_exposure_limit,
-            max_n_entry_orders,
-            initial_qty_pct,
-            eqty_exp_base,
-            eprice_exp_base,
-        )
+        grid = get_cached_neat_grid(grid_cache, balance, ientry_price_guess)
+        if len(grid) == 0:
+            grid = calc_whole_neat_entry_grid_long(
+                balance,
+                ientry_price_guess,
+                inverse,
+                qty_step,
+                price_step,
+                min_qty,
+                min_cost,
+                c_mult,
+                grid_span,
+                wallet_exposure_limit,
+                max_n_entry_orders,
+                initial_qty_pct,
+                eqty_exp_base,
+                eprice_exp_base,
+            )
+            set_cached_neat_grid(grid_cache, balance, ientry_price_guess, grid)
         # find node whose psize is closest to psize
-        diff, i = sorted([(abs(grid[i][2] - psize_) / psize_, i) for i in range(len(grid))])[0]
+        diff, i = find_nearest_node(grid, psize_)
         return grid, diff, i
 
     if pprice == 0.0 or psize == 0.0:
@@ -360,31 +419,32 @@ def approximate_neat_grid_short(
     initial_qty_pct,
     eqty_exp_base,
     eprice_exp_base,
+    grid_cache,
     crop: bool = True,
 ):
     def eval_(ientry_price_guess, psize_):
         ientry_price_guess = round_(ientry_price_guess, price_step)
-        grid = calc_whole_neat_entry_grid_short(
-            balance,
-            ientry_price_guess,
-            inverse,
-            qty_step,
-            price_step,
-            min_qty,
-            min_cost,
-            c_mult,
-            grid_span,
-            wallet_exposure_limit,
-            max_n_entry_orders,
-            initial_qty_pct,
-            eqty_exp_base,
-            eprice_exp_base,
-        )
+        grid = get_cached_neat_grid(grid_cache, balance, ientry_price_guess)
+        if len(grid) == 0:
+            grid = calc_whole_neat_entry_grid_short(
+                balance,
+                ientry_price_guess,
+                inverse,
+                qty_step,
+                price_step,
+                min_qty,
+                min_cost,
+                c_mult,
+                grid_span,
+                wallet_exposure_limit,
+                max_n_entry_orders,
+                initial_qty_pct,
+                eqty_exp_base,
+                eprice_exp_base,
+            )
+            set_cached_neat_grid(grid_cache, balance, ientry_price_guess, grid)
         # find node whose psize is closest to psize
-        abs_psize_ = abs(psize_)
-        diff, i = sorted(
-            [(abs(abs(grid[i][2]) - abs_psize_) / abs_psize_, i) for i in range(len(grid))]
-        )[0]
+        diff, i = find_nearest_node(grid, psize_)
         return grid, diff, i
 
     abs_psize = abs(psize)
@@ -836,8 +896,15 @@ def calc_whole_neat_entry_grid_short(
 
 
 @njit
-def backtest_neat_grid(
+def backtest_neat_grid_chunk(
     ticks,
+    k_offset,
+    n_ticks,
+    state,
+    entries_long,
+    entries_short,
+    closes_long,
+    closes_short,
     starting_balance,
     latency_simulation_ms,
     maker_fee,
@@ -866,7 +933,18 @@ def backtest_neat_grid(
     auto_unstuck_wallet_exposure_threshold,
     auto_unstuck_delay_minutes,
     auto_unstuck_qty_pct,
+    abort_drawdown_max=0.0,
+    abort_hrs_stuck_max=0.0,
+    abort_eqbal_ratio_min=0.0,
 ):
+    """
+    backtests ticks[1:], where ticks[0] is the last tick of previous chunk
+    k_offset is index in full series of ticks[0]; n_ticks is length of full series
+    state and open orders are carried over from previous chunk, see init_backtest_state
+    returns fills_long, fills_short, stats, (k_end, abort_k_long, abort_k_short),
+    state, entries_long, entries_short, closes_long, closes_short
+    k_end and abort_k_{pside} are indices in full series
+    """
     if len(ticks[0]) == 3:
         timestamps = ticks[:, 0]
         closes = ticks[:, 2]
@@ -878,25 +956,43 @@ def backtest_neat_grid(
         lows = ticks[:, 2]
         closes = ticks[:, 3]
 
-    balance_long = balance_short = equity_long = equity_short = starting_balance
-    psize_long, pprice_long, psize_short, pprice_short = 0.0, 0.0, 0.0, 0.0
-
     fills_long, fills_short, stats = [], [], []
-
-    entries_long = closes_long = [(0.0, 0.0, "")]
-    entries_short = closes_short = [(0.0, 0.0, "")]
-    bkr_price_long = bkr_price_short = 0.0
-
-    next_entry_grid_update_ts_long = 0
-    next_entry_grid_update_ts_short = 0
-    next_close_grid_update_ts_long = 0
-    next_close_grid_update_ts_short = 0
-    next_stats_update = 0
-
-    prev_AU_fill_ts_close_long = 0
-    prev_AU_fill_ts_close_short = 0
-
-    closest_bkr_long = closest_bkr_short = 1.0
+    # state is carried per pside, as tuples of over 30 items fail to compile on python 3.11
+    state_long, state_short, next_stats_update = state
+    (
+        balance_long,
+        equity_long,
+        psize_long,
+        pprice_long,
+        bkr_price_long,
+        next_entry_grid_update_ts_long,
+        next_close_grid_update_ts_long,
+        prev_AU_fill_ts_close_long,
+        closest_bkr_long,
+        equity_peak_long,
+        abort_k_long,
+        emas_long,
+        long_wallet_exposure,
+        do_long,
+        prev_fill_ts_long,
+    ) = state_long
+    (
+        balance_short,
+        equity_short,
+        psize_short,
+        pprice_short,
+        bkr_price_short,
+        next_entry_grid_update_ts_short,
+        next_close_grid_update_ts_short,
+        prev_AU_fill_ts_close_short,
+        closest_bkr_short,
+        equity_peak_short,
+        abort_k_short,
+        emas_short,
+        short_wallet_exposure,
+        do_short,
+        prev_fill_ts_short,
+    ) = state_short
 
     spans_multiplier = 60 / ((timestamps[1] - timestamps[0]) / 1000)
 
@@ -904,20 +1000,17 @@ def backtest_neat_grid(
     spans_long = np.array(sorted(spans_long)) * spans_multiplier if do_long else np.ones(3)
     spans_short = [ema_span_0[1], (ema_span_0[1] * ema_span_1[1]) ** 0.5, ema_span_1[1]]
     spans_short = np.array(sorted(spans_short)) * spans_multiplier if do_short else np.ones(3)
-    assert max(spans_long) < len(closes), "max ema_span long larger than len(closes)"
-    assert max(spans_short) < len(closes), "max ema_span short larger than len(closes)"
+    assert max(spans_long) < n_ticks, "max ema_span long larger than n_ticks"
+    assert max(spans_short) < n_ticks, "max ema_span short larger than n_ticks"
     spans_long = np.where(spans_long < 1.0, 1.0, spans_long)
     spans_short = np.where(spans_short < 1.0, 1.0, spans_short)
     max_span_long = int(round(max(spans_long)))
     max_span_short = int(round(max(spans_short)))
-    emas_long, emas_short = np.repeat(closes[0], 3), np.repeat(closes[0], 3)
     alphas_long = 2.0 / (spans_long + 1.0)
     alphas__long = 1.0 - alphas_long
     alphas_short = 2.0 / (spans_short + 1.0)
     alphas__short = 1.0 - alphas_short
 
-    long_wallet_exposure = 0.0
-    short_wallet_exposure = 0.0
     long_wallet_exposure_auto_unstuck_threshold = (
         (wallet_exposure_limit[0] * (1 - auto_unstuck_wallet_exposure_threshold[0]))
         if auto_unstuck_wallet_exposure_threshold[0] != 0.0
@@ -929,10 +1022,15 @@ def backtest_neat_grid(
         else wallet_exposure_limit[1] * 10
     )
 
-    for k in range(1, len(closes)):
+    # grids are recalculated every 5 minutes, mostly with unchanged balance, psize and pprice
+    grid_cache_long = init_neat_grid_cache(max_n_entry_orders[0])
+    grid_cache_short = init_neat_grid_cache(max_n_entry_orders[1])
+
+    k_end = len(ticks) + k_offset
+    for k in range(1, len(ticks)):
         if do_long:
             emas_long = calc_ema(alphas_long, alphas__long, emas_long, closes[k - 1])
-            if k >= max_span_long:
+            if k + k_offset >= max_span_long:
                 # check bankruptcy
                 bkr_diff_long = calc_diff(bkr_price_long, closes[k])
                 closest_bkr_long = min(closest_bkr_long, bkr_diff_long)
@@ -946,7 +1044,7 @@ def backtest_neat_grid(
                         psize_long, pprice_long = 0.0, 0.0
                         fills_long.append(
                             (
-                                k,
+                                k + k_offset,
                                 timestamps[k],
                                 pnl,
                                 fee_paid,
@@ -979,7 +1077,8 @@ def backtest_neat_grid(
                                 equity_short,
                             )
                         )
-                        return fills_long, fills_short, stats
+                        k_end = k + k_offset
+                        break
 
                 # check if long entry grid should be updated
                 if timestamps[k] >= next_entry_grid_update_ts_long:
@@ -1006,6 +1105,7 @@ def backtest_neat_grid(
                         auto_unstuck_wallet_exposure_threshold[0],
                         auto_unstuck_ema_dist[0],
                         auto_unstuck_delay_minutes[0] or auto_unstuck_qty_pct[0],
+                        grid_cache_long,
                     )
 
                     next_entry_grid_update_ts_long = timestamps[k] + 1000 * 60 * 5
@@ -1063,7 +1163,7 @@ def backtest_neat_grid(
                     )
                     fills_long.append(
                         (
-                            k,
+                            k + k_offset,
                             timestamps[k],
                             0.0,
                             fee_paid,
@@ -1128,7 +1228,7 @@ def backtest_neat_grid(
                         prev_AU_fill_ts_close_long = timestamps[k]
                     fills_long.append(
                         (
-                            k,
+                            k + k_offset,
                             timestamps[k],
                             pnl,
                             fee_paid,
@@ -1180,7 +1280,7 @@ def backtest_neat_grid(
 
         if do_short:
             emas_short = calc_ema(alphas_short, alphas__short, emas_short, closes[k - 1])
-            if k >= max_span_short:
+            if k + k_offset >= max_span_short:
                 # check bankruptcy
                 bkr_diff_short = calc_diff(bkr_price_short, closes[k])
                 closest_bkr_short = min(closest_bkr_short, bkr_diff_short)
@@ -1197,7 +1297,7 @@ def backtest_neat_grid(
                         psize_short, pprice_short = 0.0, 0.0
                         fills_short.append(
                             (
-                                k,
+                                k + k_offset,
                                 timestamps[k],
                                 pnl,
                                 fee_paid,
@@ -1230,7 +1330,8 @@ def backtest_neat_grid(
                                 equity_short,
                             )
                         )
-                        return fills_long, fills_short, stats
+                        k_end = k + k_offset
+                        break
 
                 # check if short entry grid should be updated
                 if timestamps[k] >= next_entry_grid_update_ts_short:
@@ -1257,6 +1358,7 @@ def backtest_neat_grid(
                         auto_unstuck_wallet_exposure_threshold[1],
                         auto_unstuck_ema_dist[1],
                         auto_unstuck_delay_minutes[1] or auto_unstuck_qty_pct[1],
+                        grid_cache_short,
                     )
 
                     next_entry_grid_update_ts_short = timestamps[k] + 1000 * 60 * 5
@@ -1312,7 +1414,7 @@ def backtest_neat_grid(
                     )
                     fills_short.append(
                         (
-                            k,
+                            k + k_offset,
                             timestamps[k],
                             0.0,
                             fee_paid,
@@ -1376,7 +1478,7 @@ def backtest_neat_grid(
                         prev_AU_fill_ts_close_short = timestamps[k]
                     fills_short.append(
                         (
-                            k,
+                            k + k_offset,
                             timestamps[k],
                             pnl,
                             fee_paid,
@@ -1450,22 +1552,197 @@ def backtest_neat_grid(
             )
             next_stats_update = round(timestamps[k] + 60 * 60 * 1000)
 
-    stats.append(
-        (
-            next_stats_update,
-            bkr_price_long,
-            bkr_price_short,
-            psize_long,
-            pprice_long,
-            psize_short,
-            pprice_short,
-            closes[k],
-            closest_bkr_long,
-            closest_bkr_short,
-            balance_long,
-            balance_short,
-            equity_long,
-            equity_short,
+            # check abort criteria
+            if do_long:
+                equity_peak_long = max(equity_peak_long, equity_long)
+                if is_hopeless(
+                    equity_long,
+                    equity_peak_long,
+                    balance_long,
+                    timestamps[k]
+                    - (fills_long[-1][1] if len(fills_long) > 0 else prev_fill_ts_long),
+                    abort_drawdown_max,
+                    abort_hrs_stuck_max,
+                    abort_eqbal_ratio_min,
+                ):
+                    abort_k_long = k + k_offset
+                    do_long = False
+            if do_short:
+                equity_peak_short = max(equity_peak_short, equity_short)
+                if is_hopeless(
+                    equity_short,
+                    equity_peak_short,
+                    balance_short,
+                    timestamps[k]
+                    - (fills_short[-1][1] if len(fills_short) > 0 else prev_fill_ts_short),
+                    abort_drawdown_max,
+                    abort_hrs_stuck_max,
+                    abort_eqbal_ratio_min,
+                ):
+                    abort_k_short = k + k_offset
+                    do_short = False
+            if (abort_k_long or abort_k_short) and not do_long and not do_short:
+                k_end = k + k_offset
+                break
+
+    if k_end == n_ticks:
+        stats.append(
+            (
+                next_stats_update,
+                bkr_price_long,
+                bkr_price_short,
+                psize_long,
+                pprice_long,
+                psize_short,
+                pprice_short,
+                closes[k],
+                closest_bkr_long,
+                closest_bkr_short,
+                balance_long,
+                balance_short,
+                equity_long,
+                equity_short,
+            )
         )
+    if len(fills_long) > 0:
+        prev_fill_ts_long = fills_long[-1][1]
+    if len(fills_short) > 0:
+        prev_fill_ts_short = fills_short[-1][1]
+    # empty lists can not be typed when passed back in
+    if len(entries_long) == 0:
+        entries_long = [(0.0, 0.0, "")]
+    if len(entries_short) == 0:
+        entries_short = [(0.0, 0.0, "")]
+    if len(closes_long) == 0:
+        closes_long = [(0.0, 0.0, "")]
+    if len(closes_short) == 0:
+        closes_short = [(0.0, 0.0, "")]
+    state_long = (
+        balance_long,
+        equity_long,
+        psize_long,
+        pprice_long,
+        bkr_price_long,
+        next_entry_grid_update_ts_long,
+        next_close_grid_update_ts_long,
+        prev_AU_fill_ts_close_long,
+        closest_bkr_long,
+        equity_peak_long,
+        abort_k_long,
+        emas_long,
+        long_wallet_exposure,
+        do_long,
+        prev_fill_ts_long,
+    )
+    state_short = (
+        balance_short,
+        equity_short,
+        psize_short,
+        pprice_short,
+        bkr_price_short,
+        next_entry_grid_update_ts_short,
+        next_close_grid_update_ts_short,
+        prev_AU_fill_ts_close_short,
+        closest_bkr_short,
+        equity_peak_short,
+        abort_k_short,
+        emas_short,
+        short_wallet_exposure,
+        do_short,
+        prev_fill_ts_short,
+    )
+    state = (state_long, state_short, next_stats_update)
+    return (
+        fills_long,
+        fills_short,
+        stats,
+        (k_end, abort_k_long, abort_k_short),
+        state,
+        entries_long,
+        entries_short,
+        closes_long,
+        closes_short,
+    )
+
+
+@njit
+def backtest_neat_grid(
+    ticks,
+    starting_balance,
+    latency_simulation_ms,
+    maker_fee,
+    inverse,
+    do_long,
+    do_short,
+    backwards_tp,
+    qty_step,
+    price_step,
+    min_qty,
+    min_cost,
+    c_mult,
+    ema_span_0,
+    ema_span_1,
+    eqty_exp_base,
+    eprice_exp_base,
+    grid_span,
+    initial_eprice_ema_dist,
+    initial_qty_pct,
+    markup_range,
+    max_n_entry_orders,
+    min_markup,
+    n_close_orders,
+    wallet_exposure_limit,
+    auto_unstuck_ema_dist,
+    auto_unstuck_wallet_exposure_threshold,
+    auto_unstuck_delay_minutes,
+    auto_unstuck_qty_pct,
+    abort_drawdown_max=0.0,
+    abort_hrs_stuck_max=0.0,
+    abort_eqbal_ratio_min=0.0,
+):
+    """
+    returns fills_long, fills_short, stats, (k_end, abort_k_long, abort_k_short)
+    abort_k_{pside} is index of tick at which pside was aborted, 0 if not aborted
+    """
+    res = backtest_neat_grid_chunk(
+        ticks,
+        0,
+        len(ticks),
+        init_backtest_state(starting_balance, ticks[0, 0], ticks[0, -1], do_long, do_short),
+        [(0.0, 0.0, "")],
+        [(0.0, 0.0, "")],
+        [(0.0, 0.0, "")],
+        [(0.0, 0.0, "")],
+        starting_balance,
+        latency_simulation_ms,
+        maker_fee,
+        inverse,
+        do_long,
+        do_short,
+        backwards_tp,
+        qty_step,
+        price_step,
+        min_qty,
+        min_cost,
+        c_mult,
+        ema_span_0,
+        ema_span_1,
+        eqty_exp_base,
+        eprice_exp_base,
+        grid_span,
+        initial_eprice_ema_dist,
+        initial_qty_pct,
+        markup_range,
+        max_n_entry_orders,
+        min_markup,
+        n_close_orders,
+        wallet_exposure_limit,
+        auto_unstuck_ema_dist,
+        auto_unstuck_wallet_exposure_threshold,
+        auto_unstuck_delay_minutes,
+        auto_unstuck_qty_pct,
+        abort_drawdown_max,
+        abort_hrs_stuck_max,
+        abort_eqbal_ratio_min,
     )
-    return fills_long, fills_short, stats
+    return res[0], res[1], res[2], res[3]
@@ -23,6 +23,8 @@ from njit_funcs import (
     calc_close_grid_short,
     calc_auto_unstuck_entry_long,
     calc_auto_unstuck_entry_short,
+    is_hopeless,
+    init_backtest_state,
 )
 
 
@@ -540,8 +542,15 @@ def calc_recursive_entries_short(
 
 
 @njit
-def backtest_recursive_grid(
+def backtest_recursive_grid_chunk(
     ticks,
+    k_offset,
+    n_ticks,
+    state,
+    entry_long,
+    entry_short,
+    closes_long,
+    closes_short,
     starting_balance,
     latency_simulation_ms,
     maker_fee,
@@ -569,7 +578,18 @@ def backtest_recursive_grid(
     auto_unstuck_ema_dist,
     auto_unstuck_delay_minutes,
     auto_unstuck_qty_pct,
+    abort_drawdown_max=0.0,
+    abort_hrs_stuck_max=0.0,
+    abort_eqbal_ratio_min=0.0,
 ):
+    """
+    backtests ticks[1:], where ticks[0] is the last tick of previous chunk
+    k_offset is index in full series of ticks[0]; n_ticks is length of full series
+    state and open orders are carried over from previous chunk, see init_backtest_state
+    returns fills_long, fills_short, stats, (k_end, abort_k_long, abort_k_short),
+    state, entry_long, entry_short, closes_long, closes_short
+    k_end and abort_k_{pside} are indices in full series
+    """
     if len(ticks[0]) == 3:
         timestamps = ticks[:, 0]
         closes = ticks[:, 2]
@@ -581,24 +601,43 @@ def backtest_recursive_grid(
         lows = ticks[:, 2]
         closes = ticks[:, 3]
 
-    balance_long = balance_short = equity_long = equity_short = starting_balance
-    psize_long, pprice_long, psize_short, pprice_short = 0.0, 0.0, 0.0, 0.0
-
     fills_long, fills_short, stats = [], [], []
-
-    entry_long, entry_short = (0.0, 0.0, ""), (0.0, 0.0, "")
-    closes_long, closes_short = [(0.0, 0.0, "")], [(0.0, 0.0, "")]
-    bkr_price_long = bkr_price_short = 0.0
-
-    next_entry_update_ts_long = 0
-    next_entry_update_ts_short = 0
-    next_close_grid_update_ts_long = 0
-    next_close_grid_update_ts_short = 0
-    next_stats_update = 0
-    prev_AU_fill_ts_close_long = 0
-    prev_AU_fill_ts_close_short = 0
-
-    closest_bkr_long = closest_bkr_short = 1.0
+    # state is carried per pside, as tuples of over 30 items fail to compile on python 3.11
+    state_long, state_short, next_stats_update = state
+    (
+        balance_long,
+        equity_long,
+        psize_long,
+        pprice_long,
+        bkr_price_long,
+        next_entry_update_ts_long,
+        next_close_grid_update_ts_long,
+        prev_AU_fill_ts_close_long,
+        closest_bkr_long,
+        equity_peak_long,
+        abort_k_long,
+        emas_long,
+        long_wallet_exposure,
+        do_long,
+        prev_fill_ts_long,
+    ) = state_long
+    (
+        balance_short,
+        equity_short,
+        psize_short,
+        pprice_short,
+        bkr_price_short,
+        next_entry_update_ts_short,
+        next_close_grid_update_ts_short,
+        prev_AU_fill_ts_close_short,
+        closest_bkr_short,
+        equity_peak_short,
+        abort_k_short,
+        emas_short,
+        short_wallet_exposure,
+        do_short,
+        prev_fill_ts_short,
+    ) = state_short
 
     spans_multiplier = 60 / ((timestamps[1] - timestamps[0]) / 1000)
 
@@ -606,20 +645,17 @@ def backtest_recursive_grid(
     spans_long = np.array(sorted(spans_long)) * spans_multiplier if do_long else np.ones(3)
     spans_short = [ema_span_0[1], (ema_span_0[1] * ema_span_1[1]) ** 0.5, ema_span_1[1]]
     spans_short = np.array(sorted(spans_short)) * spans_multiplier if do_short else np.ones(3)
-    assert max(spans_long) < len(ticks), "ema_span_1 long larger than len(prices)"
-    assert max(spans_short) < len(ticks), "ema_span_1 short larger than len(prices)"
+    assert max(spans_long) < n_ticks, "ema_span_1 long larger than n_ticks"
+    assert max(spans_short) < n_ticks, "ema_span_1 short larger than n_ticks"
     spans_long = np.where(spans_long < 1.0, 1.0, spans_long)
     spans_short = np.where(spans_short < 1.0, 1.0, spans_short)
     max_span_long = int(round(max(spans_long)))
     max_span_short = int(round(max(spans_short)))
-    emas_long, emas_short = np.repeat(closes[0], 3), np.repeat(closes[0], 3)
     alphas_long = 2.0 / (spans_long + 1.0)
     alphas__long = 1.0 - alphas_long
     alphas_short = 2.0 / (spans_short + 1.0)
     alphas__short = 1.0 - alphas_short
 
-    long_wallet_exposure = 0.0
-    short_wallet_exposure = 0.0
     long_wallet_exposure_auto_unstuck_threshold = (
         (wallet_exposure_limit[0] * (1 - auto_unstuck_wallet_exposure_threshold[0]))
         if auto_unstuck_wallet_exposure_threshold[0] != 0.0
@@ -630,10 +666,11 @@ def backtest_recursive_grid(
         if auto_unstuck_wallet_exposure_threshold[1] != 0.0
         else wallet_exposure_limit[1] * 10
     )
+    k_end = len(ticks) + k_offset
     for k in range(1, len(ticks)):
         if do_long:
             emas_long = calc_ema(alphas_long, alphas__long, emas_long, closes[k - 1])
-            if k >= max_span_long:
+            if k + k_offset >= max_span_long:
                 # check bankruptcy
                 bkr_diff_long = calc_diff(bkr_price_long, closes[k])
                 closest_bkr_long = min(closest_bkr_long, bkr_diff_long)
@@ -647,7 +684,7 @@ def backtest_recursive_grid(
                         psize_long, pprice_long = 0.0, 0.0
                         fills_long.append(
                             (
-                                k,
+                                k + k_offset,
                                 timestamps[k],
                                 pnl,
                                 fee_paid,
@@ -662,7 +699,8 @@ def backtest_recursive_grid(
                         )
                     do_long = False
                     if not do_short:
-                        return fills_long, fills_short, stats
+                        k_end = k + k_offset
+                        break
 
                 # check if long entry order should be updated
                 if timestamps[k] >= next_entry_update_ts_long:
@@ -740,7 +778,7 @@ def backtest_recursive_grid(
                     )
                     fills_long.append(
                         (
-                            k,
+                            k + k_offset,
                             timestamps[k],
                             0.0,
                             fee_paid,
@@ -827,7 +865,7 @@ def backtest_recursive_grid(
                         prev_AU_fill_ts_close_long = timestamps[k]
                     fills_long.append(
                         (
-                            k,
+                            k + k_offset,
                             timestamps[k],
                             pnl,
                             fee_paid,
@@ -880,7 +918,7 @@ def backtest_recursive_grid(
 
         if do_short:
             emas_short = calc_ema(alphas_short, alphas__short, emas_short, closes[k - 1])
-            if k >= max_span_short:
+            if k + k_offset >= max_span_short:
                 # check bankruptcy
                 bkr_diff_short = calc_diff(bkr_price_short, closes[k])
                 closest_bkr_short = min(closest_bkr_short, bkr_diff_short)
@@ -897,7 +935,7 @@ def backtest_recursive_grid(
                         psize_short, pprice_short = 0.0, 0.0
                         fills_short.append(
                             (
-                                k,
+                                k + k_offset,
                                 timestamps[k],
                                 pnl,
                                 fee_paid,
@@ -912,7 +950,8 @@ def backtest_recursive_grid(
                         )
                     do_short = False
                     if not do_long:
-                        return fills_long, fills_short, stats
+                        k_end = k + k_offset
+                        break
 
                 # check if entry order should be updated
                 if timestamps[k] >= next_entry_update_ts_short:
@@ -991,7 +1030,7 @@ def backtest_recursive_grid(
                     )
                     fills_short.append(
                         (
-                            k,
+                            k + k_offset,
                             timestamps[k],
                             0.0,
                             fee_paid,
@@ -1077,7 +1116,7 @@ def backtest_recursive_grid(
                         prev_AU_fill_ts_close_short = timestamps[k]
                     fills_short.append(
                         (
-                            k,
+                            k + k_offset,
                             timestamps[k],
                             pnl,
                             fee_paid,
@@ -1156,4 +1195,172 @@ def backtest_recursive_grid(
             )
             next_stats_update = timestamps[k] + 60 * 60 * 1000
 
-    return fills_long, fills_short, stats
+            # check abort criteria
+            if do_long:
+                equity_peak_long = max(equity_peak_long, equity_long)
+                if is_hopeless(
+                    equity_long,
+                    equity_peak_long,
+                    balance_long,
+                    timestamps[k]
+                    - (fills_long[-1][1] if len(fills_long) > 0 else prev_fill_ts_long),
+                    abort_drawdown_max,
+                    abort_hrs_stuck_max,
+                    abort_eqbal_ratio_min,
+                ):
+                    abort_k_long = k + k_offset
+                    do_long = False
+            if do_short:
+                equity_peak_short = max(equity_peak_short, equity_short)
+                if is_hopeless(
+                    equity_short,
+                    equity_peak_short,
+                    balance_short,
+                    timestamps[k]
+                    - (fills_short[-1][1] if len(fills_short) > 0 else prev_fill_ts_short),
+                    abort_drawdown_max,
+                    abort_hrs_stuck_max,
+                    abort_eqbal_ratio_min,
+                ):
+                    abort_k_short = k + k_offset
+                    do_short = False
+            if (abort_k_long or abort_k_short) and not do_long and not do_short:
+                k_end = k + k_offset
+                break
+
+    if len(fills_long) > 0:
+        prev_fill_ts_long = fills_long[-1][1]
+    if len(fills_short) > 0:
+        prev_fill_ts_short = fills_short[-1][1]
+    # empty lists can not be typed when passed back in
+    if len(closes_long) == 0:
+        closes_long = [(0.0, 0.0, "")]
+    if len(closes_short) == 0:
+        closes_short = [(0.0, 0.0, "")]
+    state_long = (
+        balance_long,
+        equity_long,
+        psize_long,
+        pprice_long,
+        bkr_price_long,
+        next_entry_update_ts_long,
+        next_close_grid_update_ts_long,
+        prev_AU_fill_ts_close_long,
+        closest_bkr_long,
+        equity_peak_long,
+        abort_k_long,
+        emas_long,
+        long_wallet_exposure,
+        do_long,
+        prev_fill_ts_long,
+    )
+    state_short = (
+        balance_short,
+        equity_short,
+        psize_short,
+        pprice_short,
+        bkr_price_short,
+        next_entry_update_ts_short,
+        next_close_grid_update_ts_short,
+        prev_AU_fill_ts_close_short,
+        closest_bkr_short,
+        equity_peak_short,
+        abort_k_short,
+        emas_short,
+        short_wallet_exposure,
+        do_short,
+        prev_fill_ts_short,
+    )
+    state = (state_long, state_short, next_stats_update)
+    return (
+        fills_long,
+        fills_short,
+        stats,
+        (k_end, abort_k_long, abort_k_short),
+        state,
+        entry_long,
+        entry_short,
+        closes_long,
+        closes_short,
+    )
+
+
+@njit
+def backtest_recursive_grid(
+    ticks,
+    starting_balance,
+    latency_simulation_ms,
+    maker_fee,
+    inverse,
+    do_long,
+    do_short,
+    backwards_tp,
+    qty_step,
+    price_step,
+    min_qty,
+    min_cost,
+    c_mult,
+    ema_span_0,
+    ema_span_1,
+    initial_qty_pct,
+    initial_eprice_ema_dist,
+    wallet_exposure_limit,
+    ddown_factor,
+    rentry_pprice_dist,
+    rentry_pprice_dist_wallet_exposure_weighting,
+    min_markup,
+    markup_range,
+    n_close_orders,
+    auto_unstuck_wallet_exposure_threshold,
+    auto_unstuck_ema_dist,
+    auto_unstuck_delay_minutes,
+    auto_unstuck_qty_pct,
+    abort_drawdown_max=0.0,
+    abort_hrs_stuck_max=0.0,
+    abort_eqbal_ratio_min=0.0,
+):
+    """
+    returns fills_long, fills_short, stats, (k_end, abort_k_long, abort_k_short)
+    abort_k_{pside} is index of tick at which pside was aborted, 0 if not aborted
+    """
+    res = backtest_recursive_grid_chunk(
+        ticks,
+        0,
+        len(ticks),
+        init_backtest_state(starting_balance, ticks[0, 0], ticks[0, -1], do_long, do_short),
+        (0.0, 0.0, ""),
+        (0.0, 0.0, ""),
+        [(0.0, 0.0, "")],
+        [(0.0, 0.0, "")],
+        starting_balance,
+        latency_simulation_ms,
+        maker_fee,
+        inverse,
+        do_long,
+        do_short,
+        backwards_tp,
+        qty_step,
+        price_step,
+        min_qty,
+        min_cost,
+        c_mult,
+        ema_span_0,
+        ema_span_1,
+        initial_qty_pct,
+        initial_eprice_ema_dist,
+        wallet_exposure_limit,
+        ddown_factor,
+        rentry_pprice_dist,
+        rentry_pprice_dist_wallet_exposure_weighting,
+        min_markup,
+        markup_range,
+        n_close_orders,
+        auto_unstuck_wallet_exposure_threshold,
+        auto_unstuck_ema_dist,
+        auto_unstuck_delay_minutes,
+        auto_unstuck_qty_pct,
+        abort_drawdown_max,
+        abort_hrs_stuck_max,
+        abort_eqbal_ratio_min,
+    )
+    return res[0], res[1], res[2], res[3]
@@ -31,6 +31,7 @@ from njit_funcs import (
     calc_pnl_short,
     round_,
     calc_min_entry_qty,
+    is_hopeless,
 )
 from njit_funcs_recursive_grid import calc_recursive_entry_long, calc_recursive_entry_short
 
@@ -49,6 +50,60 @@ def calc_pnl_sum(poss_long, poss_short, market_prices, c_mults):
     return pnl_sum
 
 
+@njit
+def calc_upnls(poss_long, poss_short, market_prices, c_mults):
+    # linear upnl per symbol, long plus short; poss [[size, price]]
+    return np.abs(poss_long[:, 0]) * c_mults * (market_prices - poss_long[:, 1]) + np.abs(
+        poss_short[:, 0]
+    ) * c_mults * (poss_short[:, 1] - market_prices)
+
+
+@njit
+def calc_wallet_exposures(poss, c_mults, balance):
+    # linear wallet exposure per symbol; poss [[size, price]]
+    return np.abs(poss[:, 0] * poss[:, 1]) * c_mults / balance
+
+
+@njit
+def find_stuck_position(
+    poss_long,
+    poss_short,
+    market_prices,
+    c_mults,
+    WE_limits,
+    AU_eligible,
+    balance,
+    stuck_threshold,
+):
+    """
+    WE_limits and AU_eligible: [[long, short]] per symbol
+    a position is stuck if WE / WE_limit > stuck_threshold and price is past pprice
+    returns (symbol index, pside index, pprice diff) of stuck position with lowest pprice diff,
+    ties go to lowest symbol index, long before short
+    returns (-1, -1, 0.0) if no position is stuck
+    """
+    n = len(market_prices)
+    if n == 0:
+        return -1, -1, 0.0
+    pprice_diffs = np.full((n, 2), np.inf)
+    for j, poss in enumerate([poss_long, poss_short]):
+        wallet_exposures = calc_wallet_exposures(poss, c_mults, balance)
+        WE_limits_ = np.where(WE_limits[:, j] == 0.0, 1.0, WE_limits[:, j])
+        stuck = (
+            AU_eligible[:, j]
+            & (WE_limits[:, j] != 0.0)
+            & (wallet_exposures / WE_limits_ > stuck_threshold)
+        )
+        pprices = np.where(poss[:, 1] > 0.0, poss[:, 1], 1.0)
+        diffs = 1.0 - market_prices / pprices if j == 0 else market_prices / pprices - 1.0
+        pprice_diffs[:, j] = np.where(stuck & (diffs > 0.0), diffs, np.inf)
+    k = np.argmin(pprice_diffs)
+    i, j = k // 2, k % 2
+    if pprice_diffs[i, j] == np.inf:
+        return -1, -1, 0.0
+    return i, j, pprice_diffs[i, j]
+
+
 @njit
 def get_open_orders_long(
     close_price,
@@ -360,6 +415,9 @@ def backtest_multisymbol_recursive_grid(
     loss_allowance_pct,
     stuck_threshold,
     unstuck_close_pct,
+    abort_drawdown_max=0.0,
+    abort_hrs_stuck_max=0.0,
+    abort_eqbal_ratio_min=0.0,
 ):
     """
     multi symbol backtest
@@ -411,6 +469,12 @@ def backtest_multisymbol_recursive_grid(
     [(long, short), (long, short), ...]
 
     stuck_threshold: if WE / WE_limit > stuck_threshold: consider position stuck
+
+    abort_*: stop early if hopeless, checked hourly; 0.0 disables criterion
+    hrs stuck is hours since any fill
+
+    returns fills, stats, abort_k
+    abort_k is index of minute at which backtest was aborted, 0 if not aborted
     """
 
     inverse = False
@@ -484,6 +548,9 @@ def backtest_multisymbol_recursive_grid(
     any_stuck = False
     pnl_cumsum_running = 0.0
     pnl_cumsum_max = 0.0
+    equity_peak = starting_balance
+    prev_fill_k = 0
+    abort_k = 0
 
     for k in range(1, len(hlcs[0])):
         any_fill = False
@@ -602,6 +669,9 @@ def backtest_multisymbol_recursive_grid(
                     # is unstuck
                     stuck_positions_short[i] = 0.0
 
+        if any_fill:
+            prev_fill_k = k
+
         s_i, s_pside = -1, -1
         unstucking_close = (0.0, 0.0, "")
         if any_stuck:
@@ -785,6 +855,18 @@ def backtest_multisymbol_recursive_grid(
                 # bankrupt
                 bankrupt = True
                 break
+            equity_peak = max(equity_peak, equity)
+            if is_hopeless(
+                equity,
+                equity_peak,
+                balance,
+                (k - prev_fill_k) * 60 * 1000,
+                abort_drawdown_max,
+                abort_hrs_stuck_max,
+                abort_eqbal_ratio_min,
+            ):
+                abort_k = k
+                break
     equity = balance + calc_pnl_sum(poss_long, poss_short, hlcs[:, k, 2], c_mults)
     if bankrupt:
         # force equity to be close to zero if bankrupt
@@ -809,4 +891,4 @@ def backtest_multisymbol_recursive_grid(
                 equity,
             )
         )
-    return fills, stats
+    return fills, stats, abort_k
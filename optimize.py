@@ -9,7 +9,7 @@ import json
 import numpy as np
 import traceback
 from copy import deepcopy
-from backtest import backtest
+from backtest import backtest_abortable
 from multiprocessing import Pool, shared_memory
 from njit_funcs import round_dynamic
 from pure_funcs import (
@@ -27,6 +27,7 @@ from pure_funcs import (
     get_empty_analysis,
     calc_scores,
     analyze_fills,
+    window_backtest_result,
 )
 from procedures import (
     add_argparse_args,
@@ -117,6 +118,12 @@ def calc_metrics_mean(analyses: dict):
     maxs = [
         "hrs_stuck_max_long",
         "hrs_stuck_max_short",
+        "pruned_long",
+        "pruned_short",
+    ]
+    sums = [
+        "n_ticks_simulated",
+        "n_ticks_total",
     ]
     analysis_combined = {}
     for key in mins:
@@ -128,6 +135,9 @@ def calc_metrics_mean(analyses: dict):
     for key in maxs:
         if key in analyses[0]:
             analysis_combined[key] = max([a[key] for a in analyses])
+    for key in sums:
+        if key in analyses[0]:
+            analysis_combined[key] = sum([a[key] for a in analyses])
     for key in analyses[0]:
         if key not in analysis_combined:
             try:
@@ -140,6 +150,7 @@ def calc_metrics_mean(analyses: dict):
 def backtest_wrap(config_: dict, ticks_caches: dict):
     """
     loads historical data from disk, runs backtest and returns relevant metrics
+    with single_pass_slices, slices are windows of the full backtest instead of separate backtests
     """
     config = {
         **{"long": deepcopy(config_["long"]), "short": deepcopy(config_["short"])},
@@ -154,6 +165,10 @@ def backtest_wrap(config_: dict, ticks_caches: dict):
                 "adg_n_subdivisions",
                 "n_backtest_slices",
                 "slim_analysis",
+                "single_pass_slices",
+                "abort_drawdown_max",
+                "abort_hrs_stuck_max",
+                "abort_eqbal_ratio_min",
             ]
         },
         **{k: v for k, v in config_["market_specific_settings"].items()},
@@ -162,6 +177,10 @@ def backtest_wrap(config_: dict, ticks_caches: dict):
         ticks = ticks_caches[config["symbol"]]
     else:
         ticks = np.load(config_["ticks_cache_fname"])
+    # successive halving: low fidelity candidates are backtested on most recent fraction of ticks
+    fidelity = config_.get("fidelity", 1.0)
+    if fidelity < 1.0:
+        ticks = ticks[int(len(ticks) * (1.0 - fidelity)) :]
     try:
         assert "adg_n_subdivisions" in config
         analyses = []
@@ -175,15 +194,56 @@ def backtest_wrap(config_: dict, ticks_caches: dict):
                 )
                 for i in range(max(1, n_slices - 1))
             ]
+        abort_criteria = (
+            config["abort_drawdown_max"],
+            config["abort_hrs_stuck_max"],
+            config["abort_eqbal_ratio_min"],
+        )
         for ia, ib in slices:
             data = ticks[ia:ib]
-            fills_long, fills_short, stats = backtest(config, data)
-            if config["slim_analysis"]:
+            windowed = False
+            if config["single_pass_slices"] and (ia, ib) != (0, len(ticks)):
+                # window the full pass instead of backtesting slice separately
+                fills_long, fills_short, stats, checkpoint = window_backtest_result(
+                    *full_pass[:3], ticks[ia][0], ticks[ib - 1][0] + 1
+                )
+                # slices starting with a position are not comparable to a separate backtest
+                windowed = len(stats) < 2 or (
+                    checkpoint["psize_long"] == 0.0 and checkpoint["psize_short"] == 0.0
+                )
+            if windowed:
+                # ticks of slice simulated by full pass, which is aborted at k_end
+                n_ticks_simulated = max(0, min(ib, full_pass[3][0]) - ia)
+                # abort ks of full pass are indices in ticks; slices ended before abort are unpruned
+                abort_ks = [abort_k if abort_k < ib else 0 for abort_k in full_pass[3][1:]]
+            else:
+                fills_long, fills_short, stats, (k_end, *abort_ks) = backtest_abortable(
+                    config, data, abort_criteria
+                )
+                n_ticks_simulated = k_end
+                if (ia, ib) == (0, len(ticks)):
+                    full_pass = (fills_long, fills_short, stats, (k_end, *abort_ks))
+            if windowed and len(stats) < 2:
+                # full pass was aborted before slice; slice counts as pruned with empty analysis
+                analysis = {**analyses[0], **get_empty_analysis()}
+            elif config["slim_analysis"]:
                 analysis = analyze_fills_slim(fills_long, fills_short, stats, config)
             else:
                 longs, shorts, sdf, analysis = analyze_fills(fills_long, fills_short, stats, config)
+            for pside, fills, abort_k in zip(["long", "short"], [fills_long, fills_short], abort_ks):
+                analysis[f"pruned_{pside}"] = float(abort_k > 0)
+                if abort_k and fills and len(stats) >= 2:
+                    # include time stuck from last fill until abort
+                    analysis[f"hrs_stuck_max_{pside}"] = max(
+                        analysis[f"hrs_stuck_max_{pside}"],
+                        (stats[-1][0] - fills[-1][1]) / (1000.0 * 60 * 60),
+                    )
+            analysis["n_ticks_simulated"] = n_ticks_simulated
+            analysis["n_ticks_total"] = len(data)
+            analysis["slice_windowed"] = float(windowed)
             analyses.append(analysis.copy())
         analysis = calc_metrics_mean(analyses)
+        analysis["fidelity"] = fidelity
     except Exception as e:
         analysis = get_empty_analysis()
         logging.error(f'error with {config["symbol"]} {e}')
@@ -376,6 +436,16 @@ async def run_opt(args, config):
             config["base_dir"] = args.base_dir
         if config["passivbot_mode"] == "clock":
             config["ohlcv"] = True
+        for key in ["abort_drawdown_max", "abort_hrs_stuck_max", "abort_eqbal_ratio_min"]:
+            if key not in config:
+                config[key] = 0.0
+        for key, default_val in [
+            ("min_fidelity", 1.0),
+            ("fidelity_eta", 3.0),
+            ("single_pass_slices", False),
+        ]:
+            if key not in config:
+                config[key] = default_val
         print()
         lines = [
             (k, config[k])
@@ -500,6 +570,10 @@ async def run_opt(args, config):
             "adg_n_subdivisions",
             "n_backtest_slices",
             "slim_analysis",
+            "single_pass_slices",
+            "abort_drawdown_max",
+            "abort_hrs_stuck_max",
+            "abort_eqbal_ratio_min",
         ]
 
         if config["algorithm"] == "particle_swarm_optimization":
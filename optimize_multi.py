@@ -4,8 +4,8 @@ import multiprocessing
 import pprint
 import numpy as np
 import pandas as pd
-import json
 import logging
+import serialization
 import argparse
 from deap import base, creator, tools, algorithms
 from collections import OrderedDict
@@ -22,6 +22,7 @@ from pure_funcs import (
 )
 from backtest_multi import backtest_multi, prep_config_multi, prep_hlcs_mss_config
 from njit_multisymbol import backtest_multisymbol_recursive_grid
+from successive_halving import calc_fidelities, clamp_eta, successive_halving_map
 
 
 def calc_pa_dist_mean(stats):
@@ -149,11 +150,18 @@ class Evaluator:
                 "min_qtys",
                 "worst_drawdown_lower_bound",
                 "selected_metrics",
+                "abort_drawdown_max",
+                "abort_hrs_stuck_max",
+                "abort_eqbal_ratio_min",
             ]
         }
 
-    def evaluate(self, individual):
+    def evaluate(self, individual, fidelity=1.0):
         # individual is a list of floats
+        # fidelity < 1.0 backtests only the most recent fraction of hlcs
+        hlcs = self.shared_hlcs_np
+        if fidelity < 1.0:
+            hlcs = hlcs[:, int(len(hlcs[0]) * (1.0 - fidelity)) :]
         config_ = self.config.copy()
         live_configs = individual_to_live_configs(individual, config_["symbols"])
         for key in [
@@ -169,9 +177,13 @@ class Evaluator:
                 for symbol in config_["symbols"]
             ]
         )
-        res = backtest_multi(self.shared_hlcs_np, config_)
-        fills, stats = res
+        res = backtest_multi(hlcs, config_)
+        fills, stats, abort_k = res
         analysis = analyze_fills_opti(fills, stats, config_)
+        analysis["pruned"] = abort_k > 0
+        analysis["n_minutes_simulated"] = abort_k if abort_k else len(hlcs[0])
+        analysis["n_minutes_total"] = len(hlcs[0])
+        analysis["fidelity"] = fidelity
 
         to_dump = {
             "analysis": analysis,
@@ -188,7 +200,7 @@ class Evaluator:
             },
         }
         with open(self.results_cache_fname, "a") as f:
-            f.write(json.dumps(denumpyize(to_dump)) + "\n")
+            f.write(serialization.dumps(denumpyize(to_dump)) + "\n")
         return tuple([analysis[k] for k in self.config["selected_metrics"]])
 
     def cleanup(self):
@@ -197,6 +209,26 @@ class Evaluator:
         self.shared_hlcs.unlink()
 
 
+def log_pruning_summary(results_cache_fname):
+    n_evals, n_pruned, n_minutes_simulated, n_minutes_total = 0, 0, 0, 0
+    n_full_fidelity = 0
+    with open(results_cache_fname) as f:
+        for line in f:
+            analysis = serialization.loads(line)["analysis"]
+            n_evals += 1
+            n_pruned += analysis.get("pruned", False)
+            n_minutes_simulated += analysis.get("n_minutes_simulated", 0)
+            n_minutes_total += analysis.get("n_minutes_total", 0)
+            n_full_fidelity += analysis.get("fidelity", 1.0) >= 1.0
+    if n_minutes_total:
+        saved = 1 - n_minutes_simulated / n_minutes_total
+        logging.info(
+            f"pruned {n_pruned} of {n_evals} candidates, {saved:.2%} of backtest minutes skipped"
+        )
+    if n_full_fidelity < n_evals:
+        logging.info(f"successive halving: {n_full_fidelity} of {n_evals} evals at full fidelity")
+
+
 def get_individual_keys():
     return [
         "global_TWE_long",
@@ -306,6 +338,9 @@ def backtest_multi(hlcs, config):
         config["loss_allowance_pct"],
         config["stuck_threshold"],
         config["unstuck_close_pct"],
+        abort_drawdown_max=config.get("abort_drawdown_max", 0.0),
+        abort_hrs_stuck_max=config.get("abort_hrs_stuck_max", 0.0),
+        abort_eqbal_ratio_min=config.get("abort_eqbal_ratio_min", 0.0),
     )
     return res
 
@@ -361,7 +396,14 @@ async def main():
     config["results_cache_fname"] = make_get_filepath(
         f"results_multi/{ts_to_date_utc(utc_ms())[:19].replace(':', '_')}_all_results.txt"
     )
-    for key, default_val in [("worst_drawdown_lower_bound", 0.5)]:
+    for key, default_val in [
+        ("worst_drawdown_lower_bound", 0.5),
+        ("abort_drawdown_max", 0.0),
+        ("abort_hrs_stuck_max", 0.0),
+        ("abort_eqbal_ratio_min", 0.0),
+        ("min_fidelity", 1.0),
+        ("fidelity_eta", 3.0),
+    ]:
         if key not in config:
             config[key] = default_val
 
@@ -424,7 +466,21 @@ async def main():
 
         # Parallelization setup
         pool = multiprocessing.Pool(processes=n_cpus)
-        toolbox.register("map", pool.map)
+        # eta is clamped once, so rungs and promoted fraction agree
+        fidelity_eta = clamp_eta(config["fidelity_eta"])
+        fidelities = calc_fidelities(config["min_fidelity"], fidelity_eta)
+        if len(fidelities) > 1:
+            # successive halving: evaluate offspring on recent window first,
+            # re-evaluate only the best on longer windows
+            def map_successive_halving(func, individuals):
+                fitnesses, _ = successive_halving_map(
+                    pool.starmap, func, list(individuals), fidelities, fidelity_eta
+                )
+                return fitnesses
+
+            toolbox.register("map", map_successive_halving)
+        else:
+            toolbox.register("map", pool.map)
 
         # Population setup
         pop = toolbox.population(n=100)
@@ -452,6 +508,7 @@ async def main():
             halloffame=hof,
             verbose=True,
         )
+        log_pruning_summary(config["results_cache_fname"])
     finally:
         # Close the pool
         logging.info(f"attempting clean shutdown...")
@@ -0,0 +1,214 @@
+from bisect import bisect_left, insort
+
+from pure_funcs import calc_order_type, order_within_tolerance
+
+
+class OpenOrderBook:
+    """
+    open orders indexed by id, maintained incrementally from websocket and REST updates
+    per symbol orders keep insertion order
+    per (symbol, position side) orders are kept sorted by price
+    reads like {symbol: [order, ...]} for compatibility with code expecting a dict of lists
+    """
+
+    diff_keys = ("symbol", "side", "position_side", "qty", "price")
+
+    def __init__(self):
+        self.orders = {}  # id -> order
+        self.by_symbol = {}  # symbol -> {id: order}
+        self.by_key = {}  # symbol -> {diff key: [id, ...]}, ids in insertion order
+        self.by_price = {}  # (symbol, position side) -> sorted [(price, id), ...]
+        self.order_keys = {}  # id -> diff key
+
+    @staticmethod
+    def calc_key(order: dict) -> tuple:
+        qty = order["amount"] if order.get("amount") is not None else order["qty"]
+        return (order["symbol"], order["side"], order["position_side"], abs(qty), order["price"])
+
+    def add_symbol(self, symbol: str):
+        if symbol not in self.by_symbol:
+            self.by_symbol[symbol] = {}
+            self.by_key[symbol] = {}
+            self.by_price[(symbol, "long")] = []
+            self.by_price[(symbol, "short")] = []
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.by_symbol
+
+    def __iter__(self):
+        return iter(self.by_symbol)
+
+    def __len__(self) -> int:
+        return len(self.by_symbol)
+
+    def __getitem__(self, symbol: str) -> [dict]:
+        return list(self.by_symbol[symbol].values())
+
+    def __setitem__(self, symbol: str, orders: [dict]):
+        self.add_symbol(symbol)
+        for order_id in list(self.by_symbol[symbol]):
+            self.remove(order_id)
+        for order in orders:
+            self.add(order)
+
+    def keys(self):
+        return self.by_symbol.keys()
+
+    def values(self):
+        return [list(orders.values()) for orders in self.by_symbol.values()]
+
+    def items(self):
+        return [(symbol, list(orders.values())) for symbol, orders in self.by_symbol.items()]
+
+    def has(self, order_id) -> bool:
+        return order_id in self.orders
+
+    def get(self, order_id):
+        return self.orders.get(order_id)
+
+    def get_all(self) -> [dict]:
+        return list(self.orders.values())
+
+    def get_sorted(self, symbol: str, position_side: str) -> [dict]:
+        # orders of symbol and position side sorted by price
+        return [self.orders[order_id] for _, order_id in self.by_price[(symbol, position_side)]]
+
+    def add(self, order: dict) -> bool:
+        """
+        returns False if order id is already present
+        raises KeyError if order symbol was not added
+        """
+        symbol = order["symbol"]
+        if order["id"] in self.orders:
+            return False
+        key = self.calc_key(order)
+        self.by_symbol[symbol][order["id"]] = order
+        self.orders[order["id"]] = order
+        self.order_keys[order["id"]] = key
+        self.by_key[symbol].setdefault(key, []).append(order["id"])
+        insort(
+            self.by_price.setdefault((symbol, order["position_side"]), []),
+            (order["price"], order["id"]),
+        )
+        return True
+
+    def remove(self, order_id):
+        # returns removed order, or None if not present
+        if order_id not in self.orders:
+            return None
+        order = self.orders.pop(order_id)
+        key = self.order_keys.pop(order_id)
+        symbol = order["symbol"]
+        del self.by_symbol[symbol][order_id]
+        ids = self.by_key[symbol][key]
+        ids.remove(order_id)
+        if not ids:
+            del self.by_key[symbol][key]
+        prices = self.by_price[(symbol, order["position_side"])]
+        prices.pop(bisect_left(prices, (order["price"], order_id)))
+        return order
+
+    def replace(self, orders: [dict]) -> ([dict], [dict]):
+        """
+        sets open orders to given orders of added symbols, touching only orders that changed
+        returns (added, removed)
+        """
+        new_ids = {order["id"] for order in orders}
+        removed = [self.remove(x) for x in list(self.orders) if x not in new_ids]
+        added = []
+        for order in orders:
+            if order["id"] in self.orders:
+                if self.order_keys[order["id"]] == self.calc_key(order):
+                    # keep latest order details
+                    self.orders[order["id"]] = order
+                    self.by_symbol[order["symbol"]][order["id"]] = order
+                    continue
+                self.remove(order["id"])
+            self.add(order)
+            added.append(order)
+        return added, removed
+
+    def normalize(self, order_id) -> dict:
+        order = self.orders[order_id]
+        symbol, side, position_side, qty, price = self.order_keys[order_id]
+        return {
+            "symbol": symbol,
+            "side": side,
+            "position_side": position_side,
+            "qty": qty,
+            "price": price,
+            "reduce_only": (position_side == "long" and side == "sell")
+            or (position_side == "short" and side == "buy"),
+            "id": order["id"],
+        }
+
+    def find_closest(self, order: dict, candidate_ids: set, tolerance: dict = None):
+        """
+        returns id of open order in candidate_ids with same symbol, side and position side as order
+        and price closest to order's, within tolerance of order if given; None if there is none
+        """
+        prices = self.by_price[(order["symbol"], order["position_side"])]
+        i = 0
+        if tolerance is not None:
+            # scan only the price window allowed by tolerance
+            i = bisect_left(prices, (order["price"] * (1.0 - tolerance["price"]),))
+        closest_id, closest_diff = None, float("inf")
+        for price, order_id in prices[i:]:
+            if tolerance is not None and price > order["price"] * (1.0 + tolerance["price"]):
+                break
+            if order_id not in candidate_ids or self.orders[order_id]["side"] != order["side"]:
+                continue
+            if tolerance is not None and not order_within_tolerance(
+                self.normalize(order_id), order, tolerance
+            ):
+                continue
+            if abs(price - order["price"]) < closest_diff:
+                closest_id, closest_diff = order_id, abs(price - order["price"])
+        return closest_id
+
+    def diff(
+        self, symbol: str, ideal_orders: [dict], tolerances: dict = None, amend: bool = False
+    ) -> ([dict], [dict], [(dict, dict)], int):
+        """
+        returns (orders_to_cancel, orders_to_create, orders_to_amend, n_tolerated)
+        same as pure_funcs.diff_orders applied to normalized open orders of symbol,
+        with keys diff_keys
+        """
+        by_key = self.by_key[symbol]
+        n_matched = {}
+        to_create = []
+        for order in ideal_orders:
+            key = tuple(order[k] for k in self.diff_keys)
+            n = n_matched.get(key, 0)
+            if n < len(by_key.get(key, ())):
+                n_matched[key] = n + 1
+            else:
+                to_create.append(order)
+        matched = {order_id for key, n in n_matched.items() for order_id in by_key[key][:n]}
+        unmatched = {order_id for order_id in self.by_symbol[symbol] if order_id not in matched}
+        n_tolerated = 0
+        to_amend = []
+        for pairing in ["tolerance", "amend"]:
+            if not unmatched or not to_create:
+                break
+            if pairing == "tolerance" and tolerances is None:
+                continue
+            if pairing == "amend" and not amend:
+                continue
+            unpaired = []
+            for order in to_create:
+                tolerance = tolerances[calc_order_type(order)] if pairing == "tolerance" else None
+                order_id = self.find_closest(order, unmatched, tolerance)
+                if order_id is None:
+                    unpaired.append(order)
+                    continue
+                unmatched.remove(order_id)
+                if pairing == "tolerance":
+                    n_tolerated += 1
+                else:
+                    to_amend.append((self.normalize(order_id), order))
+            to_create = unpaired
+        to_cancel = [
+            self.normalize(order_id) for order_id in self.by_symbol[symbol] if order_id in unmatched
+        ]
+        return to_cancel, to_create, to_amend, n_tolerated
@@ -23,6 +23,7 @@ from pure_funcs import (
     determine_passivbot_mode,
     get_empty_analysis,
     calc_scores,
+    sum_pruning_stats,
 )
 from procedures import (
     add_argparse_args,
@@ -33,6 +34,7 @@ from procedures import (
     dump_live_config,
     utc_ms,
 )
+from successive_halving import SuccessiveHalving
 from time import sleep, time
 import logging
 import logging.config
@@ -103,6 +105,14 @@ class ParticleSwarmOptimization:
 
         self.iter_counter = 0
 
+        # stats on candidates aborted early by backtest_wrap
+        self.n_pruned = 0
+        self.n_ticks_simulated = 0
+        self.n_ticks_total = 0
+
+        # new positions are scored on short recent windows first; see successive_halving.py
+        self.halving = SuccessiveHalving(config["min_fidelity"], config["fidelity_eta"])
+
     def post_process(self, wi: int):
         # a worker has finished a job; process it
         cfg = deepcopy(self.workers[wi]["config"])
@@ -121,6 +131,10 @@ class ParticleSwarmOptimization:
             )
         if set(results) == set(self.symbols):
             # completed multisymbol iter
+            pruning = sum_pruning_stats(results)
+            self.n_pruned += pruning["pruned"]
+            self.n_ticks_simulated += pruning["n_ticks_simulated"]
+            self.n_ticks_total += pruning["n_ticks_total"]
             scores_res = calc_scores(self.config, results)
             scores, means, raws, keys = (
                 scores_res["scores"],
@@ -131,6 +145,33 @@ class ParticleSwarmOptimization:
 
             self.swarm[swarm_key]["long"]["score"] = scores["long"]
             self.swarm[swarm_key]["short"]["score"] = scores["short"]
+            fidelity = cfg.get("fidelity", 1.0)
+            if fidelity < 1.0:
+                # low fidelity scores are not comparable with lbests and gbest
+                next_fidelity = self.halving.promote(
+                    fidelity,
+                    {side: scores[side] for side in ["long", "short"] if getattr(self, f"do_{side}")},
+                )
+                results["config_no"] = cfg["config_no"]
+                with open(self.results_fpath + "all_results.txt", "a") as f:
+                    f.write(
+                        json.dumps(
+                            {
+                                "config": {"long": cfg["long"], "short": cfg["short"]},
+                                "results": results,
+                                "fidelity": fidelity,
+                            }
+                        )
+                        + "\n"
+                    )
+                if next_fidelity is None:
+                    del self.unfinished_evals[id_key]
+                else:
+                    # promoted; backtest all symbols again on longer window
+                    self.unfinished_evals[id_key]["config"]["fidelity"] = next_fidelity
+                    self.unfinished_evals[id_key]["single_results"] = {}
+                self.workers[wi] = None
+                return
             # check if better than lbest long
             if (
                 type(self.lbests_long[swarm_key]["score"]) == str
@@ -192,12 +233,22 @@ class ParticleSwarmOptimization:
                 }
                 dump_live_config(best_config, tmp_fname + ".json")
             elif cfg["config_no"] % 25 == 0:
-                logging.info(f"i{cfg['config_no']}")
+                line = f"i{cfg['config_no']}"
+                if self.n_pruned:
+                    saved = 1 - self.n_ticks_simulated / max(1, self.n_ticks_total)
+                    line += f" - pruned {self.n_pruned} candidates, {saved:.2%} of ticks skipped"
+                if self.halving.enabled:
+                    line += f" - successive halving: {self.halving.get_summary()}"
+                logging.info(line)
             results["config_no"] = cfg["config_no"]
             with open(self.results_fpath + "all_results.txt", "a") as f:
                 f.write(
                     json.dumps(
-                        {"config": {"long": cfg["long"], "short": cfg["short"]}, "results": results}
+                        {
+                            "config": {"long": cfg["long"], "short": cfg["short"]},
+                            "results": results,
+                            "fidelity": fidelity,
+                        }
                     )
                     + "\n"
                 )
@@ -214,7 +265,11 @@ class ParticleSwarmOptimization:
                 "short": deepcopy(template["short"]),
             },
             **{k: self.config[k] for k in self.config["keys_to_include"]},
-            **{"symbol": self.symbols[0], "config_no": self.iter_counter},
+            **{
+                "symbol": self.symbols[0],
+                "config_no": self.iter_counter,
+                "fidelity": self.halving.min_fidelity,
+            },
         }
         for side in ["long", "short"]:
             new_position[side]["enabled"] = getattr(self, f"do_{side}")
@@ -392,54 +447,56 @@ class ParticleSwarmOptimization:
             for wi in range(len(self.workers)):
                 if self.workers[wi] is not None and self.workers[wi]["task"].ready():
                     self.post_process(wi)
-            if self.iter_counter >= self.iters + self.n_particles:
-                if all(worker is None for worker in self.workers):
+            all_started = self.iter_counter >= self.iters + self.n_particles
+            if all_started and all(worker is None for worker in self.workers):
+                if not self.unfinished_evals:
                     # break when all work is finished
                     break
-            else:
-                # check for idle workers
-                for wi in range(len(self.workers)):
-                    if self.workers[wi] is not None:
-                        continue
-                    # a worker is idle; give it a job
-                    for id_key in self.unfinished_evals:
-                        # check if unfinished evals
-                        missing_symbols = set(self.symbols) - (
-                            set(self.unfinished_evals[id_key]["single_results"])
-                            | self.unfinished_evals[id_key]["in_progress"]
-                        )
-                        if missing_symbols:
-                            # start eval for missing symbol
-                            symbol = sorted(missing_symbols)[0]
-                            config = deepcopy(self.unfinished_evals[id_key]["config"])
-                            config["symbol"] = symbol
-                            config["market_specific_settings"] = self.market_specific_settings[
-                                config["symbol"]
-                            ]
-                            config[
-                                "ticks_cache_fname"
-                            ] = f"{self.bt_dir}/{config['symbol']}/{self.ticks_cache_fname}"
-                            config["passivbot_mode"] = self.config["passivbot_mode"]
-                            self.workers[wi] = {
-                                "config": config,
-                                "task": self.pool.apply_async(
-                                    self.backtest_wrap, args=(config, self.ticks_caches)
-                                ),
-                                "id_key": id_key,
-                            }
-                            self.unfinished_evals[id_key]["in_progress"].add(symbol)
+            # check for idle workers
+            for wi in range(len(self.workers)):
+                if self.workers[wi] is not None:
+                    continue
+                # a worker is idle; give it a job
+                for id_key in self.unfinished_evals:
+                    # check if unfinished evals, including candidates promoted by successive halving
+                    missing_symbols = set(self.symbols) - (
+                        set(self.unfinished_evals[id_key]["single_results"])
+                        | self.unfinished_evals[id_key]["in_progress"]
+                    )
+                    if missing_symbols:
+                        # start eval for missing symbol
+                        symbol = sorted(missing_symbols)[0]
+                        config = deepcopy(self.unfinished_evals[id_key]["config"])
+                        config["symbol"] = symbol
+                        config["market_specific_settings"] = self.market_specific_settings[
+                            config["symbol"]
+                        ]
+                        config[
+                            "ticks_cache_fname"
+                        ] = f"{self.bt_dir}/{config['symbol']}/{self.ticks_cache_fname}"
+                        config["passivbot_mode"] = self.config["passivbot_mode"]
+                        self.workers[wi] = {
+                            "config": config,
+                            "task": self.pool.apply_async(
+                                self.backtest_wrap, args=(config, self.ticks_caches)
+                            ),
+                            "id_key": id_key,
+                        }
+                        self.unfinished_evals[id_key]["in_progress"].add(symbol)
+                        break
+                else:
+                    # means all symbols are accounted for in all unfinished evals; start new eval
+                    if all_started:
+                        break
+                    for swarm_key in self.swarm:
+                        if self.swarm[swarm_key]["long"]["score"] == "not_started":
+                            # means initial evals not yet done
+                            self.start_new_initial_eval(wi, swarm_key)
                             break
                     else:
-                        # means all symbols are accounted for in all unfinished evals; start new eval
-                        for swarm_key in self.swarm:
-                            if self.swarm[swarm_key]["long"]["score"] == "not_started":
-                                # means initial evals not yet done
-                                self.start_new_initial_eval(wi, swarm_key)
-                                break
-                        else:
-                            # means initial evals are done; start new position
-                            self.start_new_particle_position(wi)
-                        sleep(0.0001)
+                        # means initial evals are done; start new position
+                        self.start_new_particle_position(wi)
+                    sleep(0.0001)
 
 
 if __name__ == "__main__":
@@ -8,6 +8,7 @@ import argparse
 import asyncio
 import json
 import signal
+import serialization
 import pprint
 import numpy as np
 import time
@@ -21,9 +22,11 @@ from procedures import (
     print_async_exception,
     utc_ms,
     load_broker_code,
+    write_heartbeat,
 )
 from pure_funcs import (
-    filter_orders,
+    diff_orders,
+    parse_order_tolerances,
     create_xk,
     round_dynamic,
     denumpyize,
@@ -49,6 +52,7 @@ from njit_funcs import (
 from njit_funcs_neat_grid import (
     calc_neat_grid_long,
     calc_neat_grid_short,
+    init_neat_grid_cache,
 )
 from njit_funcs_recursive_grid import (
     calc_recursive_entries_long,
@@ -69,11 +73,16 @@ TEST_MODE_SUPPORTED_EXCHANGES = ["bybit", "binance"]
 
 
 class Bot:
+    # exchanges able to amend open orders in place set this and implement execute_amendments
+    amend_supported = False
+
     def __init__(self, config: dict):
         self.spot = False
         self.config = config
         self.config["max_leverage"] = 25
         self.xk = {}
+        # config may change while running, so live bot does not cache neat grids
+        self.neat_grid_cache = init_neat_grid_cache(0, 0)
 
         self.ws_user = None
         self.ws_market = None
@@ -104,6 +113,10 @@ class Bot:
         }
         self.heartbeat_ts = 0
         self.heartbeat_interval_seconds = 60 * 60
+        # set by manager's supervisor; bot touches file while alive
+        self.heartbeat_filepath = os.environ.get("PASSIVBOT_HEARTBEAT_FILEPATH")
+        self.heartbeat_file_ts = 0.0
+        self.heartbeat_file_task = None
         self.listen_key = None
 
         self.position = {}
@@ -124,6 +137,20 @@ class Bot:
         self.ema_sec = 0
         self.auto_unstuck_on_timer = True
 
+        # market stream messages are folded into latest price state as they arrive;
+        # orders are calculated on latest state at most once per market_stream_interval seconds
+        self.market_stream_updated = asyncio.Event()
+        self.market_stream_n_pending = 0
+        self.market_stream_counters = {"received": 0, "coalesced": 0, "acted": 0}
+        # open orders kept vs replaced when diffing against ideal orders
+        self.order_diff_counters = {
+            "kept": 0,
+            "tolerated": 0,
+            "amended": 0,
+            "cancelled": 0,
+            "created": 0,
+        }
+
         self.n_orders_per_execution = 2
         self.delay_between_executions = 3
         self.force_update_interval = 30
@@ -161,9 +188,12 @@ class Bot:
             ("countdown", False),
             ("countdown_offset", 0),
             ("ohlcv", True),
+            ("market_stream_interval", 0.1),
+            ("order_tolerances", {}),
         ]:
             if k not in config:
                 config[k] = v
+        config["order_tolerances"] = parse_order_tolerances(config["order_tolerances"])
         self.passivbot_mode = config["passivbot_mode"] = determine_passivbot_mode(config)
         if config["cross_wallet_pct"] > 1.0 or config["cross_wallet_pct"] <= 0.0:
             logging.warning(
@@ -477,15 +507,20 @@ class Bot:
             print_async_exception(fills)
             return False
 
-    async def update_fills(self) -> [dict]:
+    async def update_fills(self, from_id: int = None) -> [dict]:
         """
-        fetches recent fills
+        fetches recent fills, or fills since from_id
+        returns fetched fills
         """
         if self.ts_locked["update_fills"] > self.ts_released["update_fills"]:
-            return
+            return []
         self.ts_locked["update_fills"] = time.time()
+        fetched = []
         try:
-            fetched = await self.fetch_fills()
+            if from_id is None:
+                fetched = await self.fetch_fills()
+            else:
+                fetched = await self.fetch_fills(from_id=from_id)
             seen = set()
             updated_fills = []
             for fill in fetched + self.fills:
@@ -500,6 +535,7 @@ class Bot:
             traceback.print_exc()
         finally:
             self.ts_released["update_fills"] = time.time()
+        return fetched
 
     async def create_orders(self, orders_to_create: [dict]) -> [dict]:
         if not orders_to_create:
@@ -528,6 +564,26 @@ class Bot:
         finally:
             self.ts_released["create_orders"] = time.time()
 
+    async def amend_orders(self, orders_to_amend: [(dict, dict)]) -> [(dict, dict)]:
+        # orders_to_amend are [(open_order, ideal_order)]; returns [(open_order, amended_order)]
+        amended = None
+        try:
+            amended = await self.execute_amendments(orders_to_amend)
+            for old, new in amended:
+                logging.info(
+                    f'  amended order {new["symbol"]} {new["side"]: <4} {new["position_side"]: <5} '
+                    + f'{old["qty"]} {old["price"]} -> {new["qty"]} {new["price"]}'
+                )
+                self.open_orders = [
+                    new if oo["order_id"] == old["order_id"] else oo for oo in self.open_orders
+                ]
+            return amended
+        except Exception as e:
+            logging.error(f"error amending orders {e}")
+            print_async_exception(amended)
+            traceback.print_exc()
+            return []
+
     async def cancel_orders(self, orders_to_cancel: [dict]) -> [dict]:
         if not orders_to_cancel:
             return
@@ -662,6 +718,7 @@ class Bot:
                         self.xk["auto_unstuck_ema_dist"][0],
                         self.xk["auto_unstuck_delay_minutes"][0]
                         or self.xk["auto_unstuck_qty_pct"][0],
+                        self.neat_grid_cache,
                     )
                 elif self.passivbot_mode == "clock":
                     entries_long = [
@@ -856,6 +913,7 @@ class Bot:
                         self.xk["auto_unstuck_ema_dist"][1],
                         self.xk["auto_unstuck_delay_minutes"][1]
                         or self.xk["auto_unstuck_qty_pct"][1],
+                        self.neat_grid_cache,
                     )
                 elif self.passivbot_mode == "clock":
                     entries_short = [
@@ -1027,12 +1085,15 @@ class Bot:
                     if calc_diff(o["price"], self.price) < self.price_distance_threshold:
                         # all orders must be closer than x% of current price
                         ideal_orders.append(o)
-            to_cancel_, to_create_ = filter_orders(
+            to_cancel_, to_create_, to_amend_, n_tolerated = diff_orders(
                 self.open_orders,
                 ideal_orders,
                 keys=["side", "position_side", "qty", "price"],
+                tolerances=self.order_tolerances,
+                amend=self.amend_supported,
             )
-            to_cancel, to_create = [], []
+            n_kept = len(self.open_orders) - len(to_cancel_) - len(to_amend_)
+            to_cancel, to_create, to_amend = [], [], []
             for elm in to_cancel_:
                 if elm["position_side"] == "long":
                     if self.long_mode == "tp_only":
@@ -1061,6 +1122,30 @@ class Bot:
                             to_create.append(elm)
                     elif self.short_mode != "manual":
                         to_create.append(elm)
+            for old, elm in to_amend_:
+                if elm["position_side"] == "long":
+                    if self.long_mode == "tp_only":
+                        if elm["side"] == "sell":
+                            to_amend.append((old, elm))
+                    elif self.long_mode != "manual":
+                        to_amend.append((old, elm))
+                if elm["position_side"] == "short":
+                    if self.short_mode == "tp_only":
+                        if elm["side"] == "buy":
+                            to_amend.append((old, elm))
+                    elif self.short_mode != "manual":
+                        to_amend.append((old, elm))
+            if to_cancel or to_create or to_amend:
+                counters = self.order_diff_counters
+                counters["kept"] += n_kept
+                counters["tolerated"] += n_tolerated
+                counters["amended"] += len(to_amend)
+                counters["cancelled"] += len(to_cancel)
+                counters["created"] += len(to_create)
+                logging.info(
+                    f"orders kept: {n_kept} ({n_tolerated} within tolerance), "
+                    + f"amend: {len(to_amend)}, cancel: {len(to_cancel)}, create: {len(to_create)}"
+                )
 
             to_cancel = sorted(
                 to_cancel,
@@ -1086,6 +1171,8 @@ class Bot:
                 await asyncio.sleep(
                     0.1
                 )  # sleep 10 ms between sending cancellations and sending creations
+            if to_amend:
+                results.append(await self.amend_orders(to_amend[: self.max_n_orders_per_batch]))
             if to_create:
                 results.append(await self.create_orders(to_create[: self.max_n_orders_per_batch]))
             return results
@@ -1094,6 +1181,10 @@ class Bot:
             self.ts_released["cancel_and_create"] = time.time()
 
     async def on_market_stream_event(self, ticks: [dict]):
+        self.update_market_state(ticks)
+        await self.act_on_market_state()
+
+    def update_market_state(self, ticks: [dict]):
         if ticks:
             for tick in ticks:
                 if tick["is_buyer_maker"]:
@@ -1103,6 +1194,26 @@ class Bot:
             self.update_emas(ticks[-1]["price"], self.price)
             self.price = ticks[-1]["price"]
 
+    async def consume_market_stream(self):
+        # single consumer of market state; messages arriving while busy are coalesced
+        while not self.stop_websocket:
+            await self.market_stream_updated.wait()
+            self.market_stream_updated.clear()
+            if not self.process_websocket_ticks:
+                self.market_stream_n_pending = 0
+                continue
+            self.market_stream_counters["coalesced"] += max(0, self.market_stream_n_pending - 1)
+            self.market_stream_counters["acted"] += 1
+            self.market_stream_n_pending = 0
+            sts = time.time()
+            try:
+                await self.act_on_market_state()
+            except Exception as e:
+                logging.error(f"error acting on market stream event {e}")
+                traceback.print_exc()
+            await asyncio.sleep(max(0.0, self.market_stream_interval - (time.time() - sts)))
+
+    async def act_on_market_state(self):
         now = time.time()
         if now - self.ts_released["force_update"] > self.force_update_interval:
             self.ts_released["force_update"] = now
@@ -1112,10 +1223,35 @@ class Bot:
             # print heartbeat once an hour
             self.heartbeat_print()
             self.heartbeat_ts = time.time()
+        self.write_heartbeat_file()
         await self.cancel_and_create()
 
+    def write_heartbeat_file(self):
+        if self.heartbeat_filepath is None or time.time() - self.heartbeat_file_ts < 5.0:
+            return
+        try:
+            write_heartbeat(self.heartbeat_filepath)
+            self.heartbeat_file_ts = time.time()
+        except Exception as e:
+            logging.error(f"error writing heartbeat file {e}")
+
+    async def write_heartbeat_file_loop(self):
+        # heartbeat file is written independently of market stream events,
+        # so a quiet market stream does not get a healthy bot restarted
+        while not self.stop_websocket:
+            self.write_heartbeat_file()
+            await asyncio.sleep(5.0)
+
     def heartbeat_print(self):
         logging.info(f"heartbeat {self.symbol}  ")
+        if not self.ohlcv:
+            logging.info(
+                "market stream messages "
+                + " ".join(f"{k}: {v}" for k, v in self.market_stream_counters.items())
+            )
+        logging.info(
+            "open orders " + " ".join(f"{k}: {v}" for k, v in self.order_diff_counters.items())
+        )
         self.log_position_long()
         self.log_position_short()
         liq_price = self.position["long"]["liquidation_price"]
@@ -1291,6 +1427,8 @@ class Bot:
         self.stop_websocket = False
         self.process_websocket_ticks = True
         logging.info("starting websockets...")
+        if self.heartbeat_file_task is None or self.heartbeat_file_task.done():
+            self.heartbeat_file_task = asyncio.create_task(self.write_heartbeat_file_loop())
         self.user_stream_task = asyncio.create_task(self.start_websocket_user_stream())
         self.market_stream_task = asyncio.create_task(self.start_websocket_market_stream())
         await asyncio.gather(self.user_stream_task, self.market_stream_task)
@@ -1325,7 +1463,7 @@ class Bot:
                         break
                     asyncio.create_task(
                         self.on_user_stream_events(
-                            self.standardize_user_stream_event(json.loads(msg))
+                            self.standardize_user_stream_event(serialization.loads(msg))
                         )
                     )
                 except Exception as e:
@@ -1336,29 +1474,36 @@ class Bot:
         await self.init_market_stream()
         k = 1
         asyncio.create_task(self.beat_heart_market_stream())
-        async with websockets.connect(self.endpoints["websocket_market"]) as ws:
-            self.ws_market = ws
-            await self.subscribe_to_market_stream(ws)
-            async for msg in ws:
-                # print('debug market stream', msg)
-                if msg is None or msg == "pong":
-                    continue
-                if "type" in msg and "welcome" in msg or "ack" in msg:
-                    continue
-                try:
-                    if self.stop_websocket:
-                        break
-                    ticks = self.standardize_market_stream_event(json.loads(msg))
-                    if self.process_websocket_ticks:
-                        asyncio.create_task(self.on_market_stream_event(ticks))
-                    if k % 10 == 0:
-                        self.flush_stuck_locks()
-                        k = 1
-                    k += 1
+        consumer_task = asyncio.create_task(self.consume_market_stream())
+        try:
+            async with websockets.connect(self.endpoints["websocket_market"]) as ws:
+                self.ws_market = ws
+                await self.subscribe_to_market_stream(ws)
+                async for msg in ws:
+                    # print('debug market stream', msg)
+                    if msg is None or msg == "pong":
+                        continue
+                    if "type" in msg and "welcome" in msg or "ack" in msg:
+                        continue
+                    try:
+                        if self.stop_websocket:
+                            break
+                        ticks = self.standardize_market_stream_event(serialization.loads(msg))
+                        if self.process_websocket_ticks:
+                            self.market_stream_counters["received"] += 1
+                            self.market_stream_n_pending += 1
+                            self.update_market_state(ticks)
+                            self.market_stream_updated.set()
+                        if k % 10 == 0:
+                            self.flush_stuck_locks()
+                            k = 1
+                        k += 1
 
-                except Exception as e:
-                    if "success" not in msg:
-                        logging.error(f"error in websocket {e} {msg}")
+                    except Exception as e:
+                        if "success" not in msg:
+                            logging.error(f"error in websocket {e} {msg}")
+        finally:
+            consumer_task.cancel()
 
     async def subscribe_to_market_stream(self, ws):
         pass
@@ -1415,6 +1560,7 @@ class Bot:
             for i in range(secs_left, -1, -1):
                 if self.stop_websocket:
                     break
+                self.write_heartbeat_file()
                 if self.countdown:
                     line = f"\rcountdown: {i} last price: {self.price}"
                     line += " | mins delay until next: "
@@ -1739,6 +1885,16 @@ async def main() -> None:
         default=0.5,
         help="only create limit orders closer to price than threshold.  default=0.5 (50%%)",
     )
+    parser.add_argument(
+        "-msi",
+        "--market-stream-interval",
+        "--market_stream_interval",
+        type=float,
+        required=False,
+        dest="market_stream_interval",
+        default=0.1,
+        help="min seconds between order calculations on market stream updates.  default=0.1",
+    )
     parser.add_argument(
         "-ak",
         "--api-keys",
@@ -1860,6 +2016,7 @@ async def main() -> None:
         "symbol",
         "leverage",
         "price_distance_threshold",
+        "market_stream_interval",
         "test_mode",
         "countdown",
         "countdown_offset",
@@ -6,13 +6,20 @@ if "NOJIT" not in os.environ:
 import traceback
 import argparse
 import asyncio
-import json
 import hjson
+import serialization
 import pprint
 import numpy as np
 from uuid import uuid4
 
-from procedures import load_broker_code, load_user_info, utc_ms, make_get_filepath, load_live_config
+from procedures import (
+    load_broker_code,
+    load_user_info,
+    utc_ms,
+    make_get_filepath,
+    load_live_config,
+    write_heartbeat,
+)
 from njit_funcs_recursive_grid import calc_recursive_entries_long, calc_recursive_entries_short
 from njit_funcs import (
     calc_samples,
@@ -30,14 +37,19 @@ from njit_funcs import (
     calc_pnl_long,
     calc_pnl_short,
 )
-from njit_multisymbol import calc_AU_allowance
+from njit_multisymbol import calc_AU_allowance, calc_upnls, find_stuck_position
+from order_book import OpenOrderBook
+from multisymbol_state import MultiSymbolState, state_view, PSIDES
+from replay_log import Recorder
+from snapshot_refresh import SnapshotRefresher
 from pure_funcs import (
     numpyize,
-    filter_orders,
     multi_replace,
     shorten_custom_id,
     determine_side_from_order_tuple,
     str2bool,
+    ts_to_date_utc,
+    parse_order_tolerances,
 )
 
 import logging
@@ -50,13 +62,33 @@ logging.basicConfig(
 
 
 class Passivbot:
+    # per symbol state is kept in arrays in self.state; these are dict views of it by symbol
+    positions = state_view("positions")
+    tickers = state_view("tickers")
+    emas_long = state_view("emas_long")
+    emas_short = state_view("emas_short")
+    alphas_long = state_view("alphas_long")
+    alphas__long = state_view("alphas__long")
+    alphas_short = state_view("alphas_short")
+    alphas__short = state_view("alphas__short")
+    prev_prices = state_view("prev_prices")
+    upnls = state_view("upnls")
+    c_mults = state_view("c_mults")
+    qty_steps = state_view("qty_steps")
+    price_steps = state_view("price_steps")
+    min_qtys = state_view("min_qtys")
+    min_costs = state_view("min_costs")
+    # adapters able to amend open orders in place set this and implement execute_amendments
+    amend_supported = False
+
     def __init__(self, config: dict):
+        self.state = MultiSymbolState()
         self.config = config
         for key, default_val in [("auto_gs", True), ("long_enabled", True), ("short_enabled", True)]:
             if key not in self.config:
                 self.config[key] = default_val
         self.user = config["user"]
-        self.user_info = load_user_info(config["user"])
+        self.user_info = self.get_user_info()
         self.exchange = self.user_info["exchange"]
         self.broker_code = load_broker_code(self.user_info["exchange"])
         self.custom_id_max_length = 36
@@ -72,7 +104,7 @@ class Passivbot:
         }
         self.hedge_mode = True
         self.positions = {}
-        self.open_orders = {}
+        self.open_orders = OpenOrderBook()
         self.pnls = []
         self.tickers = {}
         self.emas_long = {}
@@ -92,6 +124,31 @@ class Passivbot:
         self.recent_fill = False
         self.execution_delay_millis = max(3000.0, self.config["execution_delay_seconds"] * 1000)
         self.force_update_age_millis = 60 * 1000  # force update once a minute
+        self.snapshots = SnapshotRefresher(
+            list(self.upd_timestamps),
+            lambda key: getattr(self, f"update_{key}")(),
+            self.calc_upd_age,
+        )
+        self.snapshots_log_ts = utc_ms()
+        # set by manager's supervisor; bot touches file while alive
+        self.heartbeat_filepath = os.environ.get("PASSIVBOT_HEARTBEAT_FILEPATH")
+        self.heartbeat_file_ts = 0.0
+        # max number of concurrent REST calls when fetching history in windows
+        self.max_n_concurrent_fetches = 4
+        self.start_ts = utc_ms()
+        self.first_order_ts = None
+        # open orders differing from ideal orders by less than tolerances are kept
+        self.order_tolerances = parse_order_tolerances(self.config.get("order_tolerances"))
+        self.order_diff_counters = {
+            "kept": 0,
+            "tolerated": 0,
+            "amended": 0,
+            "cancelled": 0,
+            "created": 0,
+        }
+
+    def get_user_info(self) -> dict:
+        return load_user_info(self.config["user"])
 
     async def init_bot(self):
         max_len_symbol = max([len(s) for s in self.symbols])
@@ -204,8 +261,9 @@ class Passivbot:
                         self.live_configs[symbol][pside][key] = 0.0
 
         for f in ["exchange_config", "emas", "positions", "open_orders", "pnls"]:
+            sts = utc_ms()
             res = await getattr(self, f"update_{f}")()
-            logging.info(f"initiating {f} {res}")
+            logging.info(f"initiating {f} {res} ({(utc_ms() - sts) / 1000:.2f}s)")
         self.set_wallet_exposure_limits()
 
     async def get_active_symbols(self):
@@ -268,14 +326,17 @@ class Passivbot:
 
     def set_wallet_exposure_limits(self):
         # an active bot has normal mode or graceful stop mode with position
-        for pside in ["long", "short"]:
-            n_actives = 0
-            for sym in self.live_configs:
-                if self.live_configs[sym][pside]["mode"] == "normal" or (
-                    self.live_configs[sym][pside]["mode"] == "graceful_stop"
-                    and self.positions[sym][pside]["size"] != 0.0
-                ):
-                    n_actives += 1
+        self.state.sync_live_configs(self.live_configs)
+        for j, pside in enumerate(PSIDES):
+            n_actives = int(
+                (
+                    (self.state.modes[:, j] == "normal")
+                    | (
+                        (self.state.modes[:, j] == "graceful_stop")
+                        & (getattr(self.state, f"poss_{pside}")[:, 0] != 0.0)
+                    )
+                ).sum()
+            )
             if not hasattr(self, "prev_n_actives"):
                 self.prev_n_actives = {"long": 0, "short": 0}
             if self.prev_n_actives[pside] != n_actives:
@@ -298,13 +359,13 @@ class Passivbot:
                 self.live_configs[symbol][pside]["wallet_exposure_limit"] = max(
                     self.live_configs[symbol][pside]["wallet_exposure_limit"], 0.01
                 )
+        self.state.sync_live_configs(self.live_configs)
 
     def add_new_order(self, order, source="WS"):
         try:
             if not order or "id" not in order:
                 return False
-            if order["id"] not in {x["id"] for x in self.open_orders[order["symbol"]]}:
-                self.open_orders[order["symbol"]].append(order)
+            if self.open_orders.add(order):
                 logging.info(
                     f"  created {order['symbol']: <{self.sym_padding}} {order['side']} {order['qty']} {order['position_side']} @ {order['price']} source: {source}"
                 )
@@ -318,10 +379,7 @@ class Passivbot:
         try:
             if not order or "id" not in order:
                 return False
-            if order["id"] in {x["id"] for x in self.open_orders[order["symbol"]]}:
-                self.open_orders[order["symbol"]] = [
-                    x for x in self.open_orders[order["symbol"]] if x["id"] != order["id"]
-                ]
+            if self.open_orders.remove(order["id"]) is not None:
                 logging.info(
                     f"cancelled {order['symbol']: <{self.sym_padding}} {order['side']} {order['qty']} {order['position_side']} @ {order['price']} source: {source}"
                 )
@@ -379,29 +437,50 @@ class Passivbot:
 
     def calc_upnl_sum(self):
         try:
-            self.upnls = {}
-            for sym in self.positions:
-                self.upnls[sym] = (
-                    calc_pnl_long(
-                        self.positions[sym]["long"]["price"],
-                        self.tickers[sym]["last"],
-                        self.positions[sym]["long"]["size"],
-                        self.inverse,
-                        self.c_mults[sym],
-                    )
-                ) + calc_pnl_short(
-                    self.positions[sym]["short"]["price"],
-                    self.tickers[sym]["last"],
-                    self.positions[sym]["short"]["size"],
-                    self.inverse,
-                    self.c_mults[sym],
-                )
-            return sum(self.upnls.values())
+            self.state.upnls = calc_upnls(
+                self.state.poss_long,
+                self.state.poss_short,
+                self.state.tickers[:, 2],
+                self.state.c_mults,
+            )
+            return float(self.state.upnls.sum())
         except Exception as e:
             logging.error(f"error calculating upnl sum {e}")
             traceback.print_exc()
             return 0.0
 
+    async def fetch_windowed(self, fetch_window, start_time: int, end_time: int, window_millis: int):
+        # splits [start_time, end_time] into windows of at most window_millis and fetches them
+        # concurrently; fetch_window(start_time, end_time) returns [dict] with "id" and "timestamp"
+        # returns items deduplicated by id sorted by timestamp, or False if any window failed
+        windows = []
+        ets = end_time
+        while True:
+            sts = max(start_time, ets - window_millis)
+            windows.append((sts, ets))
+            if sts <= start_time:
+                break
+            ets = sts
+        semaphore = asyncio.Semaphore(self.max_n_concurrent_fetches)
+
+        async def fetch(sts, ets):
+            # ccxt's rate limiter throttles the calls themselves
+            async with semaphore:
+                return await fetch_window(sts, ets)
+
+        if len(windows) > 1:
+            logging.info(
+                f"fetching history {ts_to_date_utc(start_time)[:19]} - "
+                + f"{ts_to_date_utc(end_time)[:19]} in {len(windows)} windows"
+            )
+        res = await asyncio.gather(*[fetch(sts, ets) for sts, ets in windows])
+        if any(x is None or x is False for x in res):
+            return False
+        return sorted(
+            {elm["id"]: elm for fetched in res for elm in fetched}.values(),
+            key=lambda x: x["timestamp"],
+        )
+
     async def update_pnls(self):
         # fetch latest pnls
         # dump new pnls to cache
@@ -412,7 +491,7 @@ class Passivbot:
             pnls_cache = []
             try:
                 if os.path.exists(self.pnls_cache_filepath):
-                    pnls_cache = json.load(open(self.pnls_cache_filepath))
+                    pnls_cache = serialization.load(self.pnls_cache_filepath)
             except Exception as e:
                 logging.error(f"error loading {self.pnls_cache_filepath} {e}")
             # fetch pnls since latest timestamp
@@ -450,7 +529,7 @@ class Passivbot:
                     f"{len(new_pnls)} new pnl{'s' if len(new_pnls) > 1 else ''} {new_income} {self.quote}"
                 )
             try:
-                json.dump(self.pnls, open(self.pnls_cache_filepath, "w"))
+                serialization.dump(self.pnls, self.pnls_cache_filepath)
             except Exception as e:
                 logging.error(f"error dumping pnls to {self.pnls_cache_filepath} {e}")
         self.upd_timestamps["pnls"] = utc_ms()
@@ -460,26 +539,16 @@ class Passivbot:
         res = await self.fetch_open_orders()
         if res in [None, False]:
             return False
-        open_orders = res
-        oo_ids_old = {elm["id"] for sublist in self.open_orders.values() for elm in sublist}
+        open_orders = []
         created_prints, cancelled_prints = [], []
-        for oo in open_orders:
-            if oo["id"] not in oo_ids_old:
-                # there was a new open order not caught by websocket
-                created_prints.append(
-                    f"new order {oo['symbol']: <{self.sym_padding}} {oo['side']} {oo['qty']} {oo['position_side']} @ {oo['price']} source: REST"
-                )
-        oo_ids_new = {elm["id"] for elm in open_orders}
-        for oo in [elm for sublist in self.open_orders.values() for elm in sublist]:
-            if oo["id"] not in oo_ids_new:
-                # there was an order cancellation not caught by websocket
-                cancelled_prints.append(
-                    f"cancelled {oo['symbol']: <{self.sym_padding}} {oo['side']} {oo['qty']} {oo['position_side']} @ {oo['price']} source: REST"
-                )
-        self.open_orders = {symbol: [] for symbol in self.open_orders}
-        for elm in open_orders:
+        for elm in res:
             if elm["symbol"] in self.open_orders:
-                self.open_orders[elm["symbol"]].append(elm)
+                open_orders.append(elm)
+                if not self.open_orders.has(elm["id"]):
+                    # there was a new open order not caught by websocket
+                    created_prints.append(
+                        f"new order {elm['symbol']: <{self.sym_padding}} {elm['side']} {elm['qty']} {elm['position_side']} @ {elm['price']} source: REST"
+                    )
             else:
                 logging.debug(
                     f"{elm['symbol']: <{self.sym_padding}} has open order {elm['position_side']} {elm['id']}, but is not under passivbot management"
@@ -487,6 +556,12 @@ class Passivbot:
                 logging.info(
                     f"debug {elm['symbol']: <{self.sym_padding}} has open order {elm['position_side']} {elm['id']}, but is not under passivbot management"
                 )
+        _, removed = self.open_orders.replace(open_orders)
+        for oo in removed:
+            # there was an order cancellation not caught by websocket
+            cancelled_prints.append(
+                f"cancelled {oo['symbol']: <{self.sym_padding}} {oo['side']} {oo['qty']} {oo['position_side']} @ {oo['price']} source: REST"
+            )
         if len(created_prints) > 12:
             logging.info(f"{len(created_prints)} new open orders")
         else:
@@ -603,35 +678,19 @@ class Passivbot:
         now_minute = int(utc_ms() // (1000 * 60) * (1000 * 60))
         if now_minute <= self.ema_minute:
             return True
+        # all symbols at once, rows of state arrays
+        state = self.state
         while self.ema_minute < int(round(now_minute - 1000 * 60)):
-            for symbol in self.symbols:
-                self.emas_long[symbol] = calc_ema(
-                    self.alphas_long[symbol],
-                    self.alphas__long[symbol],
-                    self.emas_long[symbol],
-                    self.prev_prices[symbol],
-                )
-                self.emas_short[symbol] = calc_ema(
-                    self.alphas_short[symbol],
-                    self.alphas__short[symbol],
-                    self.emas_short[symbol],
-                    self.prev_prices[symbol],
-                )
-            self.ema_minute += 1000 * 60
-        for symbol in self.symbols:
-            self.emas_long[symbol] = calc_ema(
-                self.alphas_long[symbol],
-                self.alphas__long[symbol],
-                self.emas_long[symbol],
-                self.tickers[symbol]["last"],
-            )
-            self.emas_short[symbol] = calc_ema(
-                self.alphas_short[symbol],
-                self.alphas__short[symbol],
-                self.emas_short[symbol],
-                self.tickers[symbol]["last"],
+            prices = state.prev_prices[:, None]
+            state.emas_long = calc_ema(state.alphas_long, state.alphas__long, state.emas_long, prices)
+            state.emas_short = calc_ema(
+                state.alphas_short, state.alphas__short, state.emas_short, prices
             )
-            self.prev_prices[symbol] = self.tickers[symbol]["last"]
+            self.ema_minute += 1000 * 60
+        prices = state.tickers[:, 2:3]
+        state.emas_long = calc_ema(state.alphas_long, state.alphas__long, state.emas_long, prices)
+        state.emas_short = calc_ema(state.alphas_short, state.alphas__short, state.emas_short, prices)
+        state.prev_prices = state.tickers[:, 2].copy()
 
         self.ema_minute = now_minute
         return True
@@ -700,43 +759,22 @@ class Passivbot:
 
     def calc_ideal_orders(self):
         unstuck_close_order = None
-        stuck_positions = []
-        for symbol in self.symbols:
-            # check for stuck position
-            if self.config["loss_allowance_pct"] == 0.0:
-                # no auto unstuck
-                break
-            for pside in ["long", "short"]:
-                if self.live_configs[symbol][pside]["mode"] in ["manual", "panic", "tp_only"]:
-                    # no auto unstuck in these modes
-                    continue
-                if self.live_configs[symbol][pside]["wallet_exposure_limit"] == 0.0:
-                    continue
-                wallet_exposure = (
-                    qty_to_cost(
-                        self.positions[symbol][pside]["size"],
-                        self.positions[symbol][pside]["price"],
-                        self.inverse,
-                        self.c_mults[symbol],
-                    )
-                    / self.balance
-                )
-                if (
-                    wallet_exposure / self.live_configs[symbol][pside]["wallet_exposure_limit"]
-                    > self.config["stuck_threshold"]
-                ):
-                    pprice_diff = (
-                        1.0 - self.tickers[symbol]["last"] / self.positions[symbol]["long"]["price"]
-                        if pside == "long"
-                        else self.tickers[symbol]["last"] / self.positions[symbol]["short"]["price"]
-                        - 1.0
-                    )
-                    if pprice_diff > 0.0:
-                        # don't unstuck if position is in profit
-                        stuck_positions.append((symbol, pside, pprice_diff))
-        if stuck_positions:
-            # logging.info(f"debug unstucking {sorted(stuck_positions, key=lambda x: x[2])}")
-            sym, pside, pprice_diff = sorted(stuck_positions, key=lambda x: x[2])[0]
+        stuck_i = -1
+        if self.config["loss_allowance_pct"] != 0.0:
+            # find stuck position closest to being in profit
+            # no auto unstuck in manual, panic and tp_only modes
+            stuck_i, stuck_j, pprice_diff = find_stuck_position(
+                self.state.poss_long,
+                self.state.poss_short,
+                self.state.tickers[:, 2],
+                self.state.c_mults,
+                self.state.WE_limits,
+                self.state.AU_eligible,
+                self.balance,
+                self.config["stuck_threshold"],
+            )
+        if stuck_i >= 0:
+            sym, pside = self.state.symbols[stuck_i], PSIDES[stuck_j]
             AU_allowance = (
                 calc_AU_allowance(
                     np.array([x["pnl"] for x in self.pnls]),
@@ -1039,31 +1077,21 @@ class Passivbot:
 
     def calc_orders_to_cancel_and_create(self):
         ideal_orders = self.calc_ideal_orders()
-        actual_orders = {}
+        to_cancel, to_create, to_amend = [], [], []
+        n_kept, n_tolerated = 0, 0
         for symbol in self.open_orders:
-            actual_orders[symbol] = []
-            for x in self.open_orders[symbol]:
-                actual_orders[symbol].append(
-                    {
-                        "symbol": x["symbol"],
-                        "side": x["side"],
-                        "position_side": x["position_side"],
-                        "qty": abs(x["amount"]),
-                        "price": x["price"],
-                        "reduce_only": (x["position_side"] == "long" and x["side"] == "sell")
-                        or (x["position_side"] == "short" and x["side"] == "buy"),
-                        "id": x["id"],
-                    }
-                )
-        keys = ("symbol", "side", "position_side", "qty", "price")
-        to_cancel, to_create = [], []
-        for symbol in actual_orders:
-            to_cancel_, to_create_ = filter_orders(actual_orders[symbol], ideal_orders[symbol], keys)
+            # only open orders not matching ideal orders are copied
+            to_cancel_, to_create_, to_amend_, n_tolerated_ = self.open_orders.diff(
+                symbol, ideal_orders[symbol], self.order_tolerances, self.amend_supported
+            )
+            n_kept += len(self.open_orders.by_symbol[symbol]) - len(to_cancel_) - len(to_amend_)
+            n_tolerated += n_tolerated_
             for pside in ["long", "short"]:
                 if self.live_configs[symbol][pside]["mode"] == "manual":
                     # neither create nor cancel orders
                     to_cancel_ = [x for x in to_cancel_ if x["position_side"] != pside]
                     to_create_ = [x for x in to_create_ if x["position_side"] != pside]
+                    to_amend_ = [x for x in to_amend_ if x[1]["position_side"] != pside]
                 elif self.live_configs[symbol][pside]["mode"] == "tp_only":
                     # if take profit only mode, remove same pside entry orders
                     to_cancel_ = [
@@ -1082,32 +1110,84 @@ class Passivbot:
                             or (x["position_side"] == pside and x["reduce_only"])
                         )
                     ]
+                    to_amend_ = [
+                        x
+                        for x in to_amend_
+                        if (
+                            x[1]["position_side"] != pside
+                            or (x[1]["position_side"] == pside and x[1]["reduce_only"])
+                        )
+                    ]
             to_cancel += to_cancel_
             to_create += to_create_
-        return sorted(
-            to_cancel, key=lambda x: calc_diff(x["price"], self.tickers[x["symbol"]]["last"])
-        ), sorted(to_create, key=lambda x: calc_diff(x["price"], self.tickers[x["symbol"]]["last"]))
+            to_amend += to_amend_
+        if to_cancel or to_create or to_amend:
+            self.log_order_diff(n_kept, n_tolerated, to_cancel, to_create, to_amend)
+        return (
+            sorted(
+                to_cancel, key=lambda x: calc_diff(x["price"], self.tickers[x["symbol"]]["last"])
+            ),
+            sorted(
+                to_create, key=lambda x: calc_diff(x["price"], self.tickers[x["symbol"]]["last"])
+            ),
+            sorted(
+                to_amend,
+                key=lambda x: calc_diff(x[1]["price"], self.tickers[x[1]["symbol"]]["last"]),
+            ),
+        )
+
+    def log_order_diff(self, n_kept, n_tolerated, to_cancel, to_create, to_amend):
+        # orders kept vs replaced this cycle, and totals since start
+        counters = self.order_diff_counters
+        counters["kept"] += n_kept
+        counters["tolerated"] += n_tolerated
+        counters["amended"] += len(to_amend)
+        counters["cancelled"] += len(to_cancel)
+        counters["created"] += len(to_create)
+        logging.info(
+            f"orders kept: {n_kept} ({n_tolerated} within tolerance), amend: {len(to_amend)}, "
+            + f"cancel: {len(to_cancel)}, create: {len(to_create)}; totals {counters}"
+        )
+
+    def calc_upd_age(self, key: str) -> float:
+        # millis since least recently updated symbol of key was updated, by REST or websocket
+        if isinstance(self.upd_timestamps[key], dict):
+            return utc_ms() - min(self.upd_timestamps[key].values(), default=0.0)
+        return utc_ms() - self.upd_timestamps[key]
 
     async def force_update(self):
         # if some information has not been updated in a while, force update via REST
-        coros_to_call = []
-        now = utc_ms()
-        for key in self.upd_timestamps:
-            if isinstance(self.upd_timestamps[key], dict):
-                for sym in self.upd_timestamps[key]:
-                    if now - self.upd_timestamps[key][sym] > self.force_update_age_millis:
-                        # logging.info(f"forcing update {key} {sym}")
-                        coros_to_call.append((key, getattr(self, f"update_{key}")()))
-                        break
-            else:
-                if now - self.upd_timestamps[key] > self.force_update_age_millis:
-                    # logging.info(f"forcing update {key}")
-                    coros_to_call.append((key, getattr(self, f"update_{key}")()))
-        if any(coros_to_call):
+        keys = [
+            key
+            for key in self.upd_timestamps
+            if self.calc_upd_age(key) > self.force_update_age_millis
+        ]
+        if keys:
             self.set_wallet_exposure_limits()
-        res = await asyncio.gather(*[x[1] for x in coros_to_call])
+        res = await asyncio.gather(
+            *[self.snapshots.refresh(key, self.force_update_age_millis) for key in keys]
+        )
+        if utc_ms() - self.snapshots_log_ts > 1000 * 60 * 60:
+            logging.info(f"REST refreshes {self.snapshots.format_counters()}")
+            self.snapshots_log_ts = utc_ms()
         return res
 
+    def reconcile_open_orders(self, requested: [dict], executed: [dict]):
+        # open orders were updated from execution responses; symbols with requested orders
+        # missing from responses, failed or deferred, are refreshed via REST next cycle
+        n_requested, n_executed = {}, {}
+        for order in requested:
+            n_requested[order["symbol"]] = n_requested.get(order["symbol"], 0) + 1
+        for order in executed:
+            n_executed[order["symbol"]] = n_executed.get(order["symbol"], 0) + 1
+        now = utc_ms()
+        for symbol in n_requested:
+            if n_executed.get(symbol, 0) < n_requested[symbol]:
+                self.upd_timestamps["open_orders"][symbol] = 0.0
+            else:
+                self.upd_timestamps["open_orders"][symbol] = now
+        self.snapshots.count_reconciled(["open_orders", "positions"])
+
     async def execute_to_exchange(self):
         # cancels wrong orders and creates missing orders
         # check whether to call any self.update_*()
@@ -1125,11 +1205,9 @@ class Passivbot:
             update_res = await self.force_update()
             if not all(update_res):
                 print("debug", update_res)
-                for i, key in enumerate(self.upd_timestamps):
-                    if not update_res[i]:
-                        logging.error(f"error with {key}")
+                logging.error(f"error with REST refresh {update_res}")
                 return
-            to_cancel, to_create = self.calc_orders_to_cancel_and_create()
+            to_cancel, to_create, to_amend = self.calc_orders_to_cancel_and_create()
 
             # debug duplicates
             seen = set()
@@ -1142,20 +1220,47 @@ class Passivbot:
             # format custom_id
             to_create = self.format_custom_ids(to_create)
 
-            res = await self.execute_cancellations(to_cancel)
-            for elm in res:
+            cancelled = [x for x in await self.execute_cancellations(to_cancel) if x]
+            for elm in cancelled:
                 self.remove_cancelled_order(elm, source="POST")
-            res = await self.execute_orders(to_create)
-            for elm in res:
+            amended = await self.execute_amendments(to_amend) if to_amend else []
+            for old, new in amended:
+                self.amend_order(old, new)
+            created = [x for x in await self.execute_orders(to_create) if x]
+            for elm in created:
                 self.add_new_order(elm, source="POST")
-            if to_cancel or to_create:
-                await asyncio.gather(self.update_open_orders(), self.update_positions())
+            if created and self.first_order_ts is None:
+                self.first_order_ts = utc_ms()
+                logging.info(
+                    f"time to first order: {(self.first_order_ts - self.start_ts) / 1000:.2f}s"
+                )
+            if to_cancel or to_create or to_amend:
+                # instead of refreshing open orders and positions via REST;
+                # positions change only on fills, which websocket reports as recent_fill
+                self.reconcile_open_orders(
+                    to_cancel + to_create + [x[1] for x in to_amend],
+                    cancelled + created + [x[1] for x in amended],
+                )
         except Exception as e:
             logging.error(f"error executing to exchange {e}")
             traceback.print_exc()
         finally:
             self.previous_execution_ts = utc_ms()
 
+    async def execute_amendments(self, amendments: [(dict, dict)]) -> [(dict, dict)]:
+        # amendments are [(open_order, ideal_order)]; returns [(open_order, amended_order)]
+        return []
+
+    def amend_order(self, old: dict, new: dict):
+        try:
+            if self.open_orders.remove(old["id"]) is not None and self.open_orders.add(new):
+                logging.info(
+                    f"  amended {new['symbol']: <{self.sym_padding}} {new['side']} {new['position_side']} {old['qty']} @ {old['price']} -> {new['qty']} @ {new['price']}"
+                )
+        except Exception as e:
+            logging.error(f"failed to amend order in self.open_orders {old} {new} {e}")
+            traceback.print_exc()
+
     def format_custom_ids(self, orders: [dict]) -> [dict]:
         new_orders = []
         for order in orders:
@@ -1169,11 +1274,24 @@ class Passivbot:
         while True:
             if self.stop_websocket:
                 break
-            await self.update_emas()
-            if utc_ms() - self.execution_delay_millis > self.previous_execution_ts:
-                await self.execute_to_exchange()
+            await self.execution_step()
             await asyncio.sleep(1.0)
 
+    async def execution_step(self):
+        await self.update_emas()
+        if utc_ms() - self.execution_delay_millis > self.previous_execution_ts:
+            await self.execute_to_exchange()
+        self.write_heartbeat_file()
+
+    def write_heartbeat_file(self):
+        if self.heartbeat_filepath is None or utc_ms() - self.heartbeat_file_ts < 5000.0:
+            return
+        try:
+            write_heartbeat(self.heartbeat_filepath)
+            self.heartbeat_file_ts = utc_ms()
+        except Exception as e:
+            logging.error(f"error writing heartbeat file {e}")
+
     async def start_bot(self):
         await self.init_bot()
         logging.info("done initiating bot")
@@ -1209,6 +1327,15 @@ async def main():
             default=None,
             help=f"specify {k1}{h}, overriding value from live hjson config.",
         )
+    parser.add_argument(
+        "-rec",
+        "--record",
+        type=str,
+        required=False,
+        dest="record_path",
+        default=None,
+        help="record websocket updates and REST responses to gzipped log for tools/replay_multi.py",
+    )
     max_n_restarts_per_day = 5
     cooldown_secs = 60
     restarts = []
@@ -1248,6 +1375,7 @@ async def main():
             bot = BingXBot(config)
         else:
             raise Exception(f"unknown exchange {user_info['exchange']}")
+        recorder = Recorder(args.record_path).attach(bot) if args.record_path else None
         try:
             await bot.start_bot()
         except Exception as e:
@@ -1259,6 +1387,12 @@ async def main():
                 await bot.cca.close()
             except:
                 pass
+            if recorder is not None:
+                recorder.close()
+        if os.environ.get("PASSIVBOT_HEARTBEAT_FILEPATH"):
+            # supervised by manager, which restarts with backoff
+            logging.info(f"exiting, supervisor will restart bot...")
+            break
         logging.info(f"restarting bot...")
         print()
         for z in range(cooldown_secs, -1, -1):
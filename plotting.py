@@ -7,10 +7,11 @@ import pandas as pd
 import numpy as np
 import time
 from colorama import init, Fore
+from multiprocessing import Pool
 from prettytable import PrettyTable
 
 from njit_funcs import round_up, calc_pnl_long, calc_pnl_short
-from procedures import dump_live_config, make_get_filepath
+from procedures import dump_live_config, make_get_filepath, dump_columnar, load_columnar
 from pure_funcs import round_dynamic, denumpyize, ts_to_date
 
 
@@ -150,6 +151,104 @@ def make_table(result_):
     return table
 
 
+def calc_minmax_idxs(xs: np.ndarray, n_buckets: int) -> np.ndarray:
+    """
+    splits xs into n_buckets buckets and returns sorted indices of min and max of each bucket
+    plotting xs[idxs] looks the same as plotting xs when the plot is n_buckets pixels wide
+    """
+    if len(xs) <= n_buckets * 2:
+        return np.arange(len(xs))
+    bucket_size = len(xs) // n_buckets
+    n = bucket_size * n_buckets
+    buckets = xs[:n].reshape(n_buckets, bucket_size)
+    offsets = np.arange(n_buckets) * bucket_size
+    idxs = [offsets + buckets.argmin(axis=1), offsets + buckets.argmax(axis=1), [0, len(xs) - 1]]
+    if n < len(xs):
+        idxs.append([n + xs[n:].argmin(), n + xs[n:].argmax()])
+    return np.unique(np.concatenate(idxs))
+
+
+def decimate_df(df: pd.DataFrame, column: str = "price", n_buckets: int = None) -> pd.DataFrame:
+    """
+    keeps rows with min and max of column per pixel bucket
+    n_buckets defaults to figure width in pixels
+    """
+    if n_buckets is None:
+        n_buckets = int(plt.rcParams["figure.figsize"][0] * plt.rcParams["figure.dpi"])
+    return df.iloc[calc_minmax_idxs(df[column].values, n_buckets)]
+
+
+def render_fills_plot(df, fdf, title: str, fpath: str, plot_whole_df: bool = False):
+    # runs in worker process; headless
+    plt.switch_backend("Agg")
+    plt.rcParams["figure.figsize"] = [29, 18]
+    fig = plot_fills(df, fdf, plot_whole_df=plot_whole_df, title=title)
+    if fig is None:
+        return None
+    fig.savefig(fpath)
+    plt.close("all")
+    return fpath
+
+
+def render_lines_plot(df, title: str, fpath: str, xlabel: str = "Time", ylabel: str = ""):
+    # runs in worker process; headless
+    plt.switch_backend("Agg")
+    plt.rcParams["figure.figsize"] = [29, 18]
+    plt.clf()
+    df.plot(title=title, xlabel=xlabel, ylabel=ylabel)
+    plt.savefig(fpath)
+    plt.close("all")
+    return fpath
+
+
+def add_ema_bands(result: dict, df: pd.DataFrame, side: str) -> pd.DataFrame:
+    """
+    adds clock mode columns ema_band_lower_{side} and ema_band_upper_{side}
+    emas span minutes of the full price series, so bands must be added before decimating
+    """
+    spans = sorted(
+        [
+            result[side]["ema_span_0"],
+            (result[side]["ema_span_0"] * result[side]["ema_span_1"]) ** 0.5,
+            result[side]["ema_span_1"],
+        ]
+    )
+    emas = pd.DataFrame(
+        {f"ema_{span}": df.price.ewm(span=span, adjust=False).mean() for span in spans},
+        index=df.index,
+    )
+    ema_dist_lower = result[side]["ema_dist_entry" if side == "long" else "ema_dist_close"]
+    ema_dist_upper = result[side]["ema_dist_entry" if side == "short" else "ema_dist_close"]
+    if abs(ema_dist_lower) < 0.1:
+        df = df.join(
+            pd.DataFrame(
+                {f"ema_band_lower_{side}": emas.min(axis=1) * (1 - ema_dist_lower)},
+                index=df.index,
+            )
+        )
+    if abs(ema_dist_upper) < 0.1:
+        df = df.join(
+            pd.DataFrame(
+                {f"ema_band_upper_{side}": emas.max(axis=1) * (1 + ema_dist_upper)},
+                index=df.index,
+            )
+        )
+    return df
+
+
+def select_ema_bands(df: pd.DataFrame, side: str) -> pd.DataFrame:
+    # plot_fills draws columns ema_band_lower and ema_band_upper
+    other = "short" if side == "long" else "long"
+    return df.drop(
+        columns=[f"ema_band_lower_{other}", f"ema_band_upper_{other}"], errors="ignore"
+    ).rename(
+        columns={
+            f"ema_band_lower_{side}": "ema_band_lower",
+            f"ema_band_upper_{side}": "ema_band_upper",
+        }
+    )
+
+
 def dump_plots(
     result: dict,
     longs: pd.DataFrame,
@@ -158,7 +257,14 @@ def dump_plots(
     df: pd.DataFrame,
     n_parts: int = None,
     disable_plotting: bool = False,
+    defer_plotting: bool = False,
+    file_format: str = "csv",
 ):
+    """
+    file_format: "csv" or "npz" (compressed columnar, see procedures.dump_columnar)
+    defer_plotting: dump data needed for plots and return; render later with
+        python3 plotting.py {plots_dirpath}
+    """
     init(autoreset=True)
     plt.rcParams["figure.figsize"] = [29, 18]
     try:
@@ -172,9 +278,14 @@ def dump_plots(
     # sdf = sdf.set_index(pd.to_datetime(pd.to_datetime(sdf.timestamp * 1000 * 1000)))
     # longs = longs.set_index(pd.to_datetime(pd.to_datetime(sdf.timestamp * 1000 * 1000)))
     # shorts = shorts.set_index(pd.to_datetime(pd.to_datetime(sdf.timestamp * 1000 * 1000)))
-    longs.to_csv(result["plots_dirpath"] + "fills_long.csv")
-    shorts.to_csv(result["plots_dirpath"] + "fills_short.csv")
-    sdf.to_csv(result["plots_dirpath"] + "stats.csv")
+    if file_format == "npz":
+        dump_columnar(longs, result["plots_dirpath"] + "fills_long.npz")
+        dump_columnar(shorts, result["plots_dirpath"] + "fills_short.npz")
+        dump_columnar(sdf, result["plots_dirpath"] + "stats.npz")
+    else:
+        longs.to_csv(result["plots_dirpath"] + "fills_long.csv")
+        shorts.to_csv(result["plots_dirpath"] + "fills_short.csv")
+        sdf.to_csv(result["plots_dirpath"] + "stats.csv")
     table = make_table(result)
 
     dump_live_config(result, result["plots_dirpath"] + "live_config.json")
@@ -191,81 +302,107 @@ def dump_plots(
     n_parts = (
         n_parts if n_parts is not None else min(12, max(3, int(round_up(result["n_days"] / 14, 1.0))))
     )
+    if result["passivbot_mode"] == "clock":
+        for side in ["long", "short"]:
+            if result[side]["enabled"]:
+                df = add_ema_bands(result, df, side)
+    if defer_plotting:
+        # keep enough price resolution for n_parts plots
+        n_buckets = int(plt.rcParams["figure.figsize"][0] * plt.rcParams["figure.dpi"]) * n_parts
+        dump_columnar(decimate_df(df, n_buckets=n_buckets), result["plots_dirpath"] + "prices.npz")
+        if file_format != "npz":
+            dump_columnar(longs, result["plots_dirpath"] + "fills_long.npz")
+            dump_columnar(shorts, result["plots_dirpath"] + "fills_short.npz")
+            dump_columnar(sdf, result["plots_dirpath"] + "stats.npz")
+        json.dump({"n_parts": n_parts}, open(result["plots_dirpath"] + "deferred_plots.json", "w"))
+        print(f"plotting deferred; render with: python3 plotting.py {result['plots_dirpath']}")
+        return
+    render_plots(result, longs, shorts, sdf, df, n_parts)
+
+
+def render_plots(
+    result: dict,
+    longs: pd.DataFrame,
+    shorts: pd.DataFrame,
+    sdf: pd.DataFrame,
+    df: pd.DataFrame,
+    n_parts: int,
+    n_cpus: int = None,
+):
+    """
+    renders plots into result["plots_dirpath"] in a process pool with headless backend
+    price series are decimated to min/max per pixel bucket before plotting
+    clock mode ema bands are expected in df, see add_ema_bands
+    """
+    jobs = []
     for side, fdf in [("long", longs), ("short", shorts)]:
-        if result[side]["enabled"]:
-            plt.clf()
-            fig = plot_fills(df, fdf, plot_whole_df=True, title=f"Overview Fills {side.capitalize()}")
-            if not fig:
-                continue
-            fig.savefig(f"{result['plots_dirpath']}whole_backtest_{side}.png")
-            print(f"\nplotting balance and equity {side} {result['plots_dirpath']}...")
-            plt.clf()
-            sdf[f"balance_{side}"].plot()
-            sdf[f"equity_{side}"].plot(
-                title=f"Balance and equity {side.capitalize()}", xlabel="Time", ylabel="Balance"
+        if not result[side]["enabled"] or fdf.empty:
+            continue
+        dfs = select_ema_bands(df, side)
+        jobs.append(
+            (
+                render_fills_plot,
+                (
+                    decimate_df(dfs),
+                    fdf,
+                    f"Overview Fills {side.capitalize()}",
+                    f"{result['plots_dirpath']}whole_backtest_{side}.png",
+                    True,
+                ),
             )
-            plt.savefig(f"{result['plots_dirpath']}balance_and_equity_sampled_{side}.png")
-
-            if result["passivbot_mode"] == "clock":
-                spans = sorted(
-                    [
-                        result[side]["ema_span_0"],
-                        (result[side]["ema_span_0"] * result[side]["ema_span_1"]) ** 0.5,
-                        result[side]["ema_span_1"],
-                    ]
-                )
-                emas = pd.DataFrame(
-                    {f"ema_{span}": df.price.ewm(span=span, adjust=False).mean() for span in spans},
-                    index=df.index,
-                )
-                ema_dist_lower = result[side][
-                    "ema_dist_entry" if side == "long" else "ema_dist_close"
-                ]
-                ema_dist_upper = result[side][
-                    "ema_dist_entry" if side == "short" else "ema_dist_close"
-                ]
-                if abs(ema_dist_lower) < 0.1:
-                    df = df.join(
-                        pd.DataFrame(
-                            {"ema_band_lower": emas.min(axis=1) * (1 - ema_dist_lower)},
-                            index=df.index,
-                        )
-                    )
-                if abs(ema_dist_upper) < 0.1:
-                    df = df.join(
-                        pd.DataFrame(
-                            {"ema_band_upper": emas.max(axis=1) * (1 + ema_dist_upper)},
-                            index=df.index,
-                        )
-                    )
-            for z in range(n_parts):
-                start_ = z / n_parts
-                end_ = (z + 1) / n_parts
-                print(f"{side} {z} of {n_parts} {start_ * 100:.2f}% to {end_ * 100:.2f}%")
-                fig = plot_fills(
-                    df,
-                    fdf.iloc[int(len(fdf) * start_) : int(len(fdf) * end_)],
-                    title=f"Fills {side} {z+1} of {n_parts}",
+        )
+        jobs.append(
+            (
+                render_lines_plot,
+                (
+                    sdf[[f"balance_{side}", f"equity_{side}"]],
+                    f"Balance and equity {side.capitalize()}",
+                    f"{result['plots_dirpath']}balance_and_equity_sampled_{side}.png",
+                    "Time",
+                    "Balance",
+                ),
+            )
+        )
+        for z in range(n_parts):
+            fdfc = fdf.iloc[int(len(fdf) * z / n_parts) : int(len(fdf) * (z + 1) / n_parts)]
+            if fdfc.empty:
+                print(f"no {side} fills...")
+                continue
+            ts_start, ts_end = fdfc.timestamp.iloc[0], fdfc.timestamp.iloc[-1]
+            dfc = dfs[(dfs.timestamp >= ts_start) & (dfs.timestamp <= ts_end)]
+            jobs.append(
+                (
+                    render_fills_plot,
+                    (
+                        decimate_df(dfc),
+                        fdfc,
+                        f"Fills {side} {z+1} of {n_parts}",
+                        f"{result['plots_dirpath']}backtest_{side}{z + 1}of{n_parts}.png",
+                    ),
                 )
-                if fig is not None:
-                    fig.savefig(f"{result['plots_dirpath']}backtest_{side}{z + 1}of{n_parts}.png")
-                else:
-                    print(f"no {side} fills...")
-            if result["passivbot_mode"] == "clock":
-                if "ema_band_lower" in df.columns:
-                    df = df.drop(["ema_band_lower"], axis=1)
-                if "ema_band_upper" in df.columns:
-                    df = df.drop(["ema_band_upper"], axis=1)
-
-    print("plotting wallet exposures...")
-    plt.clf()
-    sdf.wallet_exposure_short = sdf.wallet_exposure_short.abs() * -1
-    sdf[["wallet_exposure_long", "wallet_exposure_short"]].plot(
-        title="Wallet exposures: +long, -short",
-        xlabel="Time",
-        ylabel="Wallet Exposure",
+            )
+    sdfc = sdf[["wallet_exposure_long", "wallet_exposure_short"]].copy()
+    sdfc.wallet_exposure_short = sdfc.wallet_exposure_short.abs() * -1
+    jobs.append(
+        (
+            render_lines_plot,
+            (
+                sdfc,
+                "Wallet exposures: +long, -short",
+                f"{result['plots_dirpath']}wallet_exposures_plot.png",
+                "Time",
+                "Wallet Exposure",
+            ),
+        )
     )
-    plt.savefig(f"{result['plots_dirpath']}wallet_exposures_plot.png")
+    n_cpus = min(len(jobs), n_cpus if n_cpus else os.cpu_count() or 1)
+    print(f"rendering {len(jobs)} plots with {n_cpus} processes {result['plots_dirpath']}...")
+    with Pool(processes=n_cpus) as pool:
+        tasks = [pool.apply_async(func, args=args) for func, args in jobs]
+        for task in tasks:
+            fpath = task.get()
+            if fpath is not None:
+                print("dumped", fpath)
 
 
 def plot_fills(df, fdf_, side: int = 0, plot_whole_df: bool = False, title=""):
@@ -430,3 +567,22 @@ def plot_pnls_stuck(sdf, fdf, symbol=None, start_pct=0.0, end_pct=1.0, unstuck_t
     sdfc[~any_stuck].balance.plot(style="b.")
     ax.legend(["equity", "balance_with_any_stuck", "balance_with_none_stuck"])
     return plt
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="plotting", description="render deferred backtest plots")
+    parser.add_argument("plots_dirpath", type=str, help="backtest plots dir with deferred plot data")
+    args = parser.parse_args()
+    plots_dirpath = os.path.join(args.plots_dirpath, "")
+    result = json.load(open(plots_dirpath + "result.json"))
+    result["plots_dirpath"] = plots_dirpath
+    render_plots(
+        result,
+        load_columnar(plots_dirpath + "fills_long.npz"),
+        load_columnar(plots_dirpath + "fills_short.npz"),
+        load_columnar(plots_dirpath + "stats.npz"),
+        load_columnar(plots_dirpath + "prices.npz"),
+        json.load(open(plots_dirpath + "deferred_plots.json"))["n_parts"],
+    )
@@ -3,6 +3,7 @@ import json
 import os
 import traceback
 import asyncio
+import threading
 from datetime import datetime
 from time import time
 import numpy as np
@@ -51,6 +52,26 @@ def dump_live_config(config: dict, path: str):
         f.write(pretty_str)
 
 
+def dump_columnar(df, path: str):
+    """
+    dumps dataframe as compressed npz file, one array per column
+    index is stored under reserved key "__index__", so a column named "index" is kept
+    much faster and smaller than csv for long backtests
+    """
+    columns = {"__index__": df.index.values}
+    for col in df.columns:
+        values = df[col].values
+        columns[col] = values.astype(str) if values.dtype == object else values
+    np.savez_compressed(path, **columns)
+
+
+def load_columnar(path: str):
+    with np.load(path) as data:
+        columns = {k: data[k] for k in data.files}
+    index = columns.pop("__index__")
+    return pd.DataFrame(columns, index=index)
+
+
 def load_config_files(config_paths: []) -> dict:
     config = {}
     for config_path in config_paths:
@@ -544,6 +565,14 @@ def utc_ms() -> float:
     return datetime.utcnow().timestamp() * 1000
 
 
+def write_heartbeat(filepath: str):
+    """
+    used by manager's supervisor to tell a live bot is alive; supervisor reads file's mtime
+    """
+    with open(filepath, "w") as f:
+        f.write(str(utc_ms()))
+
+
 def local_time() -> float:
     return datetime.now().astimezone().timestamp() * 1000
 
@@ -643,6 +672,98 @@ def load_ccxt_version():
         return None
 
 
+MARKETS_STORE_VERSION = 1
+MARKETS_STORE_TTL_HOURS = 24.0
+markets_store_lock = threading.Lock()
+markets_store_refreshing = set()
+
+
+def get_markets_store_filepath(exchange_id: str) -> str:
+    return make_get_filepath(os.path.join("caches", "markets", f"{exchange_id}.json"))
+
+
+def load_markets_store(exchange_id: str):
+    """
+    returns {"version", "ccxt_version", "timestamp", "markets": [ccxt market]} or None
+    """
+    try:
+        store = json.load(open(get_markets_store_filepath(exchange_id)))
+    except (OSError, ValueError):
+        # missing, unreadable or partially written store
+        return None
+    if store.get("version") != MARKETS_STORE_VERSION:
+        return None
+    return store
+
+
+def refresh_markets_store(exchange_id: str) -> [dict]:
+    import ccxt
+
+    markets = getattr(ccxt, exchange_id)().fetch_markets()
+    dump_markets_store(exchange_id, markets)
+    return markets
+
+
+def dump_markets_store(exchange_id: str, markets: [dict]):
+    store = {
+        "version": MARKETS_STORE_VERSION,
+        "ccxt_version": load_ccxt_version(),
+        "timestamp": utc_ms(),
+        "markets": markets,
+    }
+    # write to tmp file first; store is shared between backtest, optimize and forager processes
+    filepath = get_markets_store_filepath(exchange_id)
+    tmp_filepath = f"{filepath}.{os.getpid()}.tmp"
+    json.dump(store, open(tmp_filepath, "w"))
+    os.replace(tmp_filepath, filepath)
+
+
+def refresh_markets_store_in_background(exchange_id: str):
+    with markets_store_lock:
+        if exchange_id in markets_store_refreshing:
+            return
+        markets_store_refreshing.add(exchange_id)
+
+    def refresh():
+        try:
+            refresh_markets_store(exchange_id)
+        except Exception as e:
+            print(f"failed to refresh markets cache for {exchange_id}", e)
+        finally:
+            with markets_store_lock:
+                markets_store_refreshing.discard(exchange_id)
+
+    # daemon, so short lived processes do not wait for the refresh before exiting
+    threading.Thread(target=refresh, name=f"refresh_markets_{exchange_id}", daemon=True).start()
+
+
+def load_markets_cached(exchange_id: str, ttl_hours: float = MARKETS_STORE_TTL_HOURS):
+    """
+    returns ccxt markets of exchange_id from local store at caches/markets/, None if no store
+    stale store is used as is and refreshed in a background thread
+    """
+    store = load_markets_store(exchange_id)
+    if store is None:
+        return None
+    age_hours = (utc_ms() - store["timestamp"]) / (1000 * 60 * 60)
+    if age_hours > ttl_hours or store["ccxt_version"] != load_ccxt_version():
+        print(f"cached markets for {exchange_id} are {age_hours:.1f}h old, refreshing in background")
+        refresh_markets_store_in_background(exchange_id)
+    return store["markets"]
+
+
+def fetch_markets_cached(exchange_id: str, ttl_hours: float = MARKETS_STORE_TTL_HOURS) -> [dict]:
+    """
+    as load_markets_cached, but fetches synchronously if there is no store
+    not for use inside an asyncio event loop; see load_markets_cached and dump_markets_store
+    """
+    markets = load_markets_cached(exchange_id, ttl_hours)
+    if markets is None:
+        print(f"fetching markets for {exchange_id}...")
+        return refresh_markets_store(exchange_id)
+    return markets
+
+
 def fetch_market_specific_settings_multi(symbols=None, exchange="binance"):
     import ccxt
 
@@ -659,6 +780,7 @@ def fetch_market_specific_settings_multi(symbols=None, exchange="binance"):
         # "bingx": "bingx",
     }
     cc = getattr(ccxt, exchange_map[exchange])()
+    cc.set_markets(fetch_markets_cached(cc.id))
     info = cc.load_markets()
     for symbol in info:
         if exchange == "binance":
@@ -718,7 +840,7 @@ def fetch_market_specific_settings(config: dict):
             settings_from_exchange["hedge_mode"] = False
         else:
             raise Exception(f"unknown market type {market_type}")
-        markets = cc.fetch_markets()
+        markets = fetch_markets_cached(cc.id)
         for elm in markets:
             if elm["id"] == symbol:
                 break
@@ -735,7 +857,7 @@ def fetch_market_specific_settings(config: dict):
                 settings_from_exchange["price_step"] = float(elm1["tickSize"])
     elif exchange == "bitget":
         cc = ccxt.bitget()
-        markets = cc.fetch_markets()
+        markets = fetch_markets_cached(cc.id)
         for elm in markets:
             if elm["type"] == "swap" and elm["id"] == symbol + "_UMCBL":
                 break
@@ -757,7 +879,7 @@ def fetch_market_specific_settings(config: dict):
         settings_from_exchange["inverse"] = elm["linear"] is not None and not elm["linear"]
     elif exchange == "okx":
         cc = ccxt.okx()
-        markets = cc.fetch_markets()
+        markets = fetch_markets_cached(cc.id)
         for elm in markets:
             if elm["type"] == "swap" and symbol in elm["id"].replace("-", ""):
                 break
@@ -774,7 +896,7 @@ def fetch_market_specific_settings(config: dict):
         settings_from_exchange["min_qty"] = elm["limits"]["amount"]["min"]
     elif exchange == "bybit":
         cc = ccxt.bybit()
-        markets = cc.fetch_markets()
+        markets = fetch_markets_cached(cc.id)
         spot = market_type == "spot"
         for elm in markets:
             if elm["id"] == symbol and elm["spot"] == spot:
@@ -793,7 +915,7 @@ def fetch_market_specific_settings(config: dict):
         settings_from_exchange["min_qty"] = elm["limits"]["amount"]["min"]
     elif exchange == "kucoin":
         cc = ccxt.kucoinfutures()
-        markets = cc.fetch_markets()
+        markets = fetch_markets_cached(cc.id)
         for elm in markets:
             if elm["id"] == symbol + "M":
                 break
@@ -473,6 +473,91 @@ def filter_orders(
     return actual_orders, orders_to_create
 
 
+ORDER_TYPES = ("entry", "close", "unstuck")
+
+
+def calc_order_type(order: dict) -> str:
+    # one of ORDER_TYPES, from custom_id, falling back to reduce_only
+    custom_id = order.get("custom_id") or ""
+    for order_type in ["unstuck", "entry", "close"]:
+        if order_type in custom_id:
+            return order_type
+    return "close" if order.get("reduce_only") else "entry"
+
+
+def parse_order_tolerances(tolerances: dict = None) -> dict:
+    """
+    returns {order_type: {"price": float, "qty": float}} for each of ORDER_TYPES
+    tolerances are relative to ideal order's price and qty; missing values default to 0.0
+    """
+    parsed = {order_type: {"price": 0.0, "qty": 0.0} for order_type in ORDER_TYPES}
+    for order_type, tolerance in (tolerances or {}).items():
+        if order_type not in parsed:
+            raise Exception(f"unknown order type in order tolerances: {order_type}")
+        for key in tolerance:
+            if key not in parsed[order_type]:
+                raise Exception(f"unknown key in order tolerances {order_type}: {key}")
+            parsed[order_type][key] = abs(float(tolerance[key]))
+    return parsed
+
+
+def order_within_tolerance(actual_order: dict, ideal_order: dict, tolerance: dict) -> bool:
+    price_diff = abs(actual_order["price"] - ideal_order["price"])
+    qty_diff = abs(abs(actual_order["qty"]) - abs(ideal_order["qty"]))
+    return (
+        price_diff <= ideal_order["price"] * tolerance["price"]
+        and qty_diff <= abs(ideal_order["qty"]) * tolerance["qty"]
+    )
+
+
+def diff_orders(
+    actual_orders: [dict],
+    ideal_orders: [dict],
+    keys: [str] = ("symbol", "side", "qty", "price"),
+    tolerances: dict = None,
+    amend: bool = False,
+) -> ([dict], [dict], [(dict, dict)], int):
+    """
+    returns (orders_to_cancel, orders_to_create, orders_to_amend, n_tolerated)
+    exact matches on keys are kept, as in filter_orders
+    of remaining orders, an actual order matching an ideal order on keys other than qty and price
+    is kept if within tolerances (see parse_order_tolerances) of ideal order's type
+    if amend, remaining pairs matching on keys other than qty and price are returned as
+    orders_to_amend [(actual_order, ideal_order)]
+    each ideal order is paired with the remaining actual order closest in price, lower price on ties
+    """
+    orders_to_cancel, orders_to_create = filter_orders(actual_orders, ideal_orders, keys)
+    orders_to_cancel = list(orders_to_cancel)
+    group_keys = [k for k in keys if k not in ["qty", "price"]]
+    n_tolerated = 0
+    orders_to_amend = []
+    for pairing in ["tolerance", "amend"]:
+        if not orders_to_cancel or not orders_to_create:
+            break
+        if (pairing == "tolerance" and tolerances is None) or (pairing == "amend" and not amend):
+            continue
+        unpaired = []
+        for order in orders_to_create:
+            tolerance = tolerances[calc_order_type(order)] if pairing == "tolerance" else None
+            candidates = [
+                x
+                for x in orders_to_cancel
+                if all(x[k] == order[k] for k in group_keys)
+                and (tolerance is None or order_within_tolerance(x, order, tolerance))
+            ]
+            if not candidates:
+                unpaired.append(order)
+                continue
+            closest = min(candidates, key=lambda x: (abs(x["price"] - order["price"]), x["price"]))
+            orders_to_cancel = [x for x in orders_to_cancel if x is not closest]
+            if pairing == "tolerance":
+                n_tolerated += 1
+            else:
+                orders_to_amend.append((closest, order))
+        orders_to_create = unpaired
+    return orders_to_cancel, orders_to_create, orders_to_amend, n_tolerated
+
+
 def get_dummy_settings(config: dict):
     dummy_settings = get_template_live_config()
     dummy_settings.update({k: 1.0 for k in get_xk_keys()})
@@ -1675,6 +1760,49 @@ def calc_scores(config: dict, results: dict):
     }
 
 
+def window_backtest_result(
+    fills_long: list, fills_short: list, stats: list, start_ts: float, end_ts: float
+) -> (list, list, list, dict):
+    """
+    cuts fills and stats of one backtest pass to start_ts <= timestamp < end_ts
+    returns windowed fills_long, fills_short, stats and a checkpoint of the state at window start:
+    {"balance_long", "balance_short", "psize_long", "pprice_long", "psize_short", "pprice_short"}
+    balance-relative metrics (adg, drawdowns, sharpe ratio) of a window are comparable
+    to those of a separate backtest starting at start_ts if the window starts flat
+    """
+    stats_ = [x for x in stats if start_ts <= x[0] < end_ts]
+    fills_long_ = [x for x in fills_long if start_ts <= x[1] < end_ts]
+    fills_short_ = [x for x in fills_short if start_ts <= x[1] < end_ts]
+    checkpoint = {}
+    if stats_:
+        x = stats_[0]
+        checkpoint = {
+            "balance_long": x[10],
+            "balance_short": x[11],
+            "psize_long": x[3],
+            "pprice_long": x[4],
+            "psize_short": x[5],
+            "pprice_short": x[6],
+        }
+    return fills_long_, fills_short_, stats_, checkpoint
+
+
+def sum_pruning_stats(results: dict) -> dict:
+    """
+    sums pruning stats of single symbol results from optimize.backtest_wrap
+    """
+    summed = {"pruned": False, "n_ticks_simulated": 0, "n_ticks_total": 0}
+    for sym in results:
+        if not isinstance(results[sym], dict):
+            continue
+        summed["pruned"] |= bool(
+            results[sym].get("pruned_long", 0.0) or results[sym].get("pruned_short", 0.0)
+        )
+        summed["n_ticks_simulated"] += results[sym].get("n_ticks_simulated", 0)
+        summed["n_ticks_total"] += results[sym].get("n_ticks_total", 0)
+    return summed
+
+
 def configs_are_equal(cfg0, cfg1) -> bool:
     try:
         cfg0 = candidate_to_live_config(cfg0)
@@ -0,0 +1,179 @@
+import gzip
+import json
+import logging
+from time import time
+
+from procedures import utc_ms
+
+ORDER_KEYS = [
+    "id",
+    "symbol",
+    "side",
+    "position_side",
+    "qty",
+    "amount",
+    "price",
+    "status",
+    "filled",
+    "timestamp",
+]
+POSITION_KEYS = ["symbol", "position_side", "size", "price", "timestamp"]
+PNL_KEYS = ["id", "symbol", "timestamp", "pnl"]
+MARKET_KEYS = ["id", "symbol", "type", "active", "linear", "contractSize", "precision", "limits"]
+
+
+def compact_orders(orders: [dict]) -> [dict]:
+    return [{k: order.get(k) for k in ORDER_KEYS} for order in orders]
+
+
+def compact_ticker(ticker: dict) -> list:
+    return [ticker["symbol"], ticker["bid"], ticker["ask"], ticker["last"]]
+
+
+class Recorder:
+    """
+    appends websocket updates and REST responses of a live multi symbol bot to a gzipped log,
+    one json line [timestamp, name, data] per update, keeping only fields passivbot uses
+    the log is replayed by exchanges_multi/replay.py
+    """
+
+    def __init__(self, filepath: str, flush_interval_seconds: float = 10.0):
+        self.filepath = filepath
+        self.file = gzip.open(filepath, "at")
+        self.flush_interval_seconds = flush_interval_seconds
+        self.flush_ts = time()
+        self.n_written = 0
+
+    def write(self, name: str, data):
+        self.file.write(json.dumps([utc_ms(), name, data], separators=(",", ":"), default=str))
+        self.file.write("\n")
+        self.n_written += 1
+        if time() - self.flush_ts > self.flush_interval_seconds:
+            self.file.flush()
+            self.flush_ts = time()
+
+    def close(self):
+        self.file.close()
+        logging.info(f"recorded {self.n_written} updates to {self.filepath}")
+
+    def attach(self, bot):
+        # wraps bot's websocket handlers and REST fetchers on the instance
+        self.bot = bot
+        self.write("meta", {"exchange": bot.exchange, "user": bot.user})
+        for method_name, name, compact in [
+            ("handle_ticker_update", "ticker", compact_ticker),
+            ("handle_order_update", "orders", compact_orders),
+            ("handle_balance_update", "balance", lambda x: {"total": x["USDT"]["total"]}),
+        ]:
+            setattr(bot, method_name, self.wrap_handler(getattr(bot, method_name), name, compact))
+        for method_name, name, compact in [
+            ("fetch_positions", "positions", self.compact_positions),
+            ("fetch_open_orders", "open_orders", compact_orders),
+            ("fetch_tickers", "tickers", self.compact_tickers),
+            ("fetch_pnls", "pnls", lambda x: [{k: elm.get(k) for k in PNL_KEYS} for elm in x]),
+        ]:
+            setattr(bot, method_name, self.wrap_fetcher(getattr(bot, method_name), name, compact))
+        bot.fetch_ohlcv = self.wrap_fetch_ohlcv(bot.fetch_ohlcv)
+        bot.init_symbols = self.wrap_init_symbols(bot.init_symbols)
+        return self
+
+    def wrap_handler(self, handler, name: str, compact):
+        def wrapped(upd):
+            try:
+                self.write(name, compact(upd))
+            except Exception as e:
+                logging.error(f"error recording {name} {e}")
+            return handler(upd)
+
+        return wrapped
+
+    def wrap_fetcher(self, fetcher, name: str, compact):
+        async def wrapped(*args, **kwargs):
+            res = await fetcher(*args, **kwargs)
+            if res not in [None, False]:
+                self.write(name, compact(res))
+            return res
+
+        return wrapped
+
+    def wrap_fetch_ohlcv(self, fetcher):
+        async def wrapped(symbol: str, *args, **kwargs):
+            res = await fetcher(symbol, *args, **kwargs)
+            if res not in [None, False]:
+                self.write("ohlcv", {"symbol": symbol, "ohlcv": res})
+            return res
+
+        return wrapped
+
+    def wrap_init_symbols(self, init_symbols):
+        async def wrapped():
+            res = await init_symbols()
+            self.write(
+                "markets",
+                {
+                    symbol: {k: elm.get(k) for k in MARKET_KEYS}
+                    for symbol, elm in self.bot.markets_dict.items()
+                    if symbol.endswith(f":{self.bot.quote}")
+                },
+            )
+            return res
+
+        return wrapped
+
+    def compact_positions(self, res) -> list:
+        positions, balance = res
+        return [[{k: elm.get(k) for k in POSITION_KEYS} for elm in positions], balance]
+
+    def compact_tickers(self, tickers: dict) -> list:
+        symbols = getattr(self.bot, "symbols", tickers)
+        return [compact_ticker(tickers[symbol]) for symbol in symbols if symbol in tickers]
+
+
+def load_recording(filepath: str) -> [list]:
+    with gzip.open(filepath, "rt") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def split_recording(records: [list]) -> dict:
+    """
+    returns {"meta", "markets", "positions", "balance", "open_orders", "pnls", "ohlcvs",
+             "tickers", "stream", "live_orders", "start_ts", "end_ts"}
+    initial state is taken from the first REST response of each kind
+    stream is [(timestamp, [[symbol, bid, ask, last], ...]), ...] of websocket and REST tickers
+    live_orders are the recorded websocket order updates, for comparison with replayed churn
+    """
+    split = {
+        "meta": {},
+        "markets": {},
+        "positions": None,
+        "balance": None,
+        "open_orders": None,
+        "pnls": None,
+        "ohlcvs": {},
+        "tickers": {},
+        "stream": [],
+        "live_orders": [],
+        "start_ts": records[0][0],
+        "end_ts": records[-1][0],
+    }
+    for ts, name, data in records:
+        if name == "ticker":
+            split["stream"].append((ts, [data]))
+        elif name == "tickers":
+            split["stream"].append((ts, data))
+        elif name == "orders":
+            split["live_orders"] += data
+        elif name == "positions":
+            if split["positions"] is None:
+                split["positions"], split["balance"] = data
+        elif name == "ohlcv":
+            split["ohlcvs"].setdefault(data["symbol"], data["ohlcv"])
+        elif name in ["meta", "markets"]:
+            split[name] = split[name] or data
+        elif name in ["open_orders", "pnls"]:
+            if split[name] is None:
+                split[name] = data
+    for ts, tickers in split["stream"]:
+        for ticker in tickers:
+            split["tickers"].setdefault(ticker[0], ticker[1:])
+    return split
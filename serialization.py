@@ -0,0 +1,84 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class StdlibJSON:
+    name = "json"
+
+    def loads(self, s):
+        return json.loads(s)
+
+    def dumps(self, obj) -> str:
+        return json.dumps(obj)
+
+
+class ORJSON:
+    """
+    orjson, falling back to stdlib json where results would differ:
+    orjson rejects NaN and Infinity literals when decoding,
+    and encodes non-finite floats as null, so output containing null is redone with json
+    unlike json, integers beyond 64 bit are decoded as floats
+    """
+
+    name = "orjson"
+
+    def loads(self, s):
+        try:
+            return orjson.loads(s)
+        except (orjson.JSONDecodeError, TypeError):
+            return json.loads(s)
+
+    def dumps(self, obj) -> str:
+        try:
+            dumped = orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return json.dumps(obj)
+        if b"null" in dumped:
+            return json.dumps(obj)
+        return dumped.decode()
+
+
+SERIALIZERS = {"json": StdlibJSON}
+if orjson is not None:
+    SERIALIZERS["orjson"] = ORJSON
+
+
+def get_serializer(name: str = None):
+    """
+    name is one of SERIALIZERS, default is env var PASSIVBOT_JSON, else fastest installed
+    """
+    name = name or os.environ.get("PASSIVBOT_JSON") or ("orjson" if orjson else "json")
+    if name not in SERIALIZERS:
+        raise Exception(f"unknown or not installed json serializer: {name}")
+    return SERIALIZERS[name]()
+
+
+serializer = get_serializer()
+
+
+def set_serializer(name: str):
+    global serializer
+    serializer = get_serializer(name)
+
+
+def loads(s):
+    return serializer.loads(s)
+
+
+def dumps(obj) -> str:
+    return serializer.dumps(obj)
+
+
+def load(filepath: str):
+    with open(filepath, "rb") as f:
+        return serializer.loads(f.read())
+
+
+def dump(obj, filepath: str):
+    with open(filepath, "w") as f:
+        f.write(serializer.dumps(obj))
@@ -0,0 +1,48 @@
+import asyncio
+
+
+class SnapshotRefresher:
+    """
+    single flight REST refreshes per resource
+    concurrent refresh requests for a resource share one in flight fetch
+    requests for a resource updated within max_age_millis, by REST or websocket, are skipped
+    refresh(resource) calls refresh_func(resource); calc_age(resource) returns millis since update
+    """
+
+    counter_keys = ("requested", "fetched", "merged", "skipped", "reconciled")
+
+    def __init__(self, resources: [str], refresh_func, calc_age):
+        self.refresh_func = refresh_func
+        self.calc_age = calc_age
+        self.in_flight = {}
+        self.counters = {resource: {k: 0 for k in self.counter_keys} for resource in resources}
+
+    async def refresh(self, resource: str, max_age_millis: float = None):
+        counters = self.counters[resource]
+        counters["requested"] += 1
+        if resource in self.in_flight:
+            counters["merged"] += 1
+            return await asyncio.shield(self.in_flight[resource])
+        if max_age_millis is not None and self.calc_age(resource) <= max_age_millis:
+            counters["skipped"] += 1
+            return True
+        counters["fetched"] += 1
+        task = asyncio.ensure_future(self.refresh_func(resource))
+        self.in_flight[resource] = task
+        task.add_done_callback(lambda x: self.remove_in_flight(resource, x))
+        return await asyncio.shield(task)
+
+    def remove_in_flight(self, resource: str, task):
+        if self.in_flight.get(resource) is task:
+            del self.in_flight[resource]
+
+    def count_reconciled(self, resources: [str]):
+        # refreshes made unnecessary by reconciling state from execution responses
+        for resource in resources:
+            self.counters[resource]["reconciled"] += 1
+
+    def format_counters(self) -> str:
+        return ", ".join(
+            f"{resource}: " + " ".join(f"{k} {v}" for k, v in counters.items())
+            for resource, counters in self.counters.items()
+        )
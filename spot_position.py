@@ -0,0 +1,116 @@
+import logging
+
+import serialization
+from pure_funcs import calc_pprice_long, get_position_fills
+
+
+class SpotPositionTracker:
+    """
+    spot exchanges report no position price, so it is reconstructed from fills
+    psize and pprice are updated with each fill newer than last_fill_id and persisted with it,
+    so only fills since last_fill_id need fetching on position updates
+    coin balance is authoritative for position size; if tracked psize disagrees with it
+    (deposits, withdrawals, trades outside the bot), recent fill history is refetched in full
+    and pprice is reconstructed from it
+    """
+
+    def __init__(self, filepath: str, coin: str, size_tolerance_pct: float = 0.01):
+        self.filepath = filepath
+        self.coin = coin
+        self.size_tolerance_pct = size_tolerance_pct
+        self.psize = 0.0
+        self.pprice = 0.0
+        self.last_fill_id = None
+        self.n_fills_applied = 0
+        self.n_reconstructions = 0
+        self.load()
+
+    def load(self):
+        try:
+            state = serialization.load(self.filepath)
+            self.psize, self.pprice = float(state["psize"]), float(state["pprice"])
+            self.last_fill_id = state["last_fill_id"]
+            logging.info(
+                f"loaded spot position {self.coin} psize {self.psize} pprice {self.pprice} "
+                + f"last fill id {self.last_fill_id}"
+            )
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.error(f"error loading spot position from {self.filepath} {e}")
+
+    def dump(self):
+        try:
+            serialization.dump(
+                {"psize": self.psize, "pprice": self.pprice, "last_fill_id": self.last_fill_id},
+                self.filepath,
+            )
+        except Exception as e:
+            logging.error(f"error dumping spot position to {self.filepath} {e}")
+
+    def apply_fills(self, fills: [dict]) -> int:
+        """
+        applies fills newer than last_fill_id, old to new
+        fills without trade id, e.g. from websocket, are left for the next REST fetch
+        returns n fills applied
+        """
+        if self.last_fill_id is None:
+            return 0
+        new_fills = sorted(
+            [x for x in fills if x.get("id") is not None and x["id"] > self.last_fill_id],
+            key=lambda x: x["id"],
+        )
+        for fill in new_fills:
+            qty = abs(fill["qty"])
+            if fill["side"] == "buy":
+                if fill.get("fee_token") == self.coin:
+                    qty = max(0.0, qty - fill["fee_paid"])
+                new_psize = self.psize + qty
+                if new_psize > 0.0:
+                    self.pprice = self.pprice * (self.psize / new_psize) + fill["price"] * (
+                        qty / new_psize
+                    )
+                self.psize = new_psize
+            else:
+                self.psize = max(0.0, self.psize - qty)
+                if self.psize == 0.0:
+                    self.pprice = 0.0
+            self.last_fill_id = fill["id"]
+        if new_fills:
+            self.n_fills_applied += len(new_fills)
+            self.dump()
+        return len(new_fills)
+
+    def reconstruct(self, psize: float, fills: [dict]):
+        # full rescan of fill history, as done before incremental tracking
+        long_pfills, _ = get_position_fills(psize, 0.0, fills)
+        self.psize = psize
+        self.pprice = calc_pprice_long(psize, long_pfills) if psize else 0.0
+        fill_ids = [x["id"] for x in fills if x.get("id") is not None]
+        self.last_fill_id = max(fill_ids) if fill_ids else None
+        self.n_reconstructions += 1
+        self.dump()
+
+    def is_drifted(self, psize: float, qty_step: float) -> bool:
+        """
+        psize is coin balance rounded to qty_step
+        returns True if tracked psize is off by more than tolerance, or nothing is tracked yet
+        fills since last_fill_id are then not enough to reconstruct pprice from,
+        so recent fill history should be fetched in full before calc_pprice
+        """
+        tolerance = max(qty_step * 2, psize * self.size_tolerance_pct)
+        return self.last_fill_id is None or abs(self.psize - psize) > tolerance
+
+    def calc_pprice(self, psize: float, fills: [dict], qty_step: float) -> float:
+        """
+        psize is coin balance rounded to qty_step
+        returns tracked pprice, reconstructing from fills if tracked psize has drifted
+        """
+        self.apply_fills(fills)
+        if self.is_drifted(psize, qty_step):
+            self.reconstruct(psize, fills)
+        return self.pprice if psize else 0.0
+
+    def next_from_id(self):
+        # from_id for fetch_fills; None fetches most recent fills
+        return None if self.last_fill_id is None else self.last_fill_id + 1
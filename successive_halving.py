@@ -0,0 +1,138 @@
+from math import ceil
+
+# eta <= 1.0 would never advance fidelity nor stop candidates
+MIN_ETA = 1.1
+
+
+def clamp_eta(eta: float) -> float:
+    return max(MIN_ETA, eta)
+
+
+def calc_fidelities(min_fidelity: float, eta: float) -> [float]:
+    """
+    returns rungs of successive halving, e.g. min_fidelity=0.25, eta=2 -> [0.25, 0.5, 1.0]
+    fidelity is the fraction of the backtest date range, counted backwards from end_date
+    min_fidelity >= 1.0 disables successive halving
+    """
+    if min_fidelity >= 1.0 or min_fidelity <= 0.0:
+        return [1.0]
+    eta = clamp_eta(eta)
+    fidelities = []
+    fidelity = min_fidelity
+    while fidelity < 1.0:
+        fidelities.append(round(fidelity, 6))
+        fidelity *= eta
+    return fidelities + [1.0]
+
+
+class SuccessiveHalving:
+    """
+    asynchronous successive halving for optimize.py
+    candidates are first scored on the most recent fraction of the date range;
+    a candidate is promoted to the next rung if its score is among the best 1/eta
+    of all scores seen so far at its current rung
+    """
+
+    def __init__(self, min_fidelity: float = 1.0, eta: float = 3.0):
+        self.eta = clamp_eta(eta)
+        self.fidelities = calc_fidelities(min_fidelity, self.eta)
+        # {fidelity: {side: [score]}}
+        self.rung_scores = {f: {"long": [], "short": []} for f in self.fidelities}
+        # {fidelity: n candidates stopped at rung}
+        self.n_stopped = {f: 0 for f in self.fidelities}
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.fidelities) > 1
+
+    @property
+    def min_fidelity(self) -> float:
+        return self.fidelities[0]
+
+    def next_fidelity(self, fidelity: float):
+        for f in self.fidelities:
+            if f > fidelity:
+                return f
+        return None
+
+    def promote(self, fidelity: float, scores: dict):
+        """
+        records scores {side: score} of a candidate evaluated at fidelity
+        returns next fidelity if candidate is promoted, None if candidate is stopped
+        candidate is promoted if any of its sides qualifies
+        """
+        next_fidelity = self.next_fidelity(fidelity)
+        if next_fidelity is None:
+            return None
+        promoted = False
+        for side, score in scores.items():
+            rung = self.rung_scores[fidelity][side]
+            rung.append(score)
+            if len(rung) < self.eta:
+                # too few scores at rung to judge; promote
+                promoted = True
+            elif sum(s < score for s in rung) < max(1, int(len(rung) / self.eta)):
+                promoted = True
+        if not promoted:
+            self.n_stopped[fidelity] += 1
+            return None
+        return next_fidelity
+
+    def get_savings(self) -> float:
+        """
+        returns fraction of backtested ticks saved relative to evaluating all candidates at full fidelity
+        """
+        n_candidates = len(self.rung_scores[self.fidelities[0]]["long"]) or len(
+            self.rung_scores[self.fidelities[0]]["short"]
+        )
+        if not n_candidates:
+            return 0.0
+        fidelity_sum = 0.0
+        for f in self.fidelities[:-1]:
+            n = len(self.rung_scores[f]["long"]) or len(self.rung_scores[f]["short"])
+            fidelity_sum += n * f
+        n_full = n_candidates - sum(self.n_stopped.values())
+        fidelity_sum += n_full * 1.0
+        return 1.0 - fidelity_sum / n_candidates
+
+    def get_summary(self) -> str:
+        line = ", ".join(
+            f"{self.n_stopped[f]} stopped at fidelity {f}" for f in self.fidelities[:-1]
+        )
+        return f"{line}, {self.get_savings():.2%} of ticks skipped"
+
+
+def successive_halving_map(map_func, evaluate, individuals: list, fidelities: [float], eta: float):
+    """
+    synchronous successive halving for DEAP's toolbox.map in optimize_multi.py
+    evaluate(individual, fidelity) must return a tuple of objectives to be minimized
+    all individuals are evaluated at the lowest fidelity; the best 1/eta, ranked by first objective,
+    are re-evaluated at the next fidelity, and so on
+    stopped individuals never rank above a fully evaluated individual:
+    their objectives are set to at least the worst objectives among full fidelity results
+    returns (fitnesses, fidelities) in same order as individuals
+    eta is clamped as in calc_fidelities, so the promoted fraction matches the rungs
+    """
+    eta = clamp_eta(eta)
+    n = len(individuals)
+    fitnesses = [None] * n
+    evaluated_at = [None] * n
+    remaining = list(range(n))
+    for fidelity in fidelities:
+        if not remaining:
+            break
+        results = map_func(evaluate, [(individuals[j], fidelity) for j in remaining])
+        for j, res in zip(remaining, results):
+            fitnesses[j] = res
+            evaluated_at[j] = fidelity
+        if fidelity >= 1.0:
+            break
+        n_promote = max(1, ceil(len(remaining) / eta))
+        remaining = sorted(remaining, key=lambda j: fitnesses[j][0])[:n_promote]
+    full = [fitnesses[j] for j in range(n) if evaluated_at[j] >= 1.0]
+    if full:
+        worst = [max(vals) for vals in zip(*full)]
+        for j in range(n):
+            if evaluated_at[j] < 1.0:
+                fitnesses[j] = tuple(max(a, b) for a, b in zip(fitnesses[j], worst))
+    return fitnesses, evaluated_at
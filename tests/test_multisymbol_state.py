@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from multisymbol_state import MultiSymbolState, state_view
+
+
+class Holder:
+    emas_long = state_view("emas_long")
+    positions = state_view("positions")
+    tickers = state_view("tickers")
+
+    def __init__(self):
+        self.state = MultiSymbolState()
+
+
+def test_assigning_dict_replaces_contents():
+    h = Holder()
+    h.emas_long = {"A": [1.0, 2.0, 3.0], "B": [4.0, 5.0, 6.0]}
+    h.emas_long = {}
+    assert h.state.emas_long.tolist() == [[0.0] * 3, [0.0] * 3]
+    h.positions = {
+        "A": {"long": {"size": 1.0, "price": 2.0}, "short": {"size": -1.0, "price": 3.0}}
+    }
+    h.positions = {"B": {"long": {"size": 4.0, "price": 5.0}, "short": {"size": 0.0, "price": 0.0}}}
+    assert h.positions["A"]["long"]["size"] == 0.0 and h.positions["A"]["short"]["price"] == 0.0
+    assert h.positions["B"]["long"]["price"] == 5.0
+
+
+def test_removal_raises_deliberately():
+    h = Holder()
+    h.emas_long["A"] = [1.0, 2.0, 3.0]
+    h.tickers["A"] = {"bid": 1.0, "ask": 2.0, "last": 1.5}
+    with pytest.raises(TypeError):
+        h.emas_long.pop("A")
+    with pytest.raises(TypeError):
+        h.emas_long.popitem()
+    with pytest.raises(KeyError):
+        del h.emas_long["B"]
+    with pytest.raises(TypeError):
+        del h.tickers["A"]["bid"]
+    h.tickers["A"].clear()
+    assert dict(h.tickers["A"]) == {"bid": 0.0, "ask": 0.0, "last": 0.0}
+
+
+def test_rows_stay_current_and_capacity_grows_geometrically():
+    h = Holder()
+    h.emas_long["A"] = [1.0, 2.0, 3.0]
+    row = h.emas_long["A"]
+    h.state.emas_long = h.state.emas_long * 2.0
+    assert row.tolist() == [2.0, 4.0, 6.0]
+    capacities = set()
+    for i in range(100):
+        h.emas_long[f"S{i}"] = np.full(3, float(i))
+        capacities.add(h.state.capacity)
+    assert len(capacities) <= 5
+    assert len(h.state.emas_long) == 101
+    assert h.emas_long["S99"].tolist() == [99.0] * 3
+    assert h.emas_long["A"].tolist() == [2.0, 4.0, 6.0]
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from exchanges.binance_spot import BinanceBotSpot
+from spot_position import SpotPositionTracker
+
+
+def make_fill(id_: int, side: str, qty: float, price: float) -> dict:
+    return {
+        "symbol": "BTCUSDT",
+        "id": id_,
+        "order_id": id_,
+        "side": side,
+        "price": price,
+        "qty": qty,
+        "realized_pnl": 0.0,
+        "cost": qty * price,
+        "fee_paid": 0.0,
+        "fee_token": "USDT",
+        "timestamp": 1700000000000 + id_ * 60000,
+        "position_side": "long",
+    }
+
+
+HISTORY = [
+    make_fill(1, "buy", 1.0, 100.0),
+    make_fill(2, "buy", 1.0, 80.0),
+    make_fill(3, "sell", 0.5, 95.0),
+]
+
+
+def make_bot(filepath: str, coin_onhand: float) -> BinanceBotSpot:
+    # bot with exchange calls replaced by canned responses
+    bot = object.__new__(BinanceBotSpot)
+    bot.coin, bot.quote = "BTC", "USDT"
+    bot.qty_step, bot.min_cost = 0.001, 5.0
+    bot.endpoints = {"balance": "balance"}
+    bot.fills = []
+    bot.ts_locked, bot.ts_released = {"update_fills": 0.0}, {"update_fills": 0.0}
+    bot.error_halt = {"update_fills": False}
+    bot.position_tracker = SpotPositionTracker(filepath, "BTC")
+    bot.from_ids = []
+
+    async def private_get(url, params=None):
+        return {
+            "balances": [
+                {"asset": "BTC", "free": str(coin_onhand), "locked": "0.0"},
+                {"asset": "USDT", "free": "1000.0", "locked": "0.0"},
+            ]
+        }
+
+    async def fetch_fills(from_id=None):
+        bot.from_ids.append(from_id)
+        return [x for x in HISTORY if from_id is None or x["id"] >= from_id]
+
+    bot.private_get, bot.fetch_fills = private_get, fetch_fills
+    return bot
+
+
+@pytest.fixture
+def persisted(tmp_path):
+    # state of a previous run which had applied all fills in HISTORY
+    filepath = str(tmp_path / "spot_position.json")
+    bot = make_bot(filepath, 1.5)
+    asyncio.run(bot.fetch_position())
+    assert bot.position_tracker.last_fill_id == 3
+    return filepath, bot.position_tracker.pprice
+
+
+def test_no_drift_fetches_only_new_fills(persisted):
+    filepath, pprice = persisted
+    bot = make_bot(filepath, 1.5)
+    position = asyncio.run(bot.fetch_position())
+    assert bot.from_ids == [4]
+    assert bot.position_tracker.n_reconstructions == 0
+    assert position["long"]["size"] == 1.5
+    assert position["long"]["price"] == pytest.approx(pprice)
+
+
+def test_drift_refetches_history_before_reconstructing(persisted):
+    filepath, pprice = persisted
+    # 0.5 coin withdrawn while bot was stopped; no fills since last_fill_id
+    bot = make_bot(filepath, 1.0)
+    position = asyncio.run(bot.fetch_position())
+    assert bot.from_ids == [4, None]
+    assert bot.position_tracker.n_reconstructions == 1
+    expected = SpotPositionTracker(filepath + ".expected", "BTC")
+    expected.reconstruct(1.0, HISTORY)
+    assert position["long"]["size"] == 1.0
+    assert position["long"]["price"] == pytest.approx(expected.pprice)
+    assert position["long"]["price"] > 0.0
+    assert bot.position_tracker.last_fill_id == 3
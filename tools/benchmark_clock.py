@@ -0,0 +1,90 @@
+import os
+import sys
+import argparse
+from time import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from njit_clock import backtest_clock, backtest_clock_accelerated
+from procedures import load_live_config
+from pure_funcs import create_xk
+
+
+def make_synthetic_hlc(n_days: int, seed: int = 0, start_price: float = 100.0) -> np.ndarray:
+    """
+    1m hlc [[timestamp, high, low, close]] of a geometric random walk
+    """
+    rng = np.random.default_rng(seed)
+    n = n_days * 60 * 24
+    closes = start_price * np.exp(np.cumsum(rng.normal(0.0, 0.0008, n)))
+    opens = np.concatenate([[start_price], closes[:-1]])
+    highs = np.maximum(opens, closes) * (1 + np.abs(rng.normal(0.0, 0.0004, n)))
+    lows = np.minimum(opens, closes) * (1 - np.abs(rng.normal(0.0, 0.0004, n)))
+    timestamps = 1577836800000.0 + np.arange(n) * 60000.0
+    return np.column_stack([timestamps, highs, lows, closes])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="benchmark_clock",
+        description="compare backtest_clock with backtest_clock_accelerated on 1m hlcs",
+    )
+    parser.add_argument(
+        "live_config_path",
+        type=str,
+        nargs="?",
+        default="configs/live/clock_mode.example.json",
+        help="clock mode live config",
+    )
+    parser.add_argument("-nd", "--n_days", type=int, default=730, help="days of synthetic hlcs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--hlc",
+        type=str,
+        default=None,
+        help="path to hlc cache .npy to use instead of synthetic hlcs",
+    )
+    args = parser.parse_args()
+
+    config = load_live_config(args.live_config_path)
+    config.update(
+        {
+            "market_type": "futures",
+            "inverse": False,
+            "qty_step": 0.001,
+            "price_step": 0.0001,
+            "min_qty": 0.001,
+            "min_cost": 5.0,
+            "c_mult": 1.0,
+        }
+    )
+    xk = create_xk(config)
+    hlc = np.load(args.hlc) if args.hlc else make_synthetic_hlc(args.n_days, args.seed)
+    print(f"n minutes {len(hlc)}, n days {len(hlc) / 60 / 24:.1f}")
+
+    results = {}
+    for name, func in [
+        ("backtest_clock", backtest_clock),
+        ("backtest_clock_accelerated", backtest_clock_accelerated),
+    ]:
+        # compile
+        func(hlc[: 60 * 24 * 3], 1000.0, 0.0002, **xk)
+        sts = time()
+        results[name] = func(hlc, 1000.0, 0.0002, **xk)
+        elapsed = time() - sts
+        print(
+            f"{name: <28} {elapsed:8.3f} seconds, "
+            f"{len(results[name][0])} long fills, {len(results[name][1])} short fills"
+        )
+        results[name] = (results[name], elapsed)
+
+    (res_a, elapsed_a), (res_b, elapsed_b) = results.values()
+    identical = all(list(a) == list(b) for a, b in zip(res_a, res_b))
+    print(f"identical fills and stats: {identical}")
+    print(f"speedup: {elapsed_a / elapsed_b:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
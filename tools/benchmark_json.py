@@ -0,0 +1,121 @@
+import os
+import sys
+import gzip
+import json
+import random
+import argparse
+from time import perf_counter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from serialization import SERIALIZERS
+
+
+def make_synthetic_frames(n_frames: int, seed: int = 0) -> [str]:
+    """
+    aggTrade market stream frames and order update user stream frames
+    """
+    rng = random.Random(seed)
+    frames = []
+    price = 100.0
+    for i in range(n_frames):
+        price *= 1 + rng.gauss(0.0, 0.0002)
+        if i % 20 == 0:
+            frame = {
+                "e": "ORDER_TRADE_UPDATE",
+                "E": 1700000000000 + i,
+                "o": {
+                    "s": "BTCUSDT",
+                    "c": f"long_ientry_{i}",
+                    "S": "BUY",
+                    "o": "LIMIT",
+                    "q": str(round(rng.random(), 3)),
+                    "p": str(round(price, 2)),
+                    "X": "NEW",
+                    "i": 8886774000 + i,
+                    "ps": "LONG",
+                },
+            }
+        else:
+            frame = {
+                "e": "aggTrade",
+                "E": 1700000000000 + i,
+                "s": "BTCUSDT",
+                "a": 5933014 + i,
+                "p": str(round(price, 2)),
+                "q": str(round(rng.random(), 3)),
+                "f": 100 + i,
+                "l": 105 + i,
+                "T": 1700000000000 + i,
+                "m": rng.random() < 0.5,
+            }
+        frames.append(json.dumps(frame))
+    return frames
+
+
+def load_frames(filepath: str) -> [str]:
+    # lines of a text file, or of a gzipped replay log recorded with passivbot_multi.py --record
+    opener = gzip.open if filepath.endswith(".gz") else open
+    with opener(filepath, "rt") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="benchmark_json",
+        description="compare json serializers decoding and encoding websocket and REST frames",
+    )
+    parser.add_argument(
+        "frames_path",
+        type=str,
+        nargs="?",
+        default=None,
+        help="one frame per line, e.g. replay log .jsonl.gz; default is synthetic frames",
+    )
+    parser.add_argument("-n", "--n_frames", type=int, default=200000, help="n synthetic frames")
+    parser.add_argument("-r", "--repeats", type=int, default=3, help="best of n repeats")
+    args = parser.parse_args()
+
+    if args.frames_path:
+        frames = load_frames(args.frames_path)
+    else:
+        frames = make_synthetic_frames(args.n_frames)
+    print(f"n frames {len(frames)}, mean size {sum(map(len, frames)) / len(frames):.0f} bytes")
+    expected = [json.loads(frame) for frame in frames]
+
+    results = {}
+    for name, cls in SERIALIZERS.items():
+        serializer = cls()
+        decoded = [serializer.loads(frame) for frame in frames]
+        identical = decoded == expected and all(
+            json.loads(serializer.dumps(x)) == x for x in expected[:1000]
+        )
+        elapsed_loads, elapsed_dumps = float("inf"), float("inf")
+        for _ in range(args.repeats):
+            sts = perf_counter()
+            for frame in frames:
+                serializer.loads(frame)
+            elapsed_loads = min(elapsed_loads, perf_counter() - sts)
+            sts = perf_counter()
+            for obj in expected:
+                serializer.dumps(obj)
+            elapsed_dumps = min(elapsed_dumps, perf_counter() - sts)
+        results[name] = (elapsed_loads, elapsed_dumps)
+        print(
+            f"{name: <8} loads {len(frames) / elapsed_loads:12.0f} frames/s, "
+            + f"dumps {len(frames) / elapsed_dumps:12.0f} frames/s, identical: {identical}"
+        )
+    if len(results) > 1:
+        base_loads, base_dumps = results["json"]
+        for name, (elapsed_loads, elapsed_dumps) in results.items():
+            if name != "json":
+                print(
+                    f"{name} speedup vs json: loads {base_loads / elapsed_loads:.2f}x, "
+                    + f"dumps {base_dumps / elapsed_dumps:.2f}x"
+                )
+    else:
+        print("only stdlib json installed; pip install orjson to compare")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import os
+import sys
+import argparse
+import asyncio
+import logging
+
+import hjson
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from exchanges_multi.replay import ReplayBot
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        prog="replay_multi",
+        description="replay a log recorded with passivbot_multi.py --record and report "
+        + "cpu per event, reaction latency and order churn of the live loop",
+    )
+    parser.add_argument("hjson_config_path", type=str, help="path to hjson passivbot meta config")
+    parser.add_argument("recording_path", type=str, help="path to recorded .jsonl.gz log")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0.0,
+        help="virtual seconds per wall second, default 0.0 replays as fast as possible",
+    )
+    parser.add_argument("--maker_fee", "--maker-fee", type=float, default=0.0002)
+    parser.add_argument("-v", "--verbose", action="store_true", help="log bot's own output")
+    args = parser.parse_args()
+
+    config = hjson.load(open(args.hjson_config_path))
+    bot = ReplayBot(config, args.recording_path, speed=args.speed, maker_fee=args.maker_fee)
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    metrics = await bot.start_bot()
+    for key, value in metrics.items():
+        print(f"{key: <28} {round(value, 4) if isinstance(value, float) else value}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())